@@ -37,11 +37,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # For static files on Render
+    'links.middleware.AsyncWhiteNoiseMiddleware',  # WhiteNoise static files (Render), ASGI-capable
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'links.middleware.ProfilingMiddleware',  # Removed at startup unless PROFILING_ENABLED
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -136,7 +137,17 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_URL = '/admin/login/'
 LOGIN_REDIRECT_URL = '/'
 
-# Cache configuration for Render
+# Search progress, single-flight locks and the sandbox resource cache, shared by all workers:
+# sqlite:///<file> for one box, redis://[:password@]host:6379/0 for several nodes (see services.shared_state)
+SHARED_STATE_URL = os.environ.get('SHARED_STATE_URL', f'sqlite:///{BASE_DIR / "shared_state.sqlite3"}')
+SHARED_STATE_PREFIX = os.environ.get('SHARED_STATE_PREFIX', 'darkweb')
+SHARED_STATE_MAX_BYTES = int(os.environ.get('SHARED_STATE_MAX_BYTES', str(256 * 1024 * 1024)))
+SEARCH_PROGRESS_TTL = int(os.environ.get('SEARCH_PROGRESS_TTL', '3600'))
+RESOURCE_CACHE_TTL = int(os.environ.get('RESOURCE_CACHE_TTL', '3600'))
+RESOURCE_CACHE_MAX_ITEM_BYTES = int(os.environ.get('RESOURCE_CACHE_MAX_ITEM_BYTES', str(2 * 1024 * 1024)))
+RESOURCE_SINGLE_FLIGHT_WAIT = float(os.environ.get('RESOURCE_SINGLE_FLIGHT_WAIT', '30'))
+
+# Per-process cache (nothing cross-worker belongs here; see SHARED_STATE_URL)
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
@@ -147,6 +158,74 @@ CACHES = {
     }
 }
 
+# Background investigation jobs run on their own pool, separate from the link checker
+INVESTIGATION_JOB_WORKERS = int(os.environ.get('INVESTIGATION_JOB_WORKERS', '2'))
+# Shared pool for the /server-status probes that run alongside investigation fetches
+INVESTIGATION_PROBE_WORKERS = int(os.environ.get('INVESTIGATION_PROBE_WORKERS', '4'))
+
+# Page snapshot store shared by the checker, sandbox and investigator
+SNAPSHOT_ROOT = Path(os.environ.get('SNAPSHOT_ROOT', BASE_DIR / 'snapshots'))
+# Snapshots younger than this are reused instead of fetching the page again
+SNAPSHOT_FRESH_SECONDS = int(os.environ.get('SNAPSHOT_FRESH_SECONDS', '600'))
+SNAPSHOT_MAX_BYTES = int(os.environ.get('SNAPSHOT_MAX_BYTES', str(5 * 1024 * 1024)))
+
+# Tor SOCKS port; unset means discover a running Tor (9050, then 9150) or launch one
+TOR_SOCKS_PORT = int(os.environ.get('TOR_SOCKS_PORT', '0')) or None
+# Control port of an existing Tor (a launched Tor's is found through TOR_DATA_DIR); cookie auth, or this password
+TOR_CONTROL_PORT = int(os.environ.get('TOR_CONTROL_PORT', '0')) or None
+TOR_CONTROL_PASSWORD = os.environ.get('TOR_CONTROL_PASSWORD') or None
+# Keep on persistent storage: the cached consensus and descriptors make restarts bootstrap in seconds
+TOR_DATA_DIR = Path(os.environ.get('TOR_DATA_DIR', BASE_DIR / 'tor_data'))
+# How long startup waits for "Bootstrapped 100%", and circuits to build before serving traffic
+TOR_BOOTSTRAP_TIMEOUT = float(os.environ.get('TOR_BOOTSTRAP_TIMEOUT', '120'))
+TOR_WARM_CIRCUITS = int(os.environ.get('TOR_WARM_CIRCUITS', '2'))
+# Bulk checks fetch onion descriptors up front (HSFETCH on the control port) and skip onions that have none
+HS_PREFETCH_ENABLED = os.environ.get('HS_PREFETCH_ENABLED', 'True') == 'True'
+HS_PREFETCH_CONCURRENCY = int(os.environ.get('HS_PREFETCH_CONCURRENCY', '16'))
+HS_PREFETCH_TIMEOUT = float(os.environ.get('HS_PREFETCH_TIMEOUT', '20'))
+# Transient Tor failures (introduction/rendezvous failed...) are retried this many times
+CHECK_TRANSIENT_RETRIES = int(os.environ.get('CHECK_TRANSIENT_RETRIES', '1'))
+# A permanent failure (no descriptor, client auth...) is reused for this long instead of probing again
+PERMANENT_FAILURE_TTL = int(os.environ.get('PERMANENT_FAILURE_TTL', '900'))
+# Per-host connect / first byte / total deadlines from latency history (p95 x margin, at most the checker timeout)
+ADAPTIVE_TIMEOUTS = os.environ.get('ADAPTIVE_TIMEOUTS', 'True') == 'True'
+ADAPTIVE_TIMEOUT_MARGIN = float(os.environ.get('ADAPTIVE_TIMEOUT_MARGIN', '2.0'))
+# Cap on a whole search's link checks (seconds); links not started by then are left unchecked
+SEARCH_CHECK_DEADLINE = float(os.environ.get('SEARCH_CHECK_DEADLINE', '120'))
+# Requests with no response after the host's p90 time to first byte are sent again on another circuit
+# (or Tor2Web gateway); at most HEDGE_BUDGET_RATIO of requests are hedged, over HEDGE_CIRCUITS isolated circuits
+HEDGING_ENABLED = os.environ.get('HEDGING_ENABLED', 'True') == 'True'
+HEDGE_BUDGET_RATIO = float(os.environ.get('HEDGE_BUDGET_RATIO', '0.1'))
+HEDGE_MIN_DELAY = float(os.environ.get('HEDGE_MIN_DELAY', '1.0'))
+HEDGE_CIRCUITS = int(os.environ.get('HEDGE_CIRCUITS', '8'))
+# Check history (LinkCheck): rows are bulk-inserted per batch; prune_check_history folds raw rows older than
+# CHECK_HISTORY_RAW_DAYS into daily totals and drops daily totals older than CHECK_HISTORY_DAILY_DAYS
+CHECK_HISTORY_BATCH = int(os.environ.get('CHECK_HISTORY_BATCH', '500'))
+CHECK_HISTORY_FLUSH_SECONDS = float(os.environ.get('CHECK_HISTORY_FLUSH_SECONDS', '5'))
+CHECK_HISTORY_RAW_DAYS = int(os.environ.get('CHECK_HISTORY_RAW_DAYS', '14'))
+CHECK_HISTORY_DAILY_DAYS = int(os.environ.get('CHECK_HISTORY_DAILY_DAYS', '365'))
+# Background rechecks (manage.py recheck): Tor budget, and the interval before popularity, volatility and backoff
+RECHECK_BUDGET_PER_MINUTE = float(os.environ.get('RECHECK_BUDGET_PER_MINUTE', '30'))
+RECHECK_INTERVAL = int(os.environ.get('RECHECK_INTERVAL', str(6 * 3600)))
+RECHECK_MIN_INTERVAL = int(os.environ.get('RECHECK_MIN_INTERVAL', '1800'))
+RECHECK_MAX_INTERVAL = int(os.environ.get('RECHECK_MAX_INTERVAL', str(7 * 86400)))
+# Links that stay dead are rechecked up to 2^RECHECK_MAX_BACKOFF times less often
+RECHECK_MAX_BACKOFF = int(os.environ.get('RECHECK_MAX_BACKOFF', '6'))
+# Checker workers (manage.py check_worker) lease this many due links at a time, renewed by heartbeat
+CHECK_WORKER_BATCH = int(os.environ.get('CHECK_WORKER_BATCH', '20'))
+CHECK_LEASE_SECONDS = int(os.environ.get('CHECK_LEASE_SECONDS', '120'))
+
+# Metrics: with several gunicorn workers, each writes snapshots here for /metrics to merge
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', '5'))
+
+# Opt-in profiling: staff requests with PROFILING_HEADER, plus a sampled share of requests and jobs
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'False') == 'True'
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', '0'))
+PROFILING_HEADER = os.environ.get('PROFILING_HEADER', 'X-Profile')
+PROFILING_INTERVAL = float(os.environ.get('PROFILING_INTERVAL', '0.005'))
+PROFILING_KEEP = int(os.environ.get('PROFILING_KEEP', '500'))
+
 # Security settings for production
 if not DEBUG:
     SECURE_SSL_REDIRECT = True
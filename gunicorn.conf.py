@@ -0,0 +1,34 @@
+"""
+Gunicorn settings, read automatically from the working directory.
+
+Tor is found or launched and bootstrapped in the master before any worker
+forks. Each worker then checks that Tor is ready before it accepts requests.
+The workers share the master's Tor, found through TOR_DATA_DIR, and the
+master stops the Tor it launched on exit.
+
+Works for sync workers (darkweb_checker.wsgi:application) and uvicorn
+workers (-k uvicorn.workers.UvicornWorker darkweb_checker.asgi:application).
+"""
+
+import os
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'darkweb_checker.settings')
+
+# Startup waits for Tor to bootstrap; give a cold start (no cached consensus) room
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '120'))
+
+
+def on_starting(server):
+    # Only settings are needed here; django.setup() in the master would start threads that don't survive fork
+    from links.services.tor_service import warm_up
+    warm_up()
+
+
+def post_worker_init(worker):
+    from links.services.tor_service import warm_up
+    warm_up()
+
+
+def on_exit(server):
+    from links.services.tor_service import get_tor_service
+    get_tor_service().stop()
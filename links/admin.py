@@ -1,5 +1,10 @@
 from django.contrib import admin
-from .models import OnionLink, SearchSource, Investigation
+from django.utils.html import format_html, format_html_join
+from .models import (
+    OnionLink, SearchSource, Investigation, CrawlJob, CrawlPage, Entity, EntitySighting,
+    PageSnapshot, SnapshotBlob, PageFingerprint, LinkStats, LinkCheck, LinkCheckDay, CheckWorker, SearchTrace,
+    RequestProfile,
+)
 
 
 @admin.register(SearchSource)
@@ -11,8 +16,8 @@ class SearchSourceAdmin(admin.ModelAdmin):
 
 @admin.register(OnionLink)
 class OnionLinkAdmin(admin.ModelAdmin):
-    list_display = ['url', 'status', 'status_code', 'response_time', 'source', 'last_checked']
-    list_filter = ['status', 'source']
+    list_display = ['url', 'status', 'failure_reason', 'status_code', 'response_time', 'source', 'last_checked']
+    list_filter = ['status', 'failure_reason', 'source']
     search_fields = ['url', 'title', 'keywords']
     readonly_fields = ['last_checked', 'created_at']
 
@@ -41,3 +46,115 @@ class InvestigationAdmin(admin.ModelAdmin):
     eth_count.short_description = 'Ethereum'
 
 
+@admin.register(CrawlJob)
+class CrawlJobAdmin(admin.ModelAdmin):
+    list_display = ['seed_url', 'status', 'pages_fetched', 'pages_failed', 'max_pages', 'max_depth', 'throughput', 'created_at']
+    list_filter = ['status']
+    search_fields = ['seed_url']
+    readonly_fields = ['created_at', 'finished_at', 'elapsed_seconds']
+    exclude = ['seen_filter']
+
+    def throughput(self, obj):
+        return f"{obj.pages_per_second:.2f} pages/sec"
+    throughput.short_description = 'Throughput'
+
+
+@admin.register(CrawlPage)
+class CrawlPageAdmin(admin.ModelAdmin):
+    list_display = ['url', 'job', 'depth', 'state', 'status_code', 'links_found', 'fetched_at']
+    list_filter = ['state', 'depth']
+    search_fields = ['url']
+    raw_id_fields = ['job']
+
+
+@admin.register(Entity)
+class EntityAdmin(admin.ModelAdmin):
+    list_display = ['value', 'entity_type', 'created_at']
+    list_filter = ['entity_type']
+    search_fields = ['=value']
+
+
+@admin.register(EntitySighting)
+class EntitySightingAdmin(admin.ModelAdmin):
+    list_display = ['entity', 'onion_host', 'investigation', 'crawl_page', 'seen_at']
+    search_fields = ['=entity__value', 'onion_host']
+    raw_id_fields = ['entity', 'investigation', 'crawl_page']
+
+
+@admin.register(SnapshotBlob)
+class SnapshotBlobAdmin(admin.ModelAdmin):
+    list_display = ['content_hash', 'size', 'compressed_size', 'codec', 'created_at']
+    list_filter = ['codec']
+    search_fields = ['=content_hash']
+
+
+@admin.register(PageSnapshot)
+class PageSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['url', 'source', 'status_code', 'content_type', 'fetched_at']
+    list_filter = ['source', 'status_code']
+    search_fields = ['url']
+    raw_id_fields = ['blob']
+
+
+@admin.register(PageFingerprint)
+class PageFingerprintAdmin(admin.ModelAdmin):
+    list_display = ['onion_link', 'cluster', 'updated_at']
+    search_fields = ['onion_link__url']
+    raw_id_fields = ['onion_link', 'cluster']
+
+
+@admin.register(LinkStats)
+class LinkStatsAdmin(admin.ModelAdmin):
+    list_display = ['onion_link', 'check_count', 'alive_count', 'median_response_time', 'ewma_response_time',
+                    'last_seen_alive', 'updated_at']
+    search_fields = ['onion_link__url']
+    raw_id_fields = ['onion_link']
+
+
+@admin.register(LinkCheck)
+class LinkCheckAdmin(admin.ModelAdmin):
+    list_display = ['onion_link', 'checked_at', 'alive', 'latency_ms', 'failure_reason']
+    list_filter = ['alive', 'failure_reason']
+    raw_id_fields = ['onion_link']
+    # A COUNT(*) over millions of rows on every page
+    show_full_result_count = False
+
+
+@admin.register(LinkCheckDay)
+class LinkCheckDayAdmin(admin.ModelAdmin):
+    list_display = ['onion_link', 'day', 'checks', 'alive', 'mean_latency_ms']
+    list_filter = ['day']
+    raw_id_fields = ['onion_link']
+
+
+@admin.register(CheckWorker)
+class CheckWorkerAdmin(admin.ModelAdmin):
+    list_display = ['name', 'hostname', 'checks_per_minute', 'checks', 'alive', 'dead', 'leases_reclaimed',
+                    'last_heartbeat', 'stopped_at']
+    readonly_fields = ['started_at']
+
+
+@admin.register(SearchTrace)
+class SearchTraceAdmin(admin.ModelAdmin):
+    list_display = ['keyword', 'search_id', 'started_at', 'duration']
+    search_fields = ['keyword', 'search_id']
+    readonly_fields = ['started_at', 'finished_at']
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'kind', 'name', 'key', 'status_code', 'duration', 'sql_queries', 'sql_time', 'samples']
+    list_filter = ['kind', 'created_at']
+    search_fields = ['key', 'name']
+    readonly_fields = [
+        'key', 'kind', 'name', 'status_code', 'duration', 'sql_queries', 'sql_time', 'samples', 'interval',
+        'hot_frames_display', 'stacks', 'created_at',
+    ]
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.display(description='Hot frames (share of samples)')
+    def hot_frames_display(self, obj):
+        rows = format_html_join('\n', '{}  {}', ((f'{share:6.1%}', frame) for frame, share in obj.hot_frames()))
+        return format_html('<pre>{}</pre>', rows)
@@ -10,7 +10,21 @@ class LinksConfig(AppConfig):
     name = 'links'
 
     def ready(self):
-        """Initialize the application"""        # Only initialize Tor when actually serving HTTP in the main process
+        """Initialize the application"""
+        from . import signals  # noqa: F401
+        from django.conf import settings
+        from .services import metrics
+
+        # Per-process snapshots for the multi-worker /metrics endpoint (needs METRICS_DIR)
+        metrics.start_flusher(getattr(settings, 'METRICS_FLUSH_INTERVAL', 5.0))
+
+        # SQL counting for profiles; nothing is hooked unless profiling is enabled
+        from .services import profiling
+        if profiling.enabled():
+            from django.db.backends.signals import connection_created
+            connection_created.connect(profiling.install_sql_hook, dispatch_uid='profiling_sql_hook')
+
+        # Only initialize Tor when actually serving HTTP in the main process
         import sys
         # Determine primary Django management command (first non-flag arg)
         cmd = next((arg for arg in sys.argv[1:] if not arg.startswith('-')), '')
@@ -21,23 +35,11 @@ class LinksConfig(AppConfig):
             # Skip Tor init for other commands like "check", "migrate", shell, tests, etc.
             return
 
-        # Skip Tor initialization in cloud environments
-        cloud_indicators = ['RENDER', 'DYNO', 'RAILWAY_ENVIRONMENT', 'VERCEL']
-        is_cloud = any(os.environ.get(indicator) for indicator in cloud_indicators)
-
-        if is_cloud:
-            logger.info("Cloud environment detected - using Tor2Web gateways")
-            logger.info("No local Tor service needed")
-            return
-
-        # Local environment - try to start Tor
+        # Find or launch Tor and wait for it to bootstrap (skipped in cloud environments).
+        # Under gunicorn the hooks in gunicorn.conf.py do this instead.
         try:
-            from links.services.tor_service import get_tor_service
+            from links.services.tor_service import warm_up
             logger.info("Initializing embedded Tor service...")
-            service = get_tor_service()
-            if service.start() and service.is_running:
-                logger.info(f"✅ Tor service ready on port {service.get_socks_port()}")
-            else:
-                logger.warning("⚠️ Tor service not available. Install Tor from https://www.torproject.org/download/")
+            warm_up()
         except Exception as e:
             logger.error(f"Failed to initialize Tor service: {e}")
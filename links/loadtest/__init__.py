@@ -0,0 +1,5 @@
+"""
+Offline load-test harness: a fake SOCKS5 proxy serving in-process onion sites
+and search engines, and a driver for the app's search, sandbox and
+investigation flows. Run it with ``python manage.py loadtest``.
+"""
@@ -0,0 +1,187 @@
+"""
+Load-test driver: concurrent user flows against the app's own views.
+
+Each flow does what an analyst does in the browser, through Django's test
+client:
+
+1. submit a search
+2. poll check progress until the search completes
+3. open a few alive results in the sandbox, with their resources
+4. investigate some results and poll each job until it finishes
+
+Every request is timed per operation. The search's time to first alive
+result and time to completion are timed too.
+
+``run_streams`` is a separate scenario: many slow sandbox downloads at once,
+served either WSGI-style (a fixed pool of threads, one per request) or
+ASGI-style (one event loop), to compare how many a process holds open.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import re
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from django.test import AsyncClient, Client
+
+POLL_INTERVAL = 0.2
+FLOW_DEADLINE = 600
+
+# Resources a browser would load for the page: images/scripts and stylesheets, not links
+_RESOURCE_URL = re.compile(r'(?:src=|<link[^>]*href=)["\'](/sandbox/resource/\d+/[A-Za-z0-9_=-]+/)')
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile (q in 0..100)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), -(-len(ordered) * q // 100)))
+    return ordered[int(rank) - 1]
+
+
+@dataclass
+class FlowOptions:
+    sandbox_loads: int = 2
+    investigations: int = 1
+
+
+class Recorder:
+    """Latencies and error counts per operation, shared by all flows"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def record(self, operation: str, seconds: float, ok: bool = True) -> None:
+        with self._lock:
+            if ok:
+                self.samples[operation].append(seconds)
+            else:
+                self.errors[operation] += 1
+
+    def timed(self, operation: str, func, ok=lambda response: response.status_code < 400):
+        started = time.perf_counter()
+        try:
+            response = func()
+        except Exception:
+            self.record(operation, time.perf_counter() - started, ok=False)
+            raise
+        self.record(operation, time.perf_counter() - started, ok=ok(response))
+        return response
+
+    def summary(self, wall_seconds: float) -> List[dict]:
+        rows = []
+        for operation in sorted(set(self.samples) | set(self.errors)):
+            values = self.samples.get(operation, [])
+            rows.append({
+                'operation': operation,
+                'count': len(values),
+                'errors': self.errors.get(operation, 0),
+                'throughput': len(values) / wall_seconds if wall_seconds else 0.0,
+                'p50': percentile(values, 50),
+                'p95': percentile(values, 95),
+                'p99': percentile(values, 99),
+                'max': max(values) if values else None,
+            })
+        return rows
+
+
+def run_flow(keyword: str, options: FlowOptions, recorder: Recorder) -> None:
+    """One analyst: search, wait for checks, open results, investigate"""
+    client = Client()
+    started = time.perf_counter()
+    response = recorder.timed('search submit', lambda: client.post('/search/', {'keyword': keyword}),
+                              ok=lambda r: r.status_code == 302 and '/results/' in r['Location'])
+    location = response.get('Location', '')
+    if '/results/' not in location:
+        return
+    search_id = location.rstrip('/').rsplit('/', 1)[-1]
+
+    first_alive = None
+    alive_ids: List[int] = []
+    while time.perf_counter() - started < FLOW_DEADLINE:
+        progress = recorder.timed('check progress', lambda: client.get(f'/check-progress/{search_id}/')).json()
+        alive_ids = [link['id'] for link in progress['alive_links']]
+        if alive_ids and first_alive is None:
+            first_alive = time.perf_counter() - started
+            recorder.record('search first alive', first_alive)
+        if progress['complete']:
+            break
+        time.sleep(POLL_INTERVAL)
+    recorder.record('search complete', time.perf_counter() - started,
+                    ok=time.perf_counter() - started < FLOW_DEADLINE)
+
+    for link_id in alive_ids[:options.sandbox_loads]:
+        page = recorder.timed('sandbox page', lambda: client.get(f'/sandbox/{link_id}/'))
+        if page.status_code == 200:
+            for resource in set(_RESOURCE_URL.findall(page.json().get('content', ''))):
+                recorder.timed('sandbox resource', lambda: client.get(resource))
+
+    for link_id in alive_ids[options.sandbox_loads:options.sandbox_loads + options.investigations]:
+        submitted = time.perf_counter()
+        response = recorder.timed('investigation submit', lambda: client.post(f'/investigate/{link_id}/'),
+                                  ok=lambda r: r.status_code == 302)
+        job_id = response.get('Location', '').rstrip('/').rsplit('/', 1)[-1]
+        if not job_id.isdigit():
+            continue
+        status = 'queued'
+        while time.perf_counter() - submitted < FLOW_DEADLINE:
+            status = client.get(f'/investigation-job/{job_id}/status/').json()['status']
+            if status in ('done', 'failed'):
+                break
+            time.sleep(POLL_INTERVAL)
+        recorder.record('investigation', time.perf_counter() - submitted, ok=status == 'done')
+
+
+def run_streams(server: str, urls: List[str], threads: int, recorder: Recorder) -> None:
+    """
+    Download every URL at once and read each body to the end.
+
+    ``wsgi``: a pool of ``threads`` threads, like a gunicorn sync/gthread
+    worker; a download holds its thread until the body is done.
+    ``asgi``: all downloads on one event loop, like a uvicorn worker.
+    """
+    if server == 'wsgi':
+        def download(url):
+            client = Client()
+            started = time.perf_counter()
+            try:
+                response = client.get(url)
+                body = b''.join(response) if response.streaming else response.content
+            except Exception:
+                recorder.record('sandbox stream', time.perf_counter() - started, ok=False)
+                return
+            recorder.record('sandbox stream', time.perf_counter() - started, ok=response.status_code == 200 and bool(body))
+
+        with ThreadPoolExecutor(max_workers=max(1, threads)) as pool:
+            list(pool.map(download, urls))
+        return
+
+    async def download_async(client, url):
+        started = time.perf_counter()
+        try:
+            response = await client.get(url)
+            if response.streaming:
+                size = 0
+                async for chunk in response.streaming_content:
+                    size += len(chunk)
+            else:
+                size = len(response.content)
+        except Exception:
+            recorder.record('sandbox stream', time.perf_counter() - started, ok=False)
+            return
+        recorder.record('sandbox stream', time.perf_counter() - started, ok=response.status_code == 200 and size > 0)
+
+    async def main():
+        client = AsyncClient()
+        await asyncio.gather(*(download_async(client, url) for url in urls))
+
+    asyncio.run(main())
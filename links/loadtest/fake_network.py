@@ -0,0 +1,477 @@
+"""
+A fake Tor for load tests.
+
+FakeOnionNetwork is a local SOCKS5 server. It resolves ``.onion`` hostnames
+to in-process fake sites instead of the Tor network. Each site is alive, dead
+or stalled, fixed when the network is built:
+
+- dead: Tor's extended SOCKS error 0xF0 (descriptor not found) after the
+  rendezvous delay
+- stalled: the proxy never answers, so the client times out
+
+A ``flaky_rate`` share of connections to alive sites fail with 0xF2
+(introduction failed), a transient error the checker retries.
+
+Alive sites pay a lognormal rendezvous delay before the SOCKS reply and a
+lognormal time to first byte, then serve a page of lognormal size with
+contact artifacts, links to other sites and a stylesheet and image for the
+sandbox. Some sites are mirrors of another site's page. Alive sites also
+serve ``/files/<n>k.bin``: n KiB paced at ``stream_bandwidth``, for
+long-running sandbox downloads.
+
+A minimal Tor control port (``control_port``) answers what the app asks
+of it: bootstrap status, SOCKS listeners and ``HSFETCH`` with ``HS_DESC``
+events (RECEIVED for live sites, FAILED NOT_FOUND from a different HSDir
+each time for dead or unknown ones). Once a descriptor is cached, by
+HSFETCH or by an earlier connection, connecting to that site costs
+``descriptor_share`` less of the rendezvous delay.
+
+Two search engines are part of the network. Their result pages use the
+markup the Ahmia and Onionland parsers in services.scraper expect, so the
+real scraper, canonicalizer, checker, sandbox and investigator all run
+unchanged against it.
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import html
+import math
+import random
+import re
+import socket
+import socketserver
+import struct
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+# SOCKS5 reply codes
+SOCKS_OK = 0x00
+SOCKS_DESCRIPTOR_NOT_FOUND = 0xF0
+SOCKS_INTRO_FAILED = 0xF2
+STREAM_CHUNK = 16 * 1024
+CONTROL_INFO = {
+    'version': '0.4.8.12',
+    'status/bootstrap-phase': 'NOTICE BOOTSTRAP PROGRESS=100 TAG=done SUMMARY="Done"',
+    'net/listeners/socks': '"127.0.0.1:{port}"',
+}
+_FILE_PATH = re.compile(r'/files/(\d+)k\.bin')
+
+WORDS = (
+    'market forum wiki mirror archive escrow vendor secure private hidden service index directory '
+    'guide library news chat mail host bitcoin monero support verified listing category search'
+).split()
+# Well-known valid addresses so the investigator's checksum validation accepts them
+BTC_ADDRESSES = ['1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa', '12c6DSiU4Rq3P4ZxziKxzrGuvmmVaKHy2H']
+PNG_PIXEL = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=='
+)
+
+
+def onion_address(seed: bytes) -> str:
+    """Deterministic valid v3 onion hostname (with checksum) for ``seed``"""
+    pubkey = hashlib.sha256(seed).digest()
+    checksum = hashlib.sha3_256(b'.onion checksum' + pubkey + b'\x03').digest()[:2]
+    return base64.b32encode(pubkey + checksum + b'\x03').decode().lower() + '.onion'
+
+
+@dataclass
+class NetworkProfile:
+    """Shape of the fake network; latencies in seconds, page size in bytes"""
+    sites: int = 300
+    dead_rate: float = 0.3
+    stall_rate: float = 0.02
+    mirror_rate: float = 0.1
+    connect_median: float = 0.8
+    connect_sigma: float = 0.8
+    first_byte_median: float = 0.3
+    first_byte_sigma: float = 0.6
+    page_size_median: int = 20_000
+    page_size_sigma: float = 0.8
+    engine_latency: float = 1.0
+    results_per_engine: int = 30
+    stall_seconds: float = 45.0
+    stream_bandwidth: int = 256_000  # bytes/s for /files/<n>k.bin downloads
+    descriptor_share: float = 0.4  # part of the rendezvous delay that is the descriptor lookup
+    flaky_rate: float = 0.0
+    # Share of connections that land on a bad circuit and take slow_circuit_seconds longer
+    slow_circuit_rate: float = 0.0
+    slow_circuit_seconds: float = 20.0
+    seed: int = 1
+
+
+@dataclass
+class FakeSite:
+    host: str
+    state: str  # alive, dead or stalled
+    title: str
+    page_size: int
+    links: List[str] = field(default_factory=list)
+    mirror_of: Optional['FakeSite'] = None
+    _page: Optional[bytes] = None
+
+    def page(self) -> bytes:
+        if self.mirror_of is not None:
+            return self.mirror_of.page()
+        if self._page is None:
+            self._page = self._render()
+        return self._page
+
+    def _render(self) -> bytes:
+        rng = random.Random(self.host)
+        head = (
+            f'<html><head><title>{html.escape(self.title)}</title>'
+            '<link rel="stylesheet" href="/style.css"></head><body>'
+            f'<h1>{html.escape(self.title)}</h1><img src="/logo.png">'
+            f'<p>Contact: admin@{self.host[:10]}.example, pgp@{self.host[:6]}.example</p>'
+            f'<p>Donate: {rng.choice(BTC_ADDRESSES)}</p>'
+            + ''.join(f'<a href="http://{link}/">{link[:16]}</a> ' for link in self.links)
+        )
+        parts = [head]
+        size = len(head)
+        while size < self.page_size:
+            paragraph = '<p>' + ' '.join(rng.choice(WORDS) for _ in range(60)) + '</p>'
+            parts.append(paragraph)
+            size += len(paragraph)
+        parts.append('</body></html>')
+        return ''.join(parts).encode()
+
+
+class FakeSearchEngine:
+    """A search engine whose result pages match one of the scraper's parsers"""
+
+    def __init__(self, name: str, layout: str, host: str, network: 'FakeOnionNetwork'):
+        self.name = name
+        self.layout = layout
+        self.host = host
+        self.network = network
+
+    @property
+    def search_url_pattern(self) -> str:
+        return f'http://{self.host}/search/?q={{query}}'
+
+    def results(self, query: str) -> List[FakeSite]:
+        """A stable pseudo-random slice of the network; engines overlap by about half"""
+        sites = self.network.site_list
+        rng = random.Random(f'{query}:{self.layout}')
+        shared = random.Random(query)
+        count = min(self.network.profile.results_per_engine, len(sites))
+        common = shared.sample(sites, count // 2)
+        own = rng.sample(sites, count - len(common))
+        seen, results = set(), []
+        for site in common + own:
+            if site.host not in seen:
+                seen.add(site.host)
+                results.append(site)
+        return results
+
+    def page(self, query: str) -> bytes:
+        items = []
+        for site in self.results(query):
+            title, desc = html.escape(site.title), html.escape(f'{site.title} - {query}')
+            if self.layout == 'ahmia':
+                items.append(f'<li class="result"><h4>{title}</h4><a href="http://{site.host}">{site.host}</a><p>{desc}</p></li>')
+            else:
+                items.append(
+                    f'<div class="search-result"><h3>{title}</h3><a class="onion-link" href="http://{site.host}/">'
+                    f'{site.host}</a><div class="description">{desc}</div></div>'
+                )
+        if self.layout == 'ahmia':
+            body = '<ol class="searchResults">' + ''.join(items) + '</ol>'
+        else:
+            body = '<div class="results">' + ''.join(items) + '</div>'
+        return f'<html><head><title>{self.name}</title></head><body>{body}</body></html>'.encode()
+
+
+class FakeOnionNetwork:
+    """SOCKS5 server on 127.0.0.1 resolving .onion hosts to fake sites"""
+
+    def __init__(self, profile: Optional[NetworkProfile] = None):
+        self.profile = profile or NetworkProfile()
+        self._rng = random.Random(self.profile.seed)
+        self._rng_lock = threading.Lock()
+        self.sites: Dict[str, FakeSite] = {}
+        self.engines: Dict[str, FakeSearchEngine] = {}
+        self._build()
+        self._server: Optional[socketserver.ThreadingTCPServer] = None
+        self._control: Optional[socketserver.ThreadingTCPServer] = None
+        self.descriptors: set = set()  # hosts whose descriptor the fake Tor has cached
+        self.hsfetches = 0
+        self.connections = 0
+        self.open_connections = 0
+        self.peak_connections = 0
+
+    def _build(self):
+        p = self.profile
+        rng = random.Random(p.seed)
+        hosts = [onion_address(f'{p.seed}:site:{i}'.encode()) for i in range(p.sites)]
+        for host in hosts:
+            roll = rng.random()
+            state = 'dead' if roll < p.dead_rate else 'stalled' if roll < p.dead_rate + p.stall_rate else 'alive'
+            self.sites[host] = FakeSite(
+                host=host,
+                state=state,
+                title=' '.join(rng.choice(WORDS) for _ in range(3)).title(),
+                page_size=int(rng.lognormvariate(math.log(p.page_size_median), p.page_size_sigma)),
+                links=rng.sample(hosts, min(3, len(hosts))),
+            )
+        self.site_list = list(self.sites.values())
+        alive = [site for site in self.site_list if site.state == 'alive']
+        for site in alive:
+            if rng.random() < p.mirror_rate and len(alive) > 1:
+                original = rng.choice(alive)
+                if original is not site and original.mirror_of is None:
+                    site.mirror_of = original
+        for name, layout in (('Ahmia', 'ahmia'), ('Onionland', 'onionland')):
+            host = onion_address(f'{p.seed}:engine:{layout}'.encode())
+            self.engines[host] = FakeSearchEngine(f'{name} (load test)', layout, host, self)
+
+    # --- Lifecycle
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    @property
+    def control_port(self) -> int:
+        return self._control.server_address[1]
+
+    def start(self) -> 'FakeOnionNetwork':
+        network = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                network._handle(self.request)
+
+        class ControlHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                network._handle_control(self.rfile, self.wfile)
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self._server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='fake-socks', daemon=True).start()
+        self._control = socketserver.ThreadingTCPServer(('127.0.0.1', 0), ControlHandler)
+        self._control.daemon_threads = True
+        threading.Thread(target=self._control.serve_forever, name='fake-control', daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        for server in (self._server, self._control):
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+        self._server = self._control = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    # --- SOCKS5
+
+    def _sample(self, median: float, sigma: float) -> float:
+        with self._rng_lock:
+            return self._rng.lognormvariate(math.log(max(median, 1e-6)), sigma) if median > 0 else 0.0
+
+    def _handle(self, sock: socket.socket) -> None:
+        with self._rng_lock:
+            self.connections += 1
+            self.open_connections += 1
+            self.peak_connections = max(self.peak_connections, self.open_connections)
+        try:
+            host = self._negotiate(sock)
+            if host is None:
+                return
+            engine = self.engines.get(host)
+            site = self.sites.get(host)
+            if engine is not None:
+                time.sleep(self._sample(self.profile.engine_latency, 0.3))
+            elif site is None or site.state == 'dead':
+                time.sleep(self._sample(self.profile.connect_median, self.profile.connect_sigma))
+                self._reply(sock, SOCKS_DESCRIPTOR_NOT_FOUND)
+                return
+            elif site.state == 'stalled':
+                # Hold the connection open without answering, like a stuck rendezvous
+                sock.settimeout(self.profile.stall_seconds)
+                try:
+                    sock.recv(1)
+                except OSError:
+                    pass
+                return
+            else:
+                delay = self._sample(self.profile.connect_median, self.profile.connect_sigma)
+                with self._rng_lock:
+                    cached = host in self.descriptors
+                    self.descriptors.add(host)
+                with self._rng_lock:
+                    if self._rng.random() < self.profile.slow_circuit_rate:
+                        delay += self.profile.slow_circuit_seconds
+                time.sleep(delay * (1 - self.profile.descriptor_share) if cached else delay)
+                with self._rng_lock:
+                    flaky = self._rng.random() < self.profile.flaky_rate
+                if flaky:
+                    self._reply(sock, SOCKS_INTRO_FAILED)
+                    return
+            self._reply(sock, SOCKS_OK)
+            self._serve_http(sock, engine, site)
+        except (OSError, ValueError):
+            pass
+        finally:
+            with self._rng_lock:
+                self.open_connections -= 1
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def _serve_file(self, sock: socket.socket, size: int) -> None:
+        sock.sendall((
+            'HTTP/1.1 200 OK\r\nContent-Type: application/octet-stream\r\n'
+            f'Content-Length: {size}\r\nConnection: close\r\n\r\n'
+        ).encode())
+        chunk = b'\x00' * STREAM_CHUNK
+        pause = STREAM_CHUNK / self.profile.stream_bandwidth if self.profile.stream_bandwidth > 0 else 0
+        while size > 0:
+            sock.sendall(chunk[:size])
+            size -= STREAM_CHUNK
+            if pause:
+                time.sleep(pause)
+
+    def _recv_exact(self, sock: socket.socket, n: int) -> bytes:
+        data = b''
+        while len(data) < n:
+            chunk = sock.recv(n - len(data))
+            if not chunk:
+                raise ValueError('client closed the connection')
+            data += chunk
+        return data
+
+    def _negotiate(self, sock: socket.socket) -> Optional[str]:
+        version, methods = self._recv_exact(sock, 2)
+        if version != 5:
+            return None
+        offered = self._recv_exact(sock, methods)
+        if 0x02 in offered:
+            # Username/password, as Tor accepts it for stream isolation: any credentials pass
+            sock.sendall(b'\x05\x02')
+            self._recv_exact(sock, 1)
+            self._recv_exact(sock, self._recv_exact(sock, 1)[0])
+            self._recv_exact(sock, self._recv_exact(sock, 1)[0])
+            sock.sendall(b'\x01\x00')
+        else:
+            sock.sendall(b'\x05\x00')
+        _, command, _, address_type = self._recv_exact(sock, 4)
+        if address_type == 0x03:
+            host = self._recv_exact(sock, self._recv_exact(sock, 1)[0]).decode('ascii', 'replace').lower()
+        elif address_type == 0x01:
+            host = socket.inet_ntoa(self._recv_exact(sock, 4))
+        else:
+            host = socket.inet_ntop(socket.AF_INET6, self._recv_exact(sock, 16))
+        self._recv_exact(sock, 2)  # port
+        if command != 0x01:
+            self._reply(sock, 0x07)  # command not supported
+            return None
+        return host
+
+    def _reply(self, sock: socket.socket, code: int) -> None:
+        sock.sendall(struct.pack('!BBBB4sH', 5, code, 0, 1, b'\x00\x00\x00\x00', 0))
+
+    # --- Control port
+
+    def _handle_control(self, rfile, wfile) -> None:
+        write_lock = threading.Lock()
+
+        def send(text: str) -> None:
+            with write_lock:
+                try:
+                    wfile.write(text.encode())
+                    wfile.flush()
+                except (OSError, ValueError):
+                    pass
+
+        for raw in rfile:
+            command = raw.decode('latin-1').strip()
+            keyword, _, argument = command.partition(' ')
+            keyword = keyword.upper()
+            if keyword == 'PROTOCOLINFO':
+                send('250-PROTOCOLINFO 1\r\n250-AUTH METHODS=NULL\r\n250-VERSION Tor="0.4.8.12"\r\n250 OK\r\n')
+            elif keyword == 'GETINFO' and argument in CONTROL_INFO:
+                value = CONTROL_INFO[argument].format(port=self.port)
+                send(f'250-{argument}={value}\r\n250 OK\r\n')
+            elif keyword == 'GETINFO':
+                send(f'552 Unrecognized key "{argument}"\r\n')
+            elif keyword == 'GETCONF':
+                send(f'250 {argument}\r\n')
+            elif keyword == 'HSFETCH':
+                send('250 OK\r\n')
+                self._hsfetch(argument.split(' ', 1)[0], send)
+            elif keyword == 'QUIT':
+                send('250 closing connection\r\n')
+                return
+            else:
+                send('250 OK\r\n')
+
+    def _hsfetch(self, address: str, send) -> None:
+        """Answer HSFETCH with an HS_DESC event after a share of the rendezvous delay"""
+        host = f'{address}.onion'
+        site = self.sites.get(host)
+        exists = host in self.engines or (site is not None and site.state != 'dead')
+        delay = self._sample(self.profile.connect_median, self.profile.connect_sigma) * self.profile.descriptor_share
+        with self._rng_lock:
+            self.hsfetches += 1
+            hsdir = '%040X' % self._rng.getrandbits(160)
+
+        def answer():
+            if exists:
+                with self._rng_lock:
+                    self.descriptors.add(host)
+                send(f'650 HS_DESC RECEIVED {address} NO_AUTH ${hsdir}~hsdir {address}\r\n')
+            else:
+                send(f'650 HS_DESC FAILED {address} NO_AUTH ${hsdir}~hsdir {address} REASON=NOT_FOUND\r\n')
+
+        timer = threading.Timer(delay, answer)
+        timer.daemon = True
+        timer.start()
+
+    # --- HTTP
+
+    def _serve_http(self, sock: socket.socket, engine: Optional[FakeSearchEngine], site: Optional[FakeSite]) -> None:
+        request = b''
+        while b'\r\n\r\n' not in request:
+            chunk = sock.recv(4096)
+            if not chunk:
+                return
+            request += chunk
+            if len(request) > 65536:
+                return
+        target = request.split(b'\r\n', 1)[0].split(b' ')[1].decode('latin-1')
+        parsed = urlparse(target)
+        status, content_type, body = 404, 'text/plain', b'not found'
+        if engine is not None:
+            if parsed.path.rstrip('/') == '/search':
+                query = parse_qs(parsed.query).get('q', [''])[0]
+                status, content_type, body = 200, 'text/html; charset=utf-8', engine.page(query)
+        else:
+            time.sleep(self._sample(self.profile.first_byte_median, self.profile.first_byte_sigma))
+            if parsed.path in ('', '/', '/index.html'):
+                status, content_type, body = 200, 'text/html; charset=utf-8', site.page()
+            elif parsed.path == '/style.css':
+                status, content_type, body = 200, 'text/css', b'body{font-family:monospace}h1{color:#3b82f6}'
+            elif parsed.path == '/logo.png':
+                status, content_type, body = 200, 'image/png', PNG_PIXEL
+            elif _FILE_PATH.fullmatch(parsed.path):
+                self._serve_file(sock, int(parsed.path[len('/files/'):-len('k.bin')]) * 1024)
+                return
+        reason = {200: 'OK', 404: 'Not Found'}[status]
+        head = (
+            f'HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\n'
+            f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'
+        ).encode()
+        sock.sendall(head + body)
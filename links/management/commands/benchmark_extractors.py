@@ -0,0 +1,110 @@
+"""
+Django management command to benchmark the investigator's artifact extraction
+"""
+
+import base64
+import hashlib
+import random
+import re
+import time
+
+from bs4 import BeautifulSoup
+from django.core.management.base import BaseCommand
+
+from links.services.extractors import b58encode, extract_artifacts
+
+
+def legacy_extract(source_code):
+    """The pre-registry extractor: four regex scans plus a BeautifulSoup parse."""
+    emails = set(re.findall(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b', source_code))
+    btc = set(re.findall(r'\b[13][a-km-zA-HJ-NP-Z0-9]{26,33}\b', source_code))
+    xmr = set(re.findall(r'\b(?:4[0-9AB][1-9A-HJ-NP-Za-km-z]{93})\b', source_code))
+    eth = set(re.findall(r'\b(?:0x)[0-9a-fA-F]{40}\b', source_code))
+    soup = BeautifulSoup(source_code, 'html.parser')
+    links = [a['href'] for a in soup.find_all('a', href=True) if a['href'].startswith(('http://', 'https://'))]
+    return {
+        'emails': list(emails),
+        'btc_addresses': list(btc),
+        'monero_addresses': list(xmr),
+        'ethereum_addresses': list(eth),
+        'links': list(set(links))[:50],
+    }
+
+
+def _btc_address(rng):
+    payload = bytes([0]) + rng.randbytes(20)
+    checksum = hashlib.sha256(hashlib.sha256(payload).digest()).digest()[:4]
+    return b58encode(payload + checksum)
+
+
+def _onion_host(rng):
+    pubkey = rng.randbytes(32)
+    checksum = hashlib.sha3_256(b'.onion checksum' + pubkey + b'\x03').digest()[:2]
+    return base64.b32encode(pubkey + checksum + b'\x03').decode().lower()
+
+
+def build_page(size_bytes, seed=1337):
+    """Build a synthetic market-style page of roughly ``size_bytes``."""
+    rng = random.Random(seed)
+    words = ['vendor', 'escrow', 'listing', 'shipping', 'contact', 'support', 'price', 'review',
+             'lorem', 'ipsum', 'dolor', 'encrypted', 'mirror', 'verified', 'forum']
+    parts = ['<html><head><title>Benchmark Market</title></head><body>']
+    size = len(parts[0])
+    i = 0
+    while size < size_bytes:
+        text = ' '.join(rng.choice(words) for _ in range(40))
+        host = _onion_host(rng)
+        chunk = (
+            f'<div class="listing" id="item-{i}"><h3>{rng.choice(words).title()} #{i}</h3>'
+            f'<p>{text}</p>'
+            f'<a href="http://{host}.onion/item/{i}">mirror</a> '
+            f'<a href="/local/{i}">details</a>'
+        )
+        if i % 10 == 0:
+            chunk += f'<p>Pay to {_btc_address(rng)} or mail seller{i}@example.com</p>'
+        if i % 25 == 0:
+            chunk += f'<p>ETH 0x{rng.randbytes(20).hex()}</p>'
+        chunk += '</div>\n'
+        parts.append(chunk)
+        size += len(chunk)
+        i += 1
+    parts.append('</body></html>')
+    return ''.join(parts)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark single-pass artifact extraction against the legacy extractor (MB/s)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=str, default='0.5,2,8', help='Comma-separated page sizes in MB')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per size (best time is reported)')
+        parser.add_argument('--no-validate', action='store_true', help='Skip checksum validation in the new extractor')
+
+    def _best_time(self, func, page, repeat):
+        best = None
+        result = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func(page)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
+
+    def handle(self, *args, **options):
+        validate = not options['no_validate']
+        sizes = [float(s) for s in options['sizes'].split(',') if s.strip()]
+
+        self.stdout.write(f'{"size":>8} {"legacy MB/s":>12} {"single-pass MB/s":>17} {"speedup":>8}  findings (legacy / new)')
+        for size_mb in sizes:
+            page = build_page(int(size_mb * 1024 * 1024))
+            mb = len(page.encode()) / (1024 * 1024)
+
+            legacy_time, legacy = self._best_time(legacy_extract, page, options['repeat'])
+            new_time, new = self._best_time(lambda p: extract_artifacts(p, validate=validate), page, options['repeat'])
+
+            legacy_count = sum(len(v) for k, v in legacy.items() if k != 'links')
+            new_count = sum(len(v) for k, v in new.items() if k != 'links')
+            self.stdout.write(
+                f'{mb:>6.2f}MB {mb / legacy_time:>12.2f} {mb / new_time:>17.2f} {legacy_time / new_time:>7.1f}x'
+                f'  {legacy_count} / {new_count}'
+            )
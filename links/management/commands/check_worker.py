@@ -0,0 +1,58 @@
+"""
+Django management command to run a checker worker against the shared database
+"""
+
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from links.models import CheckWorker
+from links.services.leases import LeaseWorker
+from links.services.link_checker import OnionLinkCheckerService
+
+
+class Command(BaseCommand):
+    help = 'Check due links leased from the shared database; run one per node (each with its own Tor) to scale out'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--name', help='Worker name (default: host:pid:random)')
+        parser.add_argument('--batch', type=int, default=None, help='Links leased at a time (default: CHECK_WORKER_BATCH)')
+        parser.add_argument('--budget', type=float, default=None,
+                            help='Checks per minute for this worker (default: RECHECK_BUDGET_PER_MINUTE)')
+        parser.add_argument('--workers', type=int, default=8, help='Simultaneous checks within a batch')
+        parser.add_argument('--timeout', type=int, default=30, help='Per-check timeout in seconds')
+        parser.add_argument('--max-checks', type=int, default=None, help='Stop after this many links')
+        parser.add_argument('--status', action='store_true', help='List workers and their throughput, then exit')
+
+    def _status(self):
+        now = timezone.now()
+        for worker in CheckWorker.objects.all()[:50]:
+            if worker.stopped_at:
+                state = 'stopped'
+            else:
+                state = f'{(now - worker.last_heartbeat).total_seconds():.0f}s ago'
+            self.stdout.write(
+                f'{worker.name:<40} {worker.checks_per_minute:7.1f}/min  {worker.checks:>7} checks '
+                f'({worker.alive} alive)  heartbeat {state}'
+            )
+
+    def handle(self, *args, **options):
+        if options['status']:
+            self._status()
+            return
+        if options['budget'] is not None and options['budget'] <= 0:
+            raise CommandError('--budget must be positive')
+
+        worker = LeaseWorker(
+            OnionLinkCheckerService(timeout=options['timeout']),
+            name=options['name'],
+            batch_size=options['batch'],
+            budget=options['budget'],
+            workers=options['workers'],
+        )
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: worker.stop())
+        self.stdout.write(f'Worker {worker.name}: leasing {worker.batch_size} links at a time, '
+                          f'up to {worker.budget:g} checks/minute (Ctrl+C to stop)...')
+        checked = worker.run(max_checks=options['max_checks'])
+        self.stdout.write(self.style.SUCCESS(f'✅ Worker {worker.name} checked {checked} link(s)'))
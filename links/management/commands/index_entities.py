@@ -0,0 +1,31 @@
+"""
+Django management command to (re)build the inverted entity index
+"""
+
+from django.core.management.base import BaseCommand
+from links.models import CrawlPage, Investigation
+from links.services.entity_index import index_crawl_page, index_investigation
+
+
+class Command(BaseCommand):
+    help = 'Backfill the entity index from existing investigations and crawled pages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--skip-crawl', action='store_true', help='Only index investigations')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Rows fetched per database round trip')
+
+    def _index(self, label, queryset, index_func, chunk_size):
+        rows = 0
+        sightings = 0
+        for obj in queryset.iterator(chunk_size=chunk_size):
+            sightings += index_func(obj)
+            rows += 1
+            if rows % chunk_size == 0:
+                self.stdout.write(f'  {label}: {rows} indexed...')
+        self.stdout.write(self.style.SUCCESS(f'✅ {label}: {rows} indexed, {sightings} sighting(s)'))
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        self._index('Investigations', Investigation.objects.order_by('id'), index_investigation, chunk_size)
+        if not options['skip_crawl']:
+            self._index('Crawl pages', CrawlPage.objects.filter(state='done').order_by('id'), index_crawl_page, chunk_size)
@@ -0,0 +1,88 @@
+"""
+Django management command to investigate a list of onion URLs concurrently
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from links.models import Investigation, OnionLink
+from links.services.investigator import OnionInvestigator, save_investigation
+from links.services.onion_url import canonicalize_onion_url
+
+
+class Command(BaseCommand):
+    help = 'Investigate onion URLs from a file (one per line) with per-host rate limits'
+
+    def add_arguments(self, parser):
+        parser.add_argument('url_file', type=str, help='Path to a file with one URL per line (# for comments)')
+        parser.add_argument('--workers', type=int, default=5, help='Maximum simultaneous investigations')
+        parser.add_argument('--per-host', type=int, default=1, help='Simultaneous investigations per onion host')
+        parser.add_argument('--host-delay', type=float, default=2.0, help='Minimum seconds between requests to one host')
+        parser.add_argument('--timeout', type=int, default=60, help='Per-request timeout in seconds')
+        parser.add_argument('--no-save', action='store_true', help='Print results without storing Investigation rows')
+        parser.add_argument('--full', action='store_true', help='Re-extract even if a page is unchanged')
+
+    def _read_urls(self, path):
+        try:
+            with open(path, encoding='utf-8') as fh:
+                lines = [line.strip() for line in fh]
+        except OSError as e:
+            raise CommandError(f'Cannot read {path}: {e}')
+
+        urls = []
+        seen = set()
+        for line in lines:
+            if not line or line.startswith('#'):
+                continue
+            onion = canonicalize_onion_url(line)
+            if not onion.is_valid:
+                self.stdout.write(self.style.WARNING(f'Skipping {line}: {onion.message}'))
+                continue
+            if onion.url not in seen:
+                seen.add(onion.url)
+                urls.append(onion.url)
+        return urls
+
+    def handle(self, *args, **options):
+        urls = self._read_urls(options['url_file'])
+        if not urls:
+            raise CommandError('No URLs found in file')
+
+        save = not options['no_save']
+        investigator = OnionInvestigator(timeout=options['timeout'])
+        # Earlier results let unchanged pages skip extraction (conditional GET + content hash)
+        previous = {} if options['full'] else {
+            inv.investigated_url: inv
+            for inv in Investigation.objects.filter(investigated_url__in=urls).select_related('onion_link')
+        }
+        counts = {'ok': 0, 'unchanged': 0, 'failed': 0}
+
+        def on_result(result):
+            if result['success'] and result['unchanged']:
+                counts['unchanged'] += 1
+                if save and result['url'] in previous:
+                    inv = previous[result['url']]
+                    save_investigation(inv.onion_link, result, investigated_url=inv.investigated_url)
+                self.stdout.write(f'= {result["url"]} — unchanged')
+            elif result['success']:
+                counts['ok'] += 1
+                findings = sum(len(result[k]) for k in ('emails', 'btc_addresses', 'monero_addresses', 'ethereum_addresses'))
+                if save:
+                    link, _ = OnionLink.objects.get_or_create(
+                        url=result['url'],
+                        defaults={'title': 'Bulk Investigation', 'description': 'Investigated via investigate_urls'}
+                    )
+                    save_investigation(link, result)
+                self.stdout.write(self.style.SUCCESS(f'✅ {result["url"]} — {findings} finding(s)'))
+            else:
+                counts['failed'] += 1
+                self.stdout.write(self.style.ERROR(f'❌ {result["url"]} — {result.get("error")}'))
+
+        self.stdout.write(f'Investigating {len(urls)} URL(s) with {options["workers"]} worker(s)...')
+        investigator.bulk_investigate(
+            urls,
+            progress_callback=on_result,
+            max_workers=options['workers'],
+            per_host_concurrency=options['per_host'],
+            per_host_delay=options['host_delay'],
+            previous=previous,
+        )
+        self.stdout.write(self.style.SUCCESS(f'\n🎉 Done: {counts["ok"]} investigated, {counts["unchanged"]} unchanged, {counts["failed"]} failed'))
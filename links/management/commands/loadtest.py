@@ -0,0 +1,306 @@
+"""
+Django management command to load-test the search, sandbox and investigation flows offline
+"""
+
+import base64
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from links.loadtest.driver import FlowOptions, Recorder, run_flow, run_streams
+from links.loadtest.fake_network import FakeOnionNetwork, NetworkProfile
+from links.services.metrics import HEDGES
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# p95 changes smaller than this are scheduling noise, whatever the ratio
+MIN_REGRESSION_SECONDS = 0.05
+CLOUD_INDICATORS = ['RENDER', 'DYNO', 'RAILWAY_ENVIRONMENT', 'VERCEL', 'NETLIFY', 'AWS_EXECUTION_ENV']
+
+
+def _max_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+class Command(BaseCommand):
+    help = (
+        'Run concurrent search / sandbox / investigation flows against fake onion sites behind a local '
+        'SOCKS5 proxy and report throughput, p50/p95/p99 latency and peak memory. Uses a throwaway database.'
+    )
+
+    def add_arguments(self, parser):
+        flows = parser.add_argument_group('flows')
+        flows.add_argument('--searches', type=int, default=8, help='Search flows to run')
+        flows.add_argument('--concurrency', type=int, default=4, help='Flows running at once')
+        flows.add_argument('--sandbox-loads', type=int, default=2, help='Alive results opened in the sandbox per search')
+        flows.add_argument('--investigations', type=int, default=1, help='Alive results investigated per search')
+
+        streams = parser.add_argument_group('streaming (instead of the flows)')
+        streams.add_argument('--streams', type=int, default=0,
+                             help='Run this many sandbox resource downloads at once instead of the search flows')
+        streams.add_argument('--stream-kb', type=int, default=512, help='Size of each download')
+        streams.add_argument('--stream-kbps', type=float, default=256, help='Upstream bandwidth per download')
+        streams.add_argument('--server', choices=['wsgi', 'asgi'], default='asgi',
+                             help='Serve the downloads from a thread pool (wsgi) or one event loop (asgi)')
+        streams.add_argument('--wsgi-threads', type=int, default=8, help='Request threads in wsgi mode')
+
+        network = parser.add_argument_group('fake network')
+        network.add_argument('--sites', type=int, default=300, help='Fake onion sites')
+        network.add_argument('--results-per-engine', type=int, default=30, help='Results per search engine page')
+        network.add_argument('--dead-rate', type=float, default=0.3, help='Share of sites that are unreachable')
+        network.add_argument('--stall-rate', type=float, default=0.02,
+                             help='Share of sites that never answer (each costs a checker timeout)')
+        network.add_argument('--flaky-rate', type=float, default=0.05,
+                             help='Share of connections to alive sites failing with a transient Tor error')
+        network.add_argument('--slow-circuit-rate', type=float, default=0.0,
+                             help='Share of connections to alive sites landing on a circuit 20s slower than usual')
+        network.add_argument('--mirror-rate', type=float, default=0.1, help='Share of alive sites mirroring another')
+        network.add_argument('--connect-ms', type=float, default=800, help='Median rendezvous delay')
+        network.add_argument('--connect-sigma', type=float, default=0.8, help='Lognormal sigma of the rendezvous delay')
+        network.add_argument('--first-byte-ms', type=float, default=300, help='Median time to first byte')
+        network.add_argument('--first-byte-sigma', type=float, default=0.6, help='Lognormal sigma of time to first byte')
+        network.add_argument('--page-kb', type=float, default=20, help='Median page size')
+        network.add_argument('--engine-ms', type=float, default=1000, help='Median search engine latency')
+        network.add_argument('--seed', type=int, default=1, help='Seed for the network layout and latencies')
+        network.add_argument('--no-hs-prefetch', action='store_true',
+                             help='Disable descriptor prefetch (HSFETCH) in bulk checks, for comparison')
+        network.add_argument('--no-adaptive-timeouts', action='store_true',
+                             help='Use the fixed checker timeout for every host, for comparison')
+        network.add_argument('--no-hedging', action='store_true',
+                             help='Never hedge slow requests on a second circuit, for comparison')
+        network.add_argument('--search-deadline', type=float, default=None,
+                             help='Cap on each search\'s link checks in seconds (default: SEARCH_CHECK_DEADLINE)')
+
+        output = parser.add_argument_group('output')
+        output.add_argument('--tracemalloc', action='store_true',
+                            help='Also report the peak Python heap (slows the run down)')
+        output.add_argument('--json', dest='json_path', help='Write the report to this file')
+        output.add_argument('--baseline', help='Fail if any p95 is worse than in this earlier --json report')
+        output.add_argument('--tolerance', type=float, default=0.25, help='Allowed p95 regression vs. the baseline')
+
+    def handle(self, *args, **options):
+        if any(os.environ.get(indicator) for indicator in CLOUD_INDICATORS):
+            raise CommandError('Cloud environment detected: the checker would use Tor2Web gateways, not the fake proxy')
+
+        profile = NetworkProfile(
+            sites=options['sites'],
+            dead_rate=options['dead_rate'],
+            stall_rate=options['stall_rate'],
+            mirror_rate=options['mirror_rate'],
+            flaky_rate=options['flaky_rate'],
+            slow_circuit_rate=options['slow_circuit_rate'],
+            connect_median=options['connect_ms'] / 1000,
+            connect_sigma=options['connect_sigma'],
+            first_byte_median=options['first_byte_ms'] / 1000,
+            first_byte_sigma=options['first_byte_sigma'],
+            page_size_median=int(options['page_kb'] * 1024),
+            engine_latency=options['engine_ms'] / 1000,
+            results_per_engine=options['results_per_engine'],
+            stream_bandwidth=int(options['stream_kbps'] * 1024),
+            seed=options['seed'],
+        )
+        workdir = tempfile.mkdtemp(prefix='loadtest-')
+        network = FakeOnionNetwork(profile).start()
+        old_name = connection.settings_dict['NAME']
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(workdir, 'loadtest.sqlite3')
+        try:
+            self._configure(network, workdir, options)
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            if options['streams']:
+                report = self._run_streams(network, options)
+            else:
+                self._add_sources(network)
+                report = self._run(network, options)
+        finally:
+            if connection.settings_dict['NAME'] != old_name:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+            network.stop()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        self._print(report)
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f'Report written to {options["json_path"]}')
+        if options['baseline']:
+            self._compare(report, options['baseline'], options['tolerance'])
+
+    def _configure(self, network, workdir, options):
+        """Point every Tor client at the fake proxy and keep all state in the work directory"""
+        settings.TOR_SOCKS_PORT = network.port
+        settings.TOR_CONTROL_PORT = network.control_port
+        settings.TOR_DATA_DIR = os.path.join(workdir, 'tor_data')
+        settings.HS_PREFETCH_ENABLED = not options['no_hs_prefetch']
+        settings.ADAPTIVE_TIMEOUTS = not options['no_adaptive_timeouts']
+        settings.HEDGING_ENABLED = not options['no_hedging']
+        if options['search_deadline'] is not None:
+            settings.SEARCH_CHECK_DEADLINE = options['search_deadline']
+        settings.SNAPSHOT_ROOT = os.path.join(workdir, 'snapshots')
+        settings.SHARED_STATE_URL = f'sqlite:///{os.path.join(workdir, "shared_state.sqlite3")}'
+        settings.METRICS_DIR = None
+        settings.DEBUG = False  # no per-query logging skewing memory
+        if 'testserver' not in settings.ALLOWED_HOSTS:
+            settings.ALLOWED_HOSTS = list(settings.ALLOWED_HOSTS) + ['testserver']
+
+    def _add_sources(self, network):
+        from links.models import SearchSource
+        for engine in network.engines.values():
+            SearchSource.objects.create(
+                name=engine.name, url=f'http://{engine.host}/', search_url_pattern=engine.search_url_pattern,
+            )
+
+    def _run(self, network, options):
+        flow_options = FlowOptions(sandbox_loads=options['sandbox_loads'], investigations=options['investigations'])
+        recorder = Recorder()
+        rss_before = _max_rss_mb()
+        if options['tracemalloc']:
+            tracemalloc.start()
+        self.stdout.write(
+            f'{options["searches"]} search flow(s), {options["concurrency"]} at a time, against '
+            f'{len(network.sites)} fake sites on SOCKS port {network.port}...'
+        )
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, options['concurrency'])) as pool:
+            futures = [
+                pool.submit(run_flow, f'loadtest {i}', flow_options, recorder)
+                for i in range(options['searches'])
+            ]
+            flow_errors = 0
+            for future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    flow_errors += 1
+                    self.stderr.write(f'Flow failed: {e}')
+        wall = time.perf_counter() - started
+
+        report = {
+            'wall_seconds': wall,
+            'flows': options['searches'],
+            'flow_errors': flow_errors,
+            'socks_connections': network.connections,
+            'hsfetches': network.hsfetches,
+            'failures': self._failure_breakdown(),
+            'hedges': {key[0]: int(value) for key, value in HEDGES.samples().items()},
+            'peak_rss_mb': _max_rss_mb(),
+            'rss_before_mb': rss_before,
+            'operations': recorder.summary(wall),
+        }
+        if options['tracemalloc']:
+            report['peak_heap_mb'] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            tracemalloc.stop()
+        return report
+
+    def _failure_breakdown(self):
+        from django.db.models import Count
+        from links.models import OnionLink
+        rows = OnionLink.objects.exclude(failure_reason='').values('failure_reason').annotate(links=Count('id'))
+        return {row['failure_reason']: row['links'] for row in rows.order_by('-links')}
+
+    def _run_streams(self, network, options):
+        from links.models import OnionLink
+
+        site = next(site for site in network.sites.values() if site.state == 'alive')
+        link = OnionLink.objects.create(url=f'http://{site.host}/', title=site.title, status='alive')
+        urls = []
+        for i in range(options['streams']):
+            # A distinct URL per download so none is served from a snapshot or cache
+            url = f'http://{site.host}/files/{options["stream_kb"]}k.bin?n={i}'
+            urls.append(f'/sandbox/resource/{link.id}/{base64.urlsafe_b64encode(url.encode()).decode()}/')
+
+        recorder = Recorder()
+        rss_before = _max_rss_mb()
+        if options['tracemalloc']:
+            tracemalloc.start()
+        threads = options['wsgi_threads'] if options['server'] == 'wsgi' else None
+        self.stdout.write(
+            f'{options["streams"]} download(s) of {options["stream_kb"]} KB at {options["stream_kbps"]:g} KB/s, '
+            + (f'wsgi with {threads} thread(s)' if threads else 'asgi on one event loop') + '...'
+        )
+        started = time.perf_counter()
+        run_streams(options['server'], urls, options['wsgi_threads'], recorder)
+        wall = time.perf_counter() - started
+
+        report = {
+            'server': options['server'],
+            'wall_seconds': wall,
+            'flows': options['streams'],
+            'flow_errors': sum(recorder.errors.values()),
+            'socks_connections': network.connections,
+            'peak_upstream_connections': network.peak_connections,
+            'peak_rss_mb': _max_rss_mb(),
+            'rss_before_mb': rss_before,
+            'operations': recorder.summary(wall),
+        }
+        if options['tracemalloc']:
+            report['peak_heap_mb'] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            tracemalloc.stop()
+        return report
+
+    def _print(self, report):
+        def fmt(value):
+            return '-' if value is None else f'{value:.3f}'
+
+        self.stdout.write(f'\n{"operation":<22} {"count":>6} {"errors":>6} {"ops/s":>7} {"p50":>8} {"p95":>8} {"p99":>8} {"max":>8}')
+        for row in report['operations']:
+            self.stdout.write(
+                f'{row["operation"]:<22} {row["count"]:>6} {row["errors"]:>6} {row["throughput"]:>7.2f} '
+                f'{fmt(row["p50"]):>8} {fmt(row["p95"]):>8} {fmt(row["p99"]):>8} {fmt(row["max"]):>8}'
+            )
+        memory = []
+        if report['peak_rss_mb'] is not None:
+            memory.append(f'peak RSS {report["peak_rss_mb"]:.0f} MB (before run {report["rss_before_mb"]:.0f} MB)')
+        if 'peak_heap_mb' in report:
+            memory.append(f'peak Python heap {report["peak_heap_mb"]:.1f} MB')
+        memory = ', '.join(memory) or 'peak memory not available on this platform (use --tracemalloc)'
+        if 'server' in report:
+            self.stdout.write(self.style.SUCCESS(
+                f'\n{report["flows"]} download(s) ({report["server"]}) in {report["wall_seconds"]:.1f}s '
+                f'({report["flow_errors"]} failed), at most {report["peak_upstream_connections"]} '
+                f'upstream connections open at once; {memory}'
+            ))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'\n{report["flows"]} flow(s) in {report["wall_seconds"]:.1f}s '
+            f'({report["flow_errors"]} failed), {report["socks_connections"]} SOCKS connections, '
+            f'{report["hsfetches"]} descriptor prefetches; {memory}'
+        ))
+        if report.get('hedges'):
+            self.stdout.write('Hedged requests: ' + ', '.join(
+                f'{outcome} {count}' for outcome, count in sorted(report['hedges'].items())
+            ))
+        if report.get('failures'):
+            self.stdout.write('Dead links by failure reason: ' + ', '.join(
+                f'{reason} {count}' for reason, count in report['failures'].items()
+            ))
+
+    def _compare(self, report, baseline_path, tolerance):
+        with open(baseline_path) as f:
+            baseline = {row['operation']: row for row in json.load(f)['operations']}
+        regressions = []
+        for row in report['operations']:
+            before = baseline.get(row['operation'])
+            if not (before and before['p95'] and row['p95']):
+                continue
+            if row['p95'] > before['p95'] * (1 + tolerance) and row['p95'] - before['p95'] > MIN_REGRESSION_SECONDS:
+                regressions.append(f'{row["operation"]}: p95 {before["p95"]:.3f}s -> {row["p95"]:.3f}s')
+        if regressions:
+            raise CommandError('p95 regressions beyond {:.0%}:\n  {}'.format(tolerance, '\n  '.join(regressions)))
+        self.stdout.write(self.style.SUCCESS(f'No p95 regression beyond {tolerance:.0%} vs. {baseline_path}'))
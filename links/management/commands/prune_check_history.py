@@ -0,0 +1,26 @@
+"""
+Django management command to apply the link check history retention policy
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from links.services.check_history import prune
+
+
+class Command(BaseCommand):
+    help = 'Fold old link check rows into daily totals and delete daily totals past their retention'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--raw-days', type=int, default=None,
+                            help='Keep individual checks this many days (default: CHECK_HISTORY_RAW_DAYS)')
+        parser.add_argument('--daily-days', type=int, default=None,
+                            help='Keep daily totals this many days (default: CHECK_HISTORY_DAILY_DAYS)')
+
+    def handle(self, *args, **options):
+        if (options['raw_days'] or 0) < 0 or (options['daily_days'] or 0) < 0:
+            raise CommandError('--raw-days and --daily-days must not be negative')
+
+        stats = prune(raw_days=options['raw_days'], daily_days=options['daily_days'])
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Folded {stats["rows_folded"]} check(s) from {stats["days"]} day(s) into '
+            f'{stats["day_rows"]} daily row(s), deleted {stats["day_rows_deleted"]} expired daily row(s)'
+        ))
@@ -0,0 +1,27 @@
+"""
+Django management command to apply the page snapshot retention policy
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from links.services.snapshots import get_snapshot_store
+
+
+class Command(BaseCommand):
+    help = 'Delete old page snapshots and the compressed blobs no snapshot references any more'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age-days', type=int, default=30, help='Delete snapshots older than this many days')
+        parser.add_argument('--keep-per-url', type=int, default=1, help='Always keep this many newest snapshots per URL')
+
+    def handle(self, *args, **options):
+        if options['max_age_days'] < 0 or options['keep_per_url'] < 0:
+            raise CommandError('--max-age-days and --keep-per-url must not be negative')
+
+        stats = get_snapshot_store().prune(
+            max_age_days=options['max_age_days'],
+            keep_per_url=options['keep_per_url'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Deleted {stats["snapshots_deleted"]} snapshot(s) and {stats["blobs_deleted"]} blob(s), '
+            f'freed {stats["bytes_freed"] / 1024:.1f} KB'
+        ))
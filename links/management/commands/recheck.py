@@ -0,0 +1,71 @@
+"""
+Django management command to keep link statuses fresh with background rechecks
+"""
+
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+from links.models import OnionLink
+from links.services.link_checker import OnionLinkCheckerService
+from links.services.scheduler import RecheckScheduler, due_links
+
+
+class Command(BaseCommand):
+    help = 'Recheck links in order of staleness, popularity and volatility, within a Tor budget (runs until stopped)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--budget', type=float, default=None,
+                            help='Checks per minute (default: RECHECK_BUDGET_PER_MINUTE)')
+        parser.add_argument('--workers', type=int, default=4, help='Simultaneous checks within a batch')
+        parser.add_argument('--timeout', type=int, default=30, help='Per-check timeout in seconds')
+        parser.add_argument('--max-checks', type=int, default=None, help='Stop after this many links')
+        parser.add_argument('--dry-run', action='store_true', help='List the most overdue links and exit')
+        parser.add_argument('--all', action='store_true',
+                            help='Check every link once, streamed from the database, ignoring schedule and budget')
+
+    def handle(self, *args, **options):
+        if options['budget'] is not None and options['budget'] <= 0:
+            raise CommandError('--budget must be positive')
+
+        if options['dry_run']:
+            due = sorted(due_links(), key=lambda item: item[0], reverse=True)
+            self.stdout.write(f'{len(due)} link(s) due')
+            for staleness, link in due[:20]:
+                self.stdout.write(f'  {staleness:8.2f}x  {link.status:<5}  {link.url}')
+            return
+
+        if options['all']:
+            self._check_all(options)
+            return
+
+        scheduler = RecheckScheduler(
+            OnionLinkCheckerService(timeout=options['timeout']),
+            budget=options['budget'],
+            workers=options['workers'],
+        )
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: scheduler.stop())
+        self.stdout.write(f'Rechecking at up to {scheduler.budget:g} checks/minute (Ctrl+C to stop)...')
+        checked = scheduler.run(max_checks=options['max_checks'])
+        self.stdout.write(self.style.SUCCESS(f'✅ Rechecked {checked} link(s)'))
+
+    def _check_all(self, options):
+        checker = OnionLinkCheckerService(timeout=options['timeout'])
+        links = OnionLink.objects.order_by('id')
+        if options['max_checks']:
+            links = links[:options['max_checks']]
+        self.stdout.write(f'Checking every link, {options["workers"]} at a time (Ctrl+C to stop)...')
+        counts = {'alive': 0, 'dead': 0}
+        checked = 0
+        try:
+            for result in checker.iter_check_links(links.iterator(chunk_size=2000), max_workers=options['workers'], collapse_mirrors=True):
+                checked += 1
+                if result['status'] in counts:
+                    counts[result['status']] += 1
+                if checked % 1000 == 0:
+                    self.stdout.write(f'  {checked} checked ({counts["alive"]} alive, {counts["dead"]} dead)')
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping after the checks in flight...')
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Checked {checked} link(s): {counts["alive"]} alive, {counts["dead"]} dead'
+        ))
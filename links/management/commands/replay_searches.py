@@ -0,0 +1,133 @@
+"""
+Django management command to measure time-to-first-alive on replayed searches
+"""
+
+import copy
+import heapq
+import statistics
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from links.models import LinkStats, OnionLink
+from links.services.prioritizer import CheckQueue, prioritize
+
+
+class Command(BaseCommand):
+    help = (
+        'Replay past searches (links grouped by keyword) against their recorded check outcomes and '
+        'compare median time-to-first-alive for scrape order vs. predicted order'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=20, help='Simulated concurrent checks (search uses 20)')
+        parser.add_argument('--timeout', type=float, default=30, help='Seconds a dead link occupies a worker')
+        parser.add_argument('--min-links', type=int, default=5, help='Skip searches with fewer checked links')
+
+    def handle(self, *args, **options):
+        links = list(OnionLink.objects.filter(last_checked__isnull=False).order_by('id'))
+        if not links:
+            raise CommandError('No checked links to replay; run some searches first')
+        stats = {s.onion_link_id: s for s in LinkStats.objects.filter(onion_link_id__in=[link.id for link in links])}
+
+        searches = defaultdict(list)
+        for link in links:
+            for keyword in (link.keywords or '').split(','):
+                if keyword.strip():
+                    searches[keyword.strip().lower()].append(link)
+
+        # Predictions may only use history from before the check being replayed
+        held_out = {link.id: self._history_before_last_check(link, stats.get(link.id)) for link in links}
+        rates = self._source_rates(links, held_out)
+
+        baseline, prioritized = [], []
+        for keyword, search_links in sorted(searches.items()):
+            if len(search_links) < options['min_links'] or not any(link.status == 'alive' for link in search_links):
+                continue
+            outcomes = {link.id: self._outcome(link, stats.get(link.id), options['timeout']) for link in search_links}
+            # Scrape order, as the baseline checks them
+            predicted = {
+                prediction.link.id: prediction
+                for prediction in prioritize([self._link_before_last_check(link) for link in search_links],
+                                             timeout=options['timeout'], rates=rates, stats=held_out)
+            }
+            predictions = [predicted[link.id] for link in search_links]
+
+            before = self._simulate(predictions, outcomes, options['workers'], prioritized=False)
+            after = self._simulate(predictions, outcomes, options['workers'], prioritized=True)
+            baseline.append(before)
+            prioritized.append(after)
+            self.stdout.write(f'{keyword[:40]:<40} {len(search_links):>5} links  {before:7.1f}s -> {after:7.1f}s')
+
+        if not baseline:
+            raise CommandError(f'No search with at least {options["min_links"]} checked links and an alive result')
+
+        before, after = statistics.median(baseline), statistics.median(prioritized)
+        self.stdout.write(self.style.SUCCESS(
+            f'\nMedian time-to-first-alive over {len(baseline)} search(es): '
+            f'scrape order {before:.1f}s, predicted order {after:.1f}s ({before / max(after, 0.001):.1f}x)'
+        ))
+
+    def _link_before_last_check(self, link):
+        """A copy of ``link`` without the outcome of the check being replayed"""
+        held_out = copy.copy(link)
+        held_out.last_checked = None
+        held_out.status = ''
+        held_out.response_time = None
+        return held_out
+
+    def _history_before_last_check(self, link, stats):
+        if stats is None or stats.check_count <= 1:
+            return None
+        last_alive = link.status == 'alive'
+        times = list(stats.recent_response_times or [])
+        return LinkStats(
+            check_count=stats.check_count - 1,
+            alive_count=max(0, stats.alive_count - last_alive),
+            recent_response_times=times[:-1] if last_alive and times else times,
+        )
+
+    def _source_rates(self, links, held_out):
+        checked, alive = defaultdict(int), defaultdict(int)
+        for link in links:
+            history = held_out[link.id]
+            if history is not None:
+                checked[link.source_id] += history.check_count
+                alive[link.source_id] += history.alive_count
+        return {source: alive[source] / checked[source] for source in checked if checked[source]}
+
+    def _outcome(self, link, stats, timeout):
+        """(alive, seconds the check took) as last observed"""
+        if link.status != 'alive':
+            return False, timeout
+        times = (stats.recent_response_times if stats else None) or []
+        return True, (times[-1] if times else link.response_time or timeout / 2)
+
+    def _simulate(self, predictions, outcomes, workers, prioritized):
+        """Virtual-time run of a bulk check; returns when the first alive result lands"""
+        if prioritized:
+            queue = CheckQueue(sorted(predictions, key=lambda p: p.priority, reverse=True),
+                               low_lane_slots=max(1, workers // 5))
+        else:
+            pending = list(predictions)
+
+        clock = 0.0
+        running = []  # (finish time, seq, prediction)
+        low_in_flight = 0
+        seq = 0
+        while True:
+            while len(running) < workers:
+                if prioritized:
+                    prediction = queue.pop(low_in_flight) if queue else None
+                else:
+                    prediction = pending.pop(0) if pending else None
+                if prediction is None:
+                    break
+                low_in_flight += prioritized and prediction.low_priority
+                heapq.heappush(running, (clock + outcomes[prediction.link.id][1], seq, prediction))
+                seq += 1
+            if not running:
+                return clock
+            clock, _, prediction = heapq.heappop(running)
+            low_in_flight -= prioritized and prediction.low_priority
+            if outcomes[prediction.link.id][0]:
+                return clock
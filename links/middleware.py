@@ -0,0 +1,108 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from .services import profiling
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise that also runs natively under ASGI.
+
+    The stock middleware is sync-only, which makes Django run every request
+    (async views included) in a thread. Here only the static file lookup
+    result is served in a thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file, thread_sensitive=False)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+        return await self.get_response(request)
+
+
+class ProfilingMiddleware:
+    """
+    Profile requests on demand (staff + PROFILING_HEADER) or by sampling.
+    Removes itself from the stack when PROFILING_ENABLED is off.
+
+    Under ASGI a profiled async request samples the event loop thread, so
+    requests running alongside it show up in its stacks too.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not profiling.enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        header = getattr(settings, 'PROFILING_HEADER', 'X-Profile')
+        self.meta_key = 'HTTP_' + header.upper().replace('-', '_')
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _wanted(self, request):
+        if request.META.get(self.meta_key):
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_active and user.is_staff:
+                return True
+        return profiling.sampled()
+
+    def _start(self, request):
+        profile = profiling.Profile('request', f'{request.method} {request.path}', profiling.new_request_key())
+        request.profile = profile
+        return profile
+
+    def _finish(self, request, profile, response):
+        profile.status_code = response.status_code
+        match = request.resolver_match
+        if match is not None and match.view_name:
+            profile.name = f'{request.method} {match.view_name}'
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._wanted(request):
+            return self.get_response(request)
+        profile = self._start(request)
+        with profile:
+            response = self.get_response(request)
+            self._finish(request, profile, response)
+        response['X-Profile-Id'] = profile.key
+        return response
+
+    async def __acall__(self, request):
+        if request.META.get(self.meta_key):
+            # request.user is lazy and hits the DB; resolve it off the event loop
+            wanted = await sync_to_async(self._wanted)(request)
+        else:
+            wanted = profiling.sampled()
+        if not wanted:
+            return await self.get_response(request)
+        profile = self._start(request)
+        profile.__enter__()
+        try:
+            response = await self.get_response(request)
+            self._finish(request, profile, response)
+        finally:
+            await sync_to_async(profile.__exit__, thread_sensitive=False)(None, None, None)
+        response['X-Profile-Id'] = profile.key
+        return response
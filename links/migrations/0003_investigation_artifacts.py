@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('links', '0002_investigation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='investigation',
+            name='artifacts',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
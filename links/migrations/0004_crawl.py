@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('links', '0003_investigation_artifacts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CrawlJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seed_url', models.URLField(max_length=500)),
+                ('max_depth', models.PositiveIntegerField(default=2)),
+                ('max_pages', models.PositiveIntegerField(default=200)),
+                ('max_page_bytes', models.PositiveIntegerField(default=2097152)),
+                ('per_host_concurrency', models.PositiveIntegerField(default=2)),
+                ('host_delay', models.FloatField(default=1.0, help_text='Minimum seconds between requests to one host')),
+                ('respect_robots', models.BooleanField(default=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('paused', 'Paused'), ('finished', 'Finished'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('pages_fetched', models.PositiveIntegerField(default=0)),
+                ('pages_failed', models.PositiveIntegerField(default=0)),
+                ('seen_filter', models.BinaryField(blank=True, null=True)),
+                ('elapsed_seconds', models.FloatField(default=0.0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CrawlPage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=500)),
+                ('depth', models.PositiveIntegerField(default=0)),
+                ('state', models.CharField(choices=[('queued', 'Queued'), ('fetching', 'Fetching'), ('done', 'Done'), ('failed', 'Failed'), ('skipped', 'Skipped')], default='queued', max_length=10)),
+                ('status_code', models.IntegerField(blank=True, null=True)),
+                ('error', models.CharField(blank=True, default='', max_length=255)),
+                ('artifacts', models.JSONField(blank=True, default=dict)),
+                ('links_found', models.PositiveIntegerField(default=0)),
+                ('fetched_at', models.DateTimeField(blank=True, null=True)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pages', to='links.crawljob')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['job', 'state', 'depth'], name='links_crawl_job_id_e05a4c_idx')],
+                'unique_together': {('job', 'url')},
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('links', '0004_crawl'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Entity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity_type', models.CharField(choices=[('email', 'Email'), ('btc', 'Bitcoin'), ('xmr', 'Monero'), ('eth', 'Ethereum'), ('onion', 'Onion address')], max_length=20)),
+                ('value', models.CharField(db_index=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name_plural': 'entities',
+                'unique_together': {('entity_type', 'value')},
+            },
+        ),
+        migrations.CreateModel(
+            name='EntitySighting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('onion_host', models.CharField(db_index=True, max_length=255)),
+                ('seen_at', models.DateTimeField(auto_now=True)),
+                ('crawl_page', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='entity_sightings', to='links.crawlpage')),
+                ('entity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sightings', to='links.entity')),
+                ('investigation', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='entity_sightings', to='links.investigation')),
+            ],
+            options={
+                'unique_together': {('entity', 'crawl_page'), ('entity', 'investigation')},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('links', '0005_entity_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvestigationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=500)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('stage', models.CharField(blank=True, default='', max_length=100)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('investigation', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='jobs', to='links.investigation')),
+                ('onion_link', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='investigation_jobs', to='links.onionlink')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['url', 'status'], name='links_inves_url_bd6af4_idx')],
+            },
+        ),
+    ]
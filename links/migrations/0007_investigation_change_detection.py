@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('links', '0006_investigation_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='investigation',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='investigation',
+            name='etag',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='investigation',
+            name='last_modified',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='investigation',
+            name='verified_at',
+            field=models.DateTimeField(blank=True, help_text='Last time the page was confirmed unchanged or re-extracted', null=True),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:54
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('links', '0007_investigation_change_detection'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnapshotBlob',
+            fields=[
+                ('content_hash', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('size', models.PositiveIntegerField()),
+                ('compressed_size', models.PositiveIntegerField()),
+                ('codec', models.CharField(max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PageSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=500)),
+                ('fetched_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('status_code', models.IntegerField(blank=True, null=True)),
+                ('content_type', models.CharField(blank=True, default='', max_length=100)),
+                ('etag', models.CharField(blank=True, default='', max_length=255)),
+                ('last_modified', models.CharField(blank=True, default='', max_length=64)),
+                ('source', models.CharField(choices=[('checker', 'Link checker'), ('sandbox', 'Sandbox'), ('investigator', 'Investigator')], max_length=20)),
+                ('blob', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='snapshots', to='links.snapshotblob')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['url', '-fetched_at'], name='links_pages_url_da998d_idx'), models.Index(fields=['fetched_at'], name='links_pages_fetched_b68ad1_idx')],
+            },
+        ),
+    ]
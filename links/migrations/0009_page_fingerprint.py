@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('links', '0008_page_snapshots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PageFingerprint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('simhash', models.BigIntegerField(help_text='64-bit SimHash stored as a signed integer')),
+                ('band_0', models.IntegerField(db_index=True)),
+                ('band_1', models.IntegerField(db_index=True)),
+                ('band_2', models.IntegerField(db_index=True)),
+                ('band_3', models.IntegerField(db_index=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('cluster', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='mirrors', to='links.onionlink')),
+                ('onion_link', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='fingerprint', to='links.onionlink')),
+            ],
+        ),
+    ]
@@ -0,0 +1,110 @@
+from collections import defaultdict
+from urllib.parse import urlsplit, urlunsplit
+
+from django.db import migrations
+
+DEFAULT_DOCUMENTS = ('index.html', 'index.htm', 'index.php', 'default.html', 'default.htm')
+
+
+def normalize_onion_url(url):
+    """Canonical URL spelling as of this migration; frozen so later changes don't alter it."""
+    url = (url or '').strip()
+    if not url:
+        return None
+    if '://' not in url:
+        url = 'http://' + url
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return None
+    if parts.scheme.lower() not in ('http', 'https') or not parts.hostname:
+        return None
+
+    host = parts.hostname.lower().rstrip('.')
+    netloc = host if port in (None, 80, 443) else f'{host}:{port}'
+
+    path = parts.path or '/'
+    directory, _, last = path.rpartition('/')
+    if last.lower() in DEFAULT_DOCUMENTS:
+        path = directory + '/'
+
+    return urlunsplit(('http', netloc, path, parts.query, ''))
+
+
+def merge_duplicate_links(apps, schema_editor):
+    """Rewrite OnionLink URLs to canonical form, merging rows that collide."""
+    OnionLink = apps.get_model('links', 'OnionLink')
+    Investigation = apps.get_model('links', 'Investigation')
+    InvestigationJob = apps.get_model('links', 'InvestigationJob')
+    PageFingerprint = apps.get_model('links', 'PageFingerprint')
+
+    groups = defaultdict(list)
+    for link in OnionLink.objects.order_by('id').iterator():
+        canonical = normalize_onion_url(link.url)
+        if canonical:
+            groups[canonical].append(link)
+
+    for canonical, links in groups.items():
+        if len(links) == 1 and links[0].url == canonical:
+            continue
+        # Keep the row already spelled canonically, else the oldest
+        links.sort(key=lambda link: (link.url != canonical, link.id))
+        keeper, duplicates = links[0], links[1:]
+
+        latest = max(links, key=lambda link: (link.last_checked is not None, link.last_checked or 0, link.id))
+        keeper.status = latest.status
+        keeper.status_code = latest.status_code
+        keeper.response_time = latest.response_time
+        keeper.last_checked = latest.last_checked
+        keeper.title = keeper.title or next((link.title for link in duplicates if link.title), keeper.title)
+        keeper.description = keeper.description or next((link.description for link in duplicates if link.description), keeper.description)
+        keeper.source_id = keeper.source_id or next((link.source_id for link in duplicates if link.source_id), None)
+        keywords = []
+        for link in links:
+            for keyword in (link.keywords or '').split(','):
+                keyword = keyword.strip()
+                if keyword and keyword not in keywords:
+                    keywords.append(keyword)
+        keeper.keywords = ', '.join(keywords) or keeper.keywords
+
+        duplicate_ids = [link.id for link in duplicates]
+        if duplicate_ids:
+            Investigation.objects.filter(onion_link_id__in=duplicate_ids).update(onion_link_id=keeper.id)
+            InvestigationJob.objects.filter(onion_link_id__in=duplicate_ids).update(onion_link_id=keeper.id)
+            PageFingerprint.objects.filter(cluster_id__in=duplicate_ids).update(cluster_id=keeper.id)
+            if PageFingerprint.objects.filter(onion_link_id=keeper.id).exists():
+                PageFingerprint.objects.filter(onion_link_id__in=duplicate_ids).delete()
+            else:
+                moved = PageFingerprint.objects.filter(onion_link_id__in=duplicate_ids).order_by('-updated_at').first()
+                if moved:
+                    PageFingerprint.objects.filter(onion_link_id__in=duplicate_ids).exclude(id=moved.id).delete()
+                    PageFingerprint.objects.filter(id=moved.id).update(onion_link_id=keeper.id)
+            PageFingerprint.objects.filter(onion_link_id=keeper.id, cluster_id=keeper.id).update(cluster_id=None)
+            OnionLink.objects.filter(id__in=duplicate_ids).delete()
+
+        keeper.url = canonical
+        keeper.save()
+
+    # Investigations are unique per (link, URL): keep the latest of each canonical URL
+    by_key = defaultdict(list)
+    for investigation in Investigation.objects.order_by('-updated_at', '-id').iterator():
+        canonical = normalize_onion_url(investigation.investigated_url) or investigation.investigated_url
+        by_key[(investigation.onion_link_id, canonical)].append(investigation)
+    for (_, canonical), investigations in by_key.items():
+        newest, older = investigations[0], investigations[1:]
+        if older:
+            Investigation.objects.filter(id__in=[inv.id for inv in older]).delete()
+        if newest.investigated_url != canonical:
+            Investigation.objects.filter(id=newest.id).update(investigated_url=canonical)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('links', '0009_page_fingerprint'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_links, migrations.RunPython.noop),
+    ]
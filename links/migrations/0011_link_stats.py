@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('links', '0010_merge_duplicate_onion_links'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LinkStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('check_count', models.PositiveIntegerField(default=0)),
+                ('alive_count', models.PositiveIntegerField(default=0)),
+                ('recent_response_times', models.JSONField(blank=True, default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('onion_link', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='links.onionlink')),
+            ],
+            options={
+                'verbose_name_plural': 'link stats',
+            },
+        ),
+    ]
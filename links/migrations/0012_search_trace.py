@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('links', '0011_link_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTrace',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('search_id', models.CharField(max_length=36, unique=True)),
+                ('keyword', models.CharField(max_length=255)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('data', models.JSONField(blank=True, default=dict)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('links', '0012_search_trace'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(db_index=True, max_length=64)),
+                ('kind', models.CharField(choices=[('request', 'Request'), ('job', 'Background job')], max_length=10)),
+                ('name', models.CharField(max_length=200)),
+                ('status_code', models.IntegerField(blank=True, null=True)),
+                ('duration', models.FloatField(help_text='Wall time in seconds')),
+                ('sql_queries', models.PositiveIntegerField(default=0)),
+                ('sql_time', models.FloatField(default=0.0, help_text='Seconds spent in SQL')),
+                ('samples', models.PositiveIntegerField(default=0)),
+                ('interval', models.FloatField(help_text='Sampling interval in seconds')),
+                ('stacks', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('links', '0013_request_profile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='onionlink',
+            name='failure_reason',
+            field=models.CharField(blank=True, choices=[('descriptor_not_found', 'Descriptor not found'), ('descriptor_invalid', 'Descriptor invalid'), ('intro_failed', 'Introduction failed'), ('rendezvous_failed', 'Rendezvous failed'), ('client_auth', 'Client authorization required'), ('invalid_address', 'Invalid address'), ('intro_timeout', 'Introduction timed out'), ('host_unreachable', 'Host unreachable'), ('connection_refused', 'Connection refused by the service'), ('ttl_expired', 'Circuit timed out (TTL expired)'), ('proxy_error', 'Tor proxy failure'), ('tor_unavailable', 'Tor not reachable'), ('connect_timeout', 'Connect timeout'), ('read_timeout', 'Read timeout'), ('connection_reset', 'Connection reset'), ('tls_error', 'TLS error'), ('http_status', 'Non-200 HTTP status'), ('other', 'Other')], default='', max_length=32),
+        ),
+    ]
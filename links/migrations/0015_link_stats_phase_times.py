@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('links', '0014_onionlink_failure_reason'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='linkstats',
+            name='recent_connect_times',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='linkstats',
+            name='recent_first_byte_times',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
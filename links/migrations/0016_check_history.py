@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('links', '0015_link_stats_phase_times'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='linkstats',
+            name='ewma_response_time',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='linkstats',
+            name='last_seen_alive',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='LinkCheck',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('checked_at', models.DateTimeField()),
+                ('alive', models.BooleanField()),
+                ('latency_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('failure_reason', models.CharField(blank=True, choices=[('descriptor_not_found', 'Descriptor not found'), ('descriptor_invalid', 'Descriptor invalid'), ('intro_failed', 'Introduction failed'), ('rendezvous_failed', 'Rendezvous failed'), ('client_auth', 'Client authorization required'), ('invalid_address', 'Invalid address'), ('intro_timeout', 'Introduction timed out'), ('host_unreachable', 'Host unreachable'), ('connection_refused', 'Connection refused by the service'), ('ttl_expired', 'Circuit timed out (TTL expired)'), ('proxy_error', 'Tor proxy failure'), ('tor_unavailable', 'Tor not reachable'), ('connect_timeout', 'Connect timeout'), ('read_timeout', 'Read timeout'), ('connection_reset', 'Connection reset'), ('tls_error', 'TLS error'), ('http_status', 'Non-200 HTTP status'), ('other', 'Other')], default='', max_length=32)),
+                ('onion_link', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='checks', to='links.onionlink')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['onion_link', 'checked_at'], name='links_linkc_onion_l_a1e7e2_idx'), models.Index(fields=['checked_at'], name='links_linkc_checked_20cf03_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LinkCheckDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('checks', models.PositiveIntegerField(default=0)),
+                ('alive', models.PositiveIntegerField(default=0)),
+                ('latency_ms_total', models.PositiveBigIntegerField(default=0)),
+                ('latency_samples', models.PositiveIntegerField(default=0)),
+                ('onion_link', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='check_days', to='links.onionlink')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='links_linkc_day_0964ed_idx')],
+                'unique_together': {('onion_link', 'day')},
+            },
+        ),
+    ]
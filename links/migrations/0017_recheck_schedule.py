@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('links', '0016_check_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='linkstats',
+            name='dead_streak',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='linkstats',
+            name='next_check_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='linkstats',
+            name='search_hits',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
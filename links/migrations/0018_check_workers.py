@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('links', '0017_recheck_schedule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckWorker',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('hostname', models.CharField(max_length=255)),
+                ('pid', models.PositiveIntegerField()),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('last_heartbeat', models.DateTimeField()),
+                ('stopped_at', models.DateTimeField(blank=True, null=True)),
+                ('checks', models.PositiveIntegerField(default=0)),
+                ('alive', models.PositiveIntegerField(default=0)),
+                ('dead', models.PositiveIntegerField(default=0)),
+                ('leases_reclaimed', models.PositiveIntegerField(default=0)),
+                ('checks_per_minute', models.FloatField(default=0)),
+            ],
+            options={
+                'ordering': ['-last_heartbeat'],
+            },
+        ),
+        migrations.AddField(
+            model_name='linkstats',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='linkstats',
+            name='leased_by',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=100),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:27
+
+from django.db import migrations, models
+
+
+def fail_duplicate_active_jobs(apps, schema_editor):
+    """Keep the newest active job per URL so the constraint can be added."""
+    InvestigationJob = apps.get_model('links', 'InvestigationJob')
+    seen = set()
+    duplicate_ids = []
+    for job in InvestigationJob.objects.filter(status__in=['queued', 'running']).order_by('-created_at', '-id').iterator():
+        if job.url in seen:
+            duplicate_ids.append(job.id)
+        seen.add(job.url)
+    InvestigationJob.objects.filter(id__in=duplicate_ids).update(
+        status='failed', stage='Investigation failed', error='Superseded by a newer job'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('links', '0018_check_workers'),
+    ]
+
+    operations = [
+        migrations.RunPython(fail_duplicate_active_jobs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='investigationjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['queued', 'running'])), fields=('url',), name='one_active_investigation_job_per_url'),
+        ),
+    ]
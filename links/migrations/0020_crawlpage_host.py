@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:40
+
+from urllib.parse import urlsplit
+
+from django.db import migrations, models
+
+
+def fill_hosts(apps, schema_editor):
+    """Set the host of existing frontier pages."""
+    CrawlPage = apps.get_model('links', 'CrawlPage')
+    pages = []
+    for page in CrawlPage.objects.filter(host='').only('id', 'url').iterator():
+        page.host = (urlsplit(page.url).hostname or '').lower()
+        pages.append(page)
+        if len(pages) >= 1000:
+            CrawlPage.objects.bulk_update(pages, ['host'])
+            pages = []
+    CrawlPage.objects.bulk_update(pages, ['host'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('links', '0019_investigation_job_active_url'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='crawlpage',
+            name='host',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.RunPython(fill_hosts, migrations.RunPython.noop),
+    ]
@@ -2,6 +2,8 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
 
+from .services.failures import FAILURE_REASON_CHOICES
+
 
 class SearchSource(models.Model):
     """Model for onion search engines like Ahmia, Onionland, etc."""
@@ -30,6 +32,8 @@ class OnionLink(models.Model):
     status_code = models.IntegerField(null=True, blank=True)
     response_time = models.FloatField(null=True, blank=True)
     last_checked = models.DateTimeField(null=True, blank=True)
+    # Why the last check failed (services.failures); empty while alive
+    failure_reason = models.CharField(max_length=32, choices=FAILURE_REASON_CHOICES, blank=True, default='')
 
     source = models.ForeignKey(SearchSource, on_delete=models.SET_NULL, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -51,12 +55,20 @@ class Investigation(models.Model):
     btc_addresses = models.JSONField(default=list, blank=True)
     monero_addresses = models.JSONField(default=list, blank=True)
     ethereum_addresses = models.JSONField(default=list, blank=True)
+    # Other extractor outputs keyed by artifact type (e.g. onion_addresses)
+    artifacts = models.JSONField(default=dict, blank=True)
 
     # Additional findings
     has_server_status = models.BooleanField(default=False)
     server_status_content = models.TextField(blank=True, null=True)
     external_links = models.JSONField(default=list, blank=True)
 
+    # Change detection for re-investigations
+    content_hash = models.CharField(max_length=64, blank=True, default='')
+    etag = models.CharField(max_length=255, blank=True, default='')
+    last_modified = models.CharField(max_length=64, blank=True, default='')
+    verified_at = models.DateTimeField(null=True, blank=True, help_text="Last time the page was confirmed unchanged or re-extracted")
+
     # Metadata
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -78,3 +90,386 @@ class Investigation(models.Model):
             len(self.ethereum_addresses)
         )
 
+
+
+class CrawlJob(models.Model):
+    """A bounded breadth-first crawl across linked onion pages"""
+    seed_url = models.URLField(max_length=500)
+    max_depth = models.PositiveIntegerField(default=2)
+    max_pages = models.PositiveIntegerField(default=200)
+    max_page_bytes = models.PositiveIntegerField(default=2 * 1024 * 1024)
+    per_host_concurrency = models.PositiveIntegerField(default=2)
+    host_delay = models.FloatField(default=1.0, help_text="Minimum seconds between requests to one host")
+    respect_robots = models.BooleanField(default=True)
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('paused', 'Paused'),
+        ('finished', 'Finished'),
+        ('failed', 'Failed'),
+    ]
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    pages_fetched = models.PositiveIntegerField(default=0)
+    pages_failed = models.PositiveIntegerField(default=0)
+    # Serialized Bloom filter of every URL ever enqueued, so resumed crawls skip them
+    seen_filter = models.BinaryField(null=True, blank=True)
+    elapsed_seconds = models.FloatField(default=0.0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Crawl of {self.seed_url} ({self.status})"
+
+    @property
+    def pages_per_second(self):
+        if not self.elapsed_seconds:
+            return 0.0
+        return (self.pages_fetched + self.pages_failed) / self.elapsed_seconds
+
+
+class CrawlPage(models.Model):
+    """A frontier entry of a crawl; holds the extracted artifacts once fetched"""
+    job = models.ForeignKey(CrawlJob, on_delete=models.CASCADE, related_name='pages')
+    url = models.URLField(max_length=500)
+    # Lets the frontier query skip hosts already at their concurrency cap
+    host = models.CharField(max_length=255, blank=True, default='')
+    depth = models.PositiveIntegerField(default=0)
+
+    STATE_CHOICES = [
+        ('queued', 'Queued'),
+        ('fetching', 'Fetching'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+        ('skipped', 'Skipped'),
+    ]
+    state = models.CharField(max_length=10, choices=STATE_CHOICES, default='queued')
+    status_code = models.IntegerField(null=True, blank=True)
+    error = models.CharField(max_length=255, blank=True, default='')
+    artifacts = models.JSONField(default=dict, blank=True)
+    links_found = models.PositiveIntegerField(default=0)
+    fetched_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ['job', 'url']
+        indexes = [models.Index(fields=['job', 'state', 'depth'])]
+
+    def __str__(self):
+        return f"{self.url} (depth {self.depth}, {self.state})"
+
+
+class Entity(models.Model):
+    """A normalized artifact (wallet, email, onion host) shared across pages"""
+    ENTITY_TYPE_CHOICES = [
+        ('email', 'Email'),
+        ('btc', 'Bitcoin'),
+        ('xmr', 'Monero'),
+        ('eth', 'Ethereum'),
+        ('onion', 'Onion address'),
+    ]
+    entity_type = models.CharField(max_length=20, choices=ENTITY_TYPE_CHOICES)
+    value = models.CharField(max_length=255, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['entity_type', 'value']
+        verbose_name_plural = 'entities'
+
+    def __str__(self):
+        return f"{self.entity_type}:{self.value}"
+
+
+class EntitySighting(models.Model):
+    """Where an entity was seen: an investigation or a crawled page"""
+    entity = models.ForeignKey(Entity, on_delete=models.CASCADE, related_name='sightings')
+    investigation = models.ForeignKey(Investigation, on_delete=models.CASCADE, null=True, blank=True, related_name='entity_sightings')
+    crawl_page = models.ForeignKey(CrawlPage, on_delete=models.CASCADE, null=True, blank=True, related_name='entity_sightings')
+    onion_host = models.CharField(max_length=255, db_index=True)
+    seen_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = [['entity', 'investigation'], ['entity', 'crawl_page']]
+
+    def __str__(self):
+        return f"{self.entity} on {self.onion_host}"
+
+
+class InvestigationJob(models.Model):
+    """An investigation running in the background job pool"""
+    onion_link = models.ForeignKey(OnionLink, on_delete=models.CASCADE, related_name='investigation_jobs')
+    url = models.URLField(max_length=500)
+
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    stage = models.CharField(max_length=100, blank=True, default='')
+    error = models.TextField(blank=True, null=True)
+    investigation = models.ForeignKey(Investigation, on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['url', 'status'])]
+        constraints = [
+            # At most one active job per URL, so concurrent submits cannot both insert
+            models.UniqueConstraint(
+                fields=['url'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='one_active_investigation_job_per_url',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Investigation job for {self.url} ({self.status})"
+
+    @property
+    def is_active(self):
+        return self.status in ('queued', 'running')
+
+
+class SnapshotBlob(models.Model):
+    """A compressed page body on disk, keyed by the SHA-256 of its content"""
+    content_hash = models.CharField(max_length=64, primary_key=True)
+    size = models.PositiveIntegerField()
+    compressed_size = models.PositiveIntegerField()
+    codec = models.CharField(max_length=10)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.content_hash[:12]} ({self.size} bytes, {self.codec})"
+
+
+class PageSnapshot(models.Model):
+    """Metadata of one fetch of a page; the body lives in a shared SnapshotBlob"""
+    url = models.URLField(max_length=500)
+    fetched_at = models.DateTimeField(default=timezone.now)
+    status_code = models.IntegerField(null=True, blank=True)
+    content_type = models.CharField(max_length=100, blank=True, default='')
+    etag = models.CharField(max_length=255, blank=True, default='')
+    last_modified = models.CharField(max_length=64, blank=True, default='')
+    blob = models.ForeignKey(SnapshotBlob, on_delete=models.PROTECT, null=True, blank=True, related_name='snapshots')
+
+    SOURCE_CHOICES = [
+        ('checker', 'Link checker'),
+        ('sandbox', 'Sandbox'),
+        ('investigator', 'Investigator'),
+    ]
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['url', '-fetched_at']),
+            models.Index(fields=['fetched_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.url} @ {self.fetched_at:%Y-%m-%d %H:%M} ({self.status_code})"
+
+    @property
+    def content_hash(self):
+        return self.blob_id or ''
+
+
+class PageFingerprint(models.Model):
+    """SimHash of a link's page, split into bands for near-duplicate lookup"""
+    onion_link = models.OneToOneField(OnionLink, on_delete=models.CASCADE, related_name='fingerprint')
+    simhash = models.BigIntegerField(help_text="64-bit SimHash stored as a signed integer")
+    # Four 16-bit slices of the SimHash; any two fingerprints within 3 bits share one
+    band_0 = models.IntegerField(db_index=True)
+    band_1 = models.IntegerField(db_index=True)
+    band_2 = models.IntegerField(db_index=True)
+    band_3 = models.IntegerField(db_index=True)
+    # Representative of this link's mirror cluster (null when the link is the representative)
+    cluster = models.ForeignKey(OnionLink, on_delete=models.SET_NULL, null=True, blank=True, related_name='mirrors')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.onion_link.url} ({self.simhash & 0xFFFFFFFFFFFFFFFF:016x})"
+
+    @property
+    def cluster_id_or_self(self):
+        return self.cluster_id or self.onion_link_id
+
+
+class LinkStats(models.Model):
+    """Rolling check history of a link, used to predict liveness and latency"""
+    onion_link = models.OneToOneField(OnionLink, on_delete=models.CASCADE, related_name='stats')
+    check_count = models.PositiveIntegerField(default=0)
+    alive_count = models.PositiveIntegerField(default=0)
+    # Response times (seconds) of the most recent alive checks, oldest first
+    recent_response_times = models.JSONField(default=list, blank=True)
+    # Same checks split by phase: connect (SOCKS + rendezvous) and wait for the first byte after it
+    recent_connect_times = models.JSONField(default=list, blank=True)
+    recent_first_byte_times = models.JSONField(default=list, blank=True)
+    # Rollups kept up to date on every check, so the history never has to be rescanned
+    ewma_response_time = models.FloatField(null=True, blank=True)
+    last_seen_alive = models.DateTimeField(null=True, blank=True)
+    # Recheck scheduling (services.scheduler)
+    search_hits = models.PositiveIntegerField(default=0)
+    dead_streak = models.PositiveIntegerField(default=0)
+    next_check_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    # Checker worker currently holding the link (services.leases); free once the lease expires
+    leased_by = models.CharField(max_length=100, blank=True, default='', db_index=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'link stats'
+
+    def __str__(self):
+        return f"{self.onion_link.url}: {self.alive_count}/{self.check_count} alive"
+
+    @property
+    def uptime(self):
+        if not self.check_count:
+            return None
+        return self.alive_count / self.check_count
+
+    @property
+    def median_response_time(self):
+        times = sorted(self.recent_response_times or [])
+        if not times:
+            return None
+        mid = len(times) // 2
+        return times[mid] if len(times) % 2 else (times[mid - 1] + times[mid]) / 2
+
+
+class LinkCheck(models.Model):
+    """One check of a link; append-only, written in batches (services.check_history)"""
+    # No FK constraint to check on insert and no separate link index; (onion_link, checked_at) covers lookups
+    onion_link = models.ForeignKey(OnionLink, on_delete=models.CASCADE, db_constraint=False, db_index=False,
+                                   related_name='checks')
+    checked_at = models.DateTimeField()
+    alive = models.BooleanField()
+    latency_ms = models.PositiveIntegerField(null=True, blank=True)
+    failure_reason = models.CharField(max_length=32, choices=FAILURE_REASON_CHOICES, blank=True, default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['onion_link', 'checked_at']),
+            models.Index(fields=['checked_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.onion_link_id} {'alive' if self.alive else 'dead'} at {self.checked_at}"
+
+
+class LinkCheckDay(models.Model):
+    """Daily totals of a link's checks, kept after the raw LinkCheck rows are pruned"""
+    onion_link = models.ForeignKey(OnionLink, on_delete=models.CASCADE, db_constraint=False, db_index=False,
+                                   related_name='check_days')
+    day = models.DateField()
+    checks = models.PositiveIntegerField(default=0)
+    alive = models.PositiveIntegerField(default=0)
+    # Sum and count of the alive checks' latencies, for the daily mean
+    latency_ms_total = models.PositiveBigIntegerField(default=0)
+    latency_samples = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['onion_link', 'day']
+        indexes = [models.Index(fields=['day'])]
+
+    def __str__(self):
+        return f"{self.onion_link_id} on {self.day}: {self.alive}/{self.checks} alive"
+
+    @property
+    def uptime(self):
+        return self.alive / self.checks if self.checks else None
+
+    @property
+    def mean_latency_ms(self):
+        return self.latency_ms_total / self.latency_samples if self.latency_samples else None
+
+
+class CheckWorker(models.Model):
+    """A checker worker process (manage.py check_worker) and its throughput"""
+    name = models.CharField(max_length=100, unique=True)
+    hostname = models.CharField(max_length=255)
+    pid = models.PositiveIntegerField()
+    started_at = models.DateTimeField(auto_now_add=True)
+    last_heartbeat = models.DateTimeField()
+    stopped_at = models.DateTimeField(null=True, blank=True)
+    checks = models.PositiveIntegerField(default=0)
+    alive = models.PositiveIntegerField(default=0)
+    dead = models.PositiveIntegerField(default=0)
+    leases_reclaimed = models.PositiveIntegerField(default=0)
+    # Moving average over recent heartbeats
+    checks_per_minute = models.FloatField(default=0)
+
+    class Meta:
+        ordering = ['-last_heartbeat']
+
+    def __str__(self):
+        return f"{self.name} ({self.checks_per_minute:.1f} checks/min)"
+
+
+class SearchTrace(models.Model):
+    """Stage timings of one progressive search, for finding slow sources and Tor stalls"""
+    search_id = models.CharField(max_length=36, unique=True)
+    keyword = models.CharField(max_length=255)
+    started_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Compact row-oriented spans in milliseconds since the search started; see services.search_trace
+    data = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"{self.keyword} ({self.search_id})"
+
+    @property
+    def duration(self):
+        if self.finished_at is None:
+            return None
+        return (self.finished_at - self.started_at).total_seconds()
+
+
+class RequestProfile(models.Model):
+    """Sampling profile of one request or background job (see services.profiling)"""
+    KIND_CHOICES = [
+        ('request', 'Request'),
+        ('job', 'Background job'),
+    ]
+    # Request ID (X-Profile-Id response header) or job key such as search_check-<search_id>
+    key = models.CharField(max_length=64, db_index=True)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    name = models.CharField(max_length=200)
+    status_code = models.IntegerField(null=True, blank=True)
+    duration = models.FloatField(help_text="Wall time in seconds")
+    sql_queries = models.PositiveIntegerField(default=0)
+    sql_time = models.FloatField(default=0.0, help_text="Seconds spent in SQL")
+    samples = models.PositiveIntegerField(default=0)
+    interval = models.FloatField(help_text="Sampling interval in seconds")
+    # Collapsed stacks, one "frame;frame;frame count" line each, most frequent first
+    stacks = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.name} ({self.key})"
+
+    def hot_frames(self, limit=20):
+        """(frame, share of samples) for the frames most often on top of the stack"""
+        counts = {}
+        total = 0
+        for line in self.stacks.splitlines():
+            stack, _, count = line.rpartition(' ')
+            leaf = stack.rsplit(';', 1)[-1]
+            counts[leaf] = counts.get(leaf, 0) + int(count)
+            total += int(count)
+        ranked = sorted(counts.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [(frame, count / total) for frame, count in ranked] if total else []
@@ -0,0 +1,385 @@
+"""
+Async HTTP client for onion URLs, for the ASGI views.
+
+The sync checker blocks one worker thread per fetch. This client runs on the
+event loop with asyncio streams, so one process can hold hundreds of
+sandbox fetches open. It uses the same transports as the checker:
+
+- local: SOCKS5 to the Tor proxy, with the hostname resolved by Tor
+  (socks5h)
+- cloud: a direct HTTPS connection to the Tor2Web gateway URL
+
+When hedging is enabled (services.hedging), a request with no response
+headers after the host's hedge delay is sent again, over Tor with SOCKS
+credentials that put it on another circuit, or through the next Tor2Web
+gateway; the first response wins.
+
+It speaks HTTP/1.1 with ``Connection: close``. It follows redirects and
+handles Content-Length, chunked and read-until-close bodies, and decodes
+gzip/deflate as the body arrives. Streamed bodies are requested
+uncompressed, but servers that compress anyway are decoded too.
+
+``https://`` onion URLs need ``StreamWriter.start_tls`` (Python 3.11+). On
+older interpreters they fall back to the sync checker in a worker thread.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import ssl
+import struct
+import time
+import zlib
+from typing import AsyncIterator, Dict, Optional
+from urllib.parse import urljoin, urlsplit
+
+from asgiref.sync import sync_to_async
+
+from .failures import TOR_SOCKS_ERRORS
+from .hedging import hedge_delay_for_url, hedging_enabled, isolation_credentials, run_hedged_async
+from .link_checker import OnionLinkCheckerService, is_cloud_environment
+from .metrics import GATEWAY_SECONDS
+from .snapshots import decode_body, get_snapshot_store
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+MAX_REDIRECTS = 5
+CHUNK_SIZE = 64 * 1024
+
+SOCKS_ERRORS = {
+    0x01: 'General SOCKS server failure',
+    0x02: 'Connection not allowed by ruleset',
+    0x03: 'Network unreachable',
+    0x04: 'Host unreachable',
+    0x05: 'Connection refused',
+    0x06: 'TTL expired',
+    0x07: 'Command not supported',
+    0x08: 'Address type not supported',
+    **TOR_SOCKS_ERRORS,
+}
+
+logger = logging.getLogger(__name__)
+
+_tor_port: Optional[int] = None
+_ssl_context: Optional[ssl.SSLContext] = None
+
+
+class AsyncFetchError(Exception):
+    pass
+
+
+class SyncFallbackRequired(Exception):
+    """The URL needs the sync client (https over SOCKS without start_tls)"""
+
+
+class AsyncResponse:
+    """Status and headers of a response whose body is still on the socket"""
+
+    def __init__(self, url: str, status_code: int, headers: Dict[str, str], reader, writer, timeout: float):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self._reader = reader
+        self._writer = writer
+        self._timeout = timeout
+
+    async def _read(self, n: int) -> bytes:
+        return await asyncio.wait_for(self._reader.read(n), self._timeout)
+
+    async def aiter_raw(self) -> AsyncIterator[bytes]:
+        """The body as it arrives (still content-encoded)"""
+        try:
+            if self.headers.get('transfer-encoding', '').lower() == 'chunked':
+                while True:
+                    size_line = await asyncio.wait_for(self._reader.readline(), self._timeout)
+                    size = int(size_line.split(b';', 1)[0].strip() or b'0', 16)
+                    if size == 0:
+                        break
+                    yield await asyncio.wait_for(self._reader.readexactly(size), self._timeout)
+                    await self._reader.readline()
+            elif 'content-length' in self.headers:
+                remaining = int(self.headers['content-length'])
+                while remaining > 0:
+                    chunk = await self._read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    yield chunk
+            else:
+                while True:
+                    chunk = await self._read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+        finally:
+            await self.aclose()
+
+    async def aiter_bytes(self) -> AsyncIterator[bytes]:
+        """The body as it arrives, decoded from gzip/deflate"""
+        encoding = self.headers.get('content-encoding', '').lower()
+        if encoding not in ('gzip', 'deflate'):
+            async for chunk in self.aiter_raw():
+                yield chunk
+            return
+        decoder = None
+        pending = b''
+        async for chunk in self.aiter_raw():
+            if decoder is None:
+                # "deflate" is zlib-wrapped per the RFC, but some servers send it raw
+                pending += chunk
+                if encoding == 'deflate' and len(pending) < 2:
+                    continue
+                if encoding == 'gzip':
+                    wbits = 16 + zlib.MAX_WBITS
+                elif pending[0] & 0x0f == 8 and int.from_bytes(pending[:2], 'big') % 31 == 0:
+                    wbits = zlib.MAX_WBITS
+                else:
+                    wbits = -zlib.MAX_WBITS
+                decoder = zlib.decompressobj(wbits)
+                chunk, pending = pending, b''
+            data = decoder.decompress(chunk)
+            if data:
+                yield data
+        if pending:
+            raise zlib.error('Truncated deflate body')
+        if decoder is not None:
+            tail = decoder.flush()
+            if tail:
+                yield tail
+
+    async def read(self) -> bytes:
+        return b''.join([chunk async for chunk in self.aiter_bytes()])
+
+    async def aclose(self) -> None:
+        if not self._writer.is_closing():
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except (OSError, ssl.SSLError):
+                pass
+
+
+async def _tor_socks_port() -> Optional[int]:
+    global _tor_port
+    if _tor_port is None:
+        from .tor_service import ensure_tor_running
+        _tor_port = await sync_to_async(ensure_tor_running, thread_sensitive=False)()
+    return _tor_port
+
+
+async def _socks5_connect(reader, writer, host: str, port: int, credentials=None) -> None:
+    """SOCKS5 CONNECT; ``credentials`` (username, password) select a circuit of their own"""
+    writer.write(b'\x05\x01\x02' if credentials else b'\x05\x01\x00')
+    await writer.drain()
+    version, method = await reader.readexactly(2)
+    if version != 5 or method != (0x02 if credentials else 0x00):
+        raise AsyncFetchError('SOCKS5 proxy refused the authentication method')
+    if credentials:
+        user, password = (value.encode() for value in credentials)
+        writer.write(b'\x01' + bytes([len(user)]) + user + bytes([len(password)]) + password)
+        await writer.drain()
+        _, status = await reader.readexactly(2)
+        if status != 0:
+            raise AsyncFetchError('SOCKS5 proxy rejected the isolation credentials')
+    name = host.encode('idna')
+    writer.write(b'\x05\x01\x00\x03' + bytes([len(name)]) + name + struct.pack('!H', port))
+    await writer.drain()
+    _, code, _, address_type = await reader.readexactly(4)
+    if code != 0:
+        raise AsyncFetchError(f'0x{code:02x}: {SOCKS_ERRORS.get(code, "Unknown error")}')
+    if address_type == 0x01:
+        await reader.readexactly(4 + 2)
+    elif address_type == 0x04:
+        await reader.readexactly(16 + 2)
+    else:
+        await reader.readexactly((await reader.readexactly(1))[0] + 2)
+
+
+class AsyncOnionClient:
+    """Fetch onion URLs without blocking a thread; one instance can be shared"""
+
+    def __init__(self, timeout: float = 30):
+        global _ssl_context
+        self.timeout = timeout
+        self.is_cloud = is_cloud_environment()
+        if _ssl_context is None:
+            _ssl_context = ssl.create_default_context()
+        self._ssl = _ssl_context
+
+    async def _connect(self, url: str, isolate: bool = False):
+        parts = urlsplit(url)
+        host = parts.hostname or ''
+        https = parts.scheme == 'https'
+        port = parts.port or (443 if https else 80)
+        if self.is_cloud:
+            reader, writer = await asyncio.open_connection(
+                host, port, ssl=self._ssl if https else None, server_hostname=host if https else None,
+            )
+            return reader, writer
+        tor_port = await _tor_socks_port()
+        if not tor_port:
+            raise AsyncFetchError('Tor is not available')
+        reader, writer = await asyncio.open_connection('127.0.0.1', tor_port)
+        try:
+            await _socks5_connect(reader, writer, host, port, isolation_credentials() if isolate else None)
+            if https:
+                if not hasattr(writer, 'start_tls'):
+                    raise SyncFallbackRequired()
+                await writer.start_tls(self._ssl, server_hostname=host)
+        except BaseException:
+            writer.close()
+            raise
+        return reader, writer
+
+    async def _request(self, url: str, accept_encoding: str, timeout: float, isolate: bool = False) -> AsyncResponse:
+        reader, writer = await self._connect(url, isolate)
+        try:
+            parts = urlsplit(url)
+            path = parts.path or '/'
+            if parts.query:
+                path += '?' + parts.query
+            host = parts.netloc.rsplit('@', 1)[-1]
+            writer.write((
+                f'GET {path} HTTP/1.1\r\nHost: {host}\r\nUser-Agent: {USER_AGENT}\r\n'
+                f'Accept: */*\r\nAccept-Encoding: {accept_encoding}\r\nConnection: close\r\n\r\n'
+            ).encode('latin-1'))
+            await writer.drain()
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.LimitOverrunError:
+            writer.close()
+            raise AsyncFetchError('Response headers too large')
+        except asyncio.IncompleteReadError:
+            writer.close()
+            raise AsyncFetchError('Connection closed before the response headers')
+        except BaseException:
+            writer.close()
+            raise
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            status_code = int(lines[0].split(' ', 2)[1])
+        except (IndexError, ValueError):
+            writer.close()
+            raise AsyncFetchError(f'Malformed status line: {lines[0][:100]!r}')
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(':')
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+        return AsyncResponse(url, status_code, headers, reader, writer, timeout)
+
+    async def open(self, url: str, accept_encoding: str = 'gzip, deflate', timeout: Optional[float] = None) -> AsyncResponse:
+        """Send GET (following redirects) and return once the response headers are in"""
+        timeout = timeout or self.timeout
+        target = get_gateway_url(url) if self.is_cloud else url
+        started = time.perf_counter()
+        try:
+            response = await asyncio.wait_for(self._first_hop(url, target, accept_encoding, timeout), timeout)
+            redirects = 0
+            while response.status_code in (301, 302, 303, 307, 308) and response.headers.get('location'):
+                await response.aclose()
+                if redirects == MAX_REDIRECTS:
+                    raise AsyncFetchError('Too many redirects')
+                redirects += 1
+                # Relative to the response, which may be the hedge's gateway
+                target = urljoin(response.url, response.headers['location'])
+                response = await asyncio.wait_for(self._request(target, accept_encoding, timeout), timeout)
+        except Exception:
+            if self.is_cloud:
+                GATEWAY_SECONDS.labels(gateway=_gateway(), outcome='error').observe(time.perf_counter() - started)
+            raise
+        if self.is_cloud:
+            GATEWAY_SECONDS.labels(gateway=_gateway(), outcome='ok').observe(time.perf_counter() - started)
+        return response
+
+    async def _first_hop(self, url: str, target: str, accept_encoding: str, timeout: float) -> AsyncResponse:
+        """The first request of open(), hedged when the host's history gives a hedge delay"""
+        primary = lambda: self._request(target, accept_encoding, timeout)
+        if not hedging_enabled():
+            return await primary()
+        delay = await sync_to_async(hedge_delay_for_url, thread_sensitive=False)(url, timeout)
+        if delay is None:
+            return await primary()
+        if self.is_cloud:
+            hedge_target = get_gateway_url(url, _gateway(1))
+            hedge = lambda: self._request(hedge_target, accept_encoding, timeout)
+        else:
+            hedge = lambda: self._request(target, accept_encoding, timeout, isolate=True)
+        return await run_hedged_async(primary, hedge, delay, discard=lambda response: response.aclose())
+
+    async def fetch(self, url: str, timeout: Optional[float] = None) -> dict:
+        """Buffered fetch; same result shape as OnionLinkCheckerService.fetch_content"""
+        timeout = timeout or self.timeout
+        try:
+            response = await self.open(url, timeout=timeout)
+            body = await asyncio.wait_for(response.read(), timeout * 4)
+        except SyncFallbackRequired:
+            checker = await sync_to_async(OnionLinkCheckerService, thread_sensitive=False)(timeout=timeout)
+            return await sync_to_async(checker.fetch_content, thread_sensitive=False)(url)
+        except Exception as e:
+            return {'success': False, 'error': str(e) or type(e).__name__, 'status_code': None}
+        headers = {name.title(): value for name, value in response.headers.items()}
+        return {
+            'success': True,
+            'content': decode_body(body, headers.get('Content-Type', '')),
+            'binary_content': body,
+            'status_code': response.status_code,
+            'headers': headers,
+            'url': response.url,
+        }
+
+    async def fetch_content(self, url: str, timeout: Optional[float] = None) -> dict:
+        """Page fetch for the sandbox: a fresh snapshot if there is one, else fetch and store"""
+        store = get_snapshot_store()
+        snapshot = await sync_to_async(store.get_fresh, thread_sensitive=False)(url)
+        body = await sync_to_async(store.read, thread_sensitive=False)(snapshot) if snapshot is not None else None
+        if body is not None:
+            return {
+                'success': True,
+                'content': decode_body(body, snapshot.content_type),
+                'status_code': snapshot.status_code,
+                'headers': {'Content-Type': snapshot.content_type},
+                'url': url,
+                'from_snapshot': True,
+            }
+        result = await self.fetch(url, timeout=timeout)
+        if result['success'] and not result.get('from_snapshot'):
+            await sync_to_async(_store_snapshot, thread_sensitive=False)(url, result)
+        return result
+
+
+def _store_snapshot(url: str, result: dict) -> None:
+    headers = result.get('headers') or {}
+    try:
+        get_snapshot_store().save(
+            url,
+            result.get('binary_content'),
+            result.get('status_code'),
+            'sandbox',
+            content_type=headers.get('Content-Type', ''),
+            etag=headers.get('Etag', ''),
+            last_modified=headers.get('Last-Modified', ''),
+        )
+    except Exception as e:
+        logger.warning(f"Could not store snapshot of {url}: {e}")
+
+
+def _gateway(index: int = 0) -> str:
+    from .cloud_tor_proxy import get_cloud_proxy
+    gateways = get_cloud_proxy().tor2web_gateways
+    return gateways[index % len(gateways)]
+
+
+def get_gateway_url(url: str, gateway: Optional[str] = None) -> str:
+    from .cloud_tor_proxy import get_cloud_proxy
+    return get_cloud_proxy().convert_onion_url(url, gateway)
+
+
+_client: Optional[AsyncOnionClient] = None
+
+
+def get_async_client() -> AsyncOnionClient:
+    """Get the global async client (holds no connections, safe across event loops)"""
+    global _client
+    if _client is None:
+        _client = AsyncOnionClient(timeout=30)
+    return _client
@@ -0,0 +1,199 @@
+"""
+Append-only history of link checks.
+
+OnionLink only holds the latest result. Every check is also appended to
+LinkCheck as one narrow row: link id, time, alive, latency in ms and failure
+reason. Rows are buffered and written with one bulk insert per
+CHECK_HISTORY_BATCH rows; a background thread writes whatever is buffered
+every CHECK_HISTORY_FLUSH_SECONDS, so a quiet process does not sit on rows.
+The checker never waits on a per-check insert and the OnionLink table is
+not touched.
+
+Per-link rollups (uptime, EWMA latency, last seen alive) live on LinkStats
+and are updated on each check by prioritizer.record_check, so nothing here
+is rescanned to answer them.
+
+Retention (``prune_check_history``): raw rows older than
+CHECK_HISTORY_RAW_DAYS are folded into one LinkCheckDay row per link and
+day, then deleted; daily rows older than CHECK_HISTORY_DAILY_DAYS are
+deleted.
+"""
+
+from __future__ import annotations
+
+import atexit
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from links.models import LinkCheck, LinkCheckDay
+
+logger = logging.getLogger(__name__)
+
+# Rows deleted per statement while pruning
+DELETE_CHUNK = 10000
+
+
+class CheckHistoryWriter:
+    """Thread-safe buffer of LinkCheck rows, written in bulk"""
+
+    def __init__(self, batch_size: Optional[int] = None, flush_seconds: Optional[float] = None):
+        self.batch_size = batch_size or getattr(settings, 'CHECK_HISTORY_BATCH', 500)
+        self.flush_seconds = flush_seconds if flush_seconds is not None else getattr(
+            settings, 'CHECK_HISTORY_FLUSH_SECONDS', 5.0)
+        self._rows: List[LinkCheck] = []
+        self._oldest = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, link_id: int, alive: bool, latency: Optional[float] = None, failure_reason: str = '',
+            checked_at: Optional[datetime] = None) -> None:
+        """Queue one check; ``latency`` in seconds"""
+        row = LinkCheck(
+            onion_link_id=link_id,
+            checked_at=checked_at or timezone.now(),
+            alive=alive,
+            latency_ms=round(latency * 1000) if latency is not None else None,
+            failure_reason=failure_reason or '',
+        )
+        with self._lock:
+            if not self._rows:
+                self._oldest = time.monotonic()
+            self._rows.append(row)
+            due = len(self._rows) >= self.batch_size or time.monotonic() - self._oldest >= self.flush_seconds
+        if due:
+            self.flush()
+
+    def flush(self) -> int:
+        """Write the queued rows; returns how many were written"""
+        with self._lock:
+            rows, self._rows = self._rows, []
+        if not rows:
+            return 0
+        try:
+            LinkCheck.objects.bulk_create(rows, batch_size=self.batch_size)
+        except Exception as e:
+            logger.warning(f"Could not write {len(rows)} check history row(s): {e}")
+            return 0
+        return len(rows)
+
+    def start_flusher(self) -> None:
+        """Flush every ``flush_seconds`` in the background, even when no checks arrive"""
+        def run():
+            while True:
+                time.sleep(max(self.flush_seconds, 0.5))
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.warning(f"Could not flush check history: {e}")
+                finally:
+                    close_old_connections()
+
+        threading.Thread(target=run, name='check-history-flusher', daemon=True).start()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+
+_writer: Optional[CheckHistoryWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_check_history() -> CheckHistoryWriter:
+    """Get the process-wide history writer (flushed periodically and at exit)"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = CheckHistoryWriter()
+                _writer.start_flusher()
+                atexit.register(_writer.flush)
+    return _writer
+
+
+def _reset_writer_after_fork() -> None:
+    """A forked child gets its own writer: the flusher thread doesn't survive fork"""
+    global _writer_lock
+    _writer_lock = threading.Lock()
+    if _writer is not None:
+        # The parent still owns and will write the inherited rows
+        _writer._rows = []
+        _writer._lock = threading.Lock()
+        _writer.start_flusher()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_writer_after_fork)
+
+
+def _day_start(moment: datetime) -> datetime:
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def downsample(before: datetime) -> Dict[str, int]:
+    """
+    Fold the raw rows of every whole day before ``before`` into LinkCheckDay
+    and delete them, one day per transaction.
+    """
+    before = _day_start(before)
+    stats = {'days': 0, 'rows_folded': 0, 'day_rows': 0}
+    oldest = LinkCheck.objects.filter(checked_at__lt=before).order_by('checked_at').values_list(
+        'checked_at', flat=True).first()
+    if oldest is None:
+        return stats
+    day = _day_start(oldest)
+    while day < before:
+        end = day + timedelta(days=1)
+        raw = LinkCheck.objects.filter(checked_at__gte=day, checked_at__lt=end)
+        totals = raw.values('onion_link_id').annotate(
+            checks=Count('id'),
+            alive_checks=Count('id', filter=Q(alive=True)),
+            latency_total=Sum('latency_ms', filter=Q(alive=True)),
+            latency_samples=Count('latency_ms', filter=Q(alive=True)),
+        )
+        with transaction.atomic():
+            # Days are folded whole and their raw rows deleted, so each day is folded once
+            day_rows = [
+                LinkCheckDay(
+                    onion_link_id=row['onion_link_id'],
+                    day=day.date(),
+                    checks=row['checks'],
+                    alive=row['alive_checks'],
+                    latency_ms_total=row['latency_total'] or 0,
+                    latency_samples=row['latency_samples'],
+                )
+                for row in totals
+            ]
+            LinkCheckDay.objects.bulk_create(day_rows, batch_size=1000)
+            folded, _ = raw.delete()
+        if day_rows:
+            stats['days'] += 1
+            stats['rows_folded'] += folded
+            stats['day_rows'] += len(day_rows)
+        day = end
+    return stats
+
+
+def prune(raw_days: Optional[int] = None, daily_days: Optional[int] = None) -> Dict[str, int]:
+    """Apply the retention policy; see the module docstring"""
+    raw_days = getattr(settings, 'CHECK_HISTORY_RAW_DAYS', 14) if raw_days is None else raw_days
+    daily_days = getattr(settings, 'CHECK_HISTORY_DAILY_DAYS', 365) if daily_days is None else daily_days
+    get_check_history().flush()
+    now = timezone.now()
+    stats = downsample(now - timedelta(days=raw_days))
+    cutoff = (now - timedelta(days=daily_days)).date()
+    stats['day_rows_deleted'] = 0
+    while True:
+        ids = list(LinkCheckDay.objects.filter(day__lt=cutoff).values_list('id', flat=True)[:DELETE_CHUNK])
+        if not ids:
+            break
+        deleted, _ = LinkCheckDay.objects.filter(id__in=ids).delete()
+        stats['day_rows_deleted'] += deleted
+    return stats
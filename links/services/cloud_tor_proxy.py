@@ -5,7 +5,10 @@ Uses public Tor2Web proxies for cloud deployment (Render, Heroku, etc.)
 
 import requests
 import logging
+import time
 from urllib.parse import urlparse
+from .metrics import GATEWAY_SECONDS
+from .probe_timing import mount_timed_adapter
 
 logger = logging.getLogger(__name__)
 
@@ -26,11 +29,12 @@ class CloudTorProxy:
             'onion.ly',
         ]
         self.session = requests.Session()
+        mount_timed_adapter(self.session)
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
 
-    def convert_onion_url(self, onion_url):
+    def convert_onion_url(self, onion_url, gateway=None):
         """
         Convert .onion URL to accessible clearnet URL using Tor2Web gateway
         Example: http://site.onion → http://site.onion.to
@@ -38,8 +42,8 @@ class CloudTorProxy:
         try:
             parsed = urlparse(onion_url)
             if '.onion' in parsed.netloc:
-                # Try first available gateway
-                gateway = self.tor2web_gateways[0]
+                # First available gateway unless told otherwise
+                gateway = gateway or self.tor2web_gateways[0]
 
                 # Remove .onion and add gateway
                 domain = parsed.netloc.replace('.onion', '')
@@ -57,10 +61,12 @@ class CloudTorProxy:
             logger.error(f"Error converting onion URL: {e}")
             return onion_url
 
-    def fetch(self, url, timeout=30):
-        """Fetch content from onion URL via Tor2Web gateway"""
+    def fetch(self, url, timeout=30, gateway=None):
+        """Fetch content from onion URL via Tor2Web gateway (the first one unless ``gateway``)"""
+        started = time.perf_counter()
+        gateway = gateway or self.tor2web_gateways[0]
         try:
-            converted_url = self.convert_onion_url(url)
+            converted_url = self.convert_onion_url(url, gateway)
             logger.info(f"Fetching via gateway: {converted_url}")
 
             response = self.session.get(
@@ -69,6 +75,7 @@ class CloudTorProxy:
                 allow_redirects=True,
                 verify=True  # Keep SSL verification for security
             )
+            GATEWAY_SECONDS.labels(gateway=gateway, outcome='ok').observe(time.perf_counter() - started)
 
             return {
                 'success': True,
@@ -76,9 +83,11 @@ class CloudTorProxy:
                 'binary_content': response.content,
                 'status_code': response.status_code,
                 'headers': dict(response.headers),
-                'url': response.url
+                'url': response.url,
+                'elapsed': response.elapsed.total_seconds()
             }
         except Exception as e:
+            GATEWAY_SECONDS.labels(gateway=gateway, outcome='error').observe(time.perf_counter() - started)
             logger.error(f"Error fetching {url}: {e}")
             return {
                 'success': False,
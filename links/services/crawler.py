@@ -0,0 +1,312 @@
+"""
+Bounded multi-hop crawler built on the investigator.
+
+Starting from a seed onion, pages are fetched breadth-first up to a maximum
+depth and page budget. The frontier lives in the database (CrawlPage rows),
+and the seen-set is a fixed-size Bloom filter saved on the CrawlJob, so a
+crawl can be interrupted and resumed without re-fetching or re-enqueueing
+pages. Every fetched page goes through the artifact extractors.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import math
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Optional
+from urllib.parse import urljoin, urlparse
+from urllib.robotparser import RobotFileParser
+
+from django.utils import timezone
+
+from links.models import CrawlJob, CrawlPage
+from .extractors import extract_artifacts
+from .investigator import OnionInvestigator
+from .onion_url import canonicalize_onion_url
+from .politeness import HostRateLimiter, host_of
+
+logger = logging.getLogger(__name__)
+
+CRAWLABLE_CONTENT_TYPES = ('text/html', 'application/xhtml+xml', 'text/plain')
+ROBOTS_MAX_BYTES = 64 * 1024
+
+
+class BloomFilter:
+    """
+    Fixed-size probabilistic set.
+
+    Memory is bounded by ``capacity`` and ``error_rate`` regardless of how
+    many URLs are added; past capacity the false-positive rate rises, which
+    for a crawler only means a few extra pages are skipped.
+    """
+
+    def __init__(self, capacity: int = 100_000, error_rate: float = 0.001):
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, item: str) -> bool:
+        """Add ``item``; return True if it was (probably) already present."""
+        present = True
+        for pos in self._positions(item):
+            byte, bit = divmod(pos, 8)
+            if not self.bits[byte] & (1 << bit):
+                present = False
+                self.bits[byte] |= 1 << bit
+        return present
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[pos // 8] & (1 << (pos % 8)) for pos in self._positions(item))
+
+    def to_bytes(self) -> bytes:
+        header = self.num_bits.to_bytes(8, 'big') + self.num_hashes.to_bytes(2, 'big')
+        return header + bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'BloomFilter':
+        bloom = cls.__new__(cls)
+        bloom.num_bits = int.from_bytes(data[:8], 'big')
+        bloom.num_hashes = int.from_bytes(data[8:10], 'big')
+        bloom.bits = bytearray(data[10:])
+        return bloom
+
+
+def normalize_crawl_url(url: str) -> Optional[str]:
+    """Return the canonical crawlable onion URL, or None if out of scope."""
+    if urlparse(url.strip()).scheme not in ('http', 'https'):
+        return None
+    return canonicalize_onion_url(url).url
+
+
+class OnionCrawler:
+    """
+    Breadth-first crawler over a CrawlJob's persistent frontier.
+
+    Args:
+        job: The CrawlJob to run or resume
+        investigator: Investigator whose Tor session and settings are reused
+        workers: Global limit on simultaneous page fetches
+        bloom_capacity: Expected number of distinct URLs for the seen-set
+    """
+
+    def __init__(self, job: CrawlJob, investigator: OnionInvestigator = None, workers: int = 8,
+                 bloom_capacity: int = 100_000, progress_interval: int = 25):
+        self.job = job
+        self.investigator = investigator or OnionInvestigator(timeout=60)
+        self.session = self.investigator.session
+        self.workers = max(1, workers)
+        self.progress_interval = progress_interval
+        self.limiter = HostRateLimiter(max_per_host=job.per_host_concurrency, min_interval=job.host_delay)
+        self._robots: Dict[str, Optional[RobotFileParser]] = {}
+        self._robots_lock = threading.Lock()
+        if job.seen_filter:
+            self.seen = BloomFilter.from_bytes(bytes(job.seen_filter))
+        else:
+            self.seen = BloomFilter(capacity=bloom_capacity)
+
+    # --- Frontier
+
+    def _enqueue(self, urls, depth: int) -> int:
+        pages = []
+        for url in urls:
+            url = normalize_crawl_url(url)
+            if url and not self.seen.add(url):
+                pages.append(CrawlPage(job=self.job, url=url, host=host_of(url), depth=depth))
+        if pages:
+            CrawlPage.objects.bulk_create(pages, ignore_conflicts=True)
+        return len(pages)
+
+    def _prepare(self) -> None:
+        """Seed a new job, or recover pages left in flight by an interrupted run."""
+        if not self.job.pages.exists():
+            self._enqueue([self.job.seed_url], depth=0)
+        self.job.pages.filter(state='fetching').update(state='queued')
+        self.job.status = 'running'
+        self._checkpoint()
+
+    def _checkpoint(self) -> None:
+        self.job.seen_filter = self.seen.to_bytes()
+        self.job.save()
+
+    # --- Fetching (runs on worker threads)
+
+    def _robots_for(self, url: str) -> Optional[RobotFileParser]:
+        host = host_of(url)
+        with self._robots_lock:
+            if host in self._robots:
+                return self._robots[host]
+        parser = None
+        robots_url = urljoin(url, '/robots.txt')
+        try:
+            with self.limiter.slot(robots_url):
+                response = self.session.get(robots_url, timeout=self.investigator.timeout, stream=True)
+                body = self._read_limited(response, ROBOTS_MAX_BYTES)
+            if response.status_code == 200:
+                parser = RobotFileParser()
+                parser.parse(body.decode('utf-8', 'replace').splitlines())
+        except Exception as e:
+            logger.debug(f"No robots.txt for {host}: {e}")
+        with self._robots_lock:
+            self._robots[host] = parser
+        return parser
+
+    @staticmethod
+    def _read_limited(response, max_bytes: int) -> bytes:
+        chunks = []
+        size = 0
+        try:
+            for chunk in response.iter_content(chunk_size=16384):
+                chunks.append(chunk)
+                size += len(chunk)
+                if size >= max_bytes:
+                    break
+        finally:
+            response.close()
+        return b''.join(chunks)[:max_bytes]
+
+    def _fetch(self, page: CrawlPage) -> Dict:
+        if self.job.respect_robots:
+            robots = self._robots_for(page.url)
+            user_agent = self.session.headers.get('User-Agent', '*')
+            if robots and not robots.can_fetch(user_agent, page.url):
+                return {'state': 'skipped', 'error': 'Disallowed by robots.txt'}
+
+        with self.limiter.slot(page.url):
+            response = self.session.get(page.url, timeout=self.investigator.timeout, stream=True)
+            content_type = response.headers.get('Content-Type', '')
+            if content_type and not content_type.startswith(CRAWLABLE_CONTENT_TYPES):
+                response.close()
+                return {'state': 'skipped', 'status_code': response.status_code,
+                        'error': f'Unsupported content type {content_type[:100]}'}
+            body = self._read_limited(response, self.job.max_page_bytes)
+
+        text = body.decode(response.encoding or 'utf-8', 'replace')
+        artifacts = extract_artifacts(text, validate=self.investigator.validate_checksums)
+        links = [urljoin(page.url, href) for href in artifacts.pop('links', [])]
+        return {
+            'state': 'done' if response.status_code < 400 else 'failed',
+            'status_code': response.status_code,
+            'artifacts': artifacts,
+            'links': links,
+        }
+
+    def _safe_fetch(self, page: CrawlPage) -> Dict:
+        try:
+            return self._fetch(page)
+        except Exception as e:
+            return {'state': 'failed', 'error': str(e)[:255]}
+
+    # --- Main loop
+
+    def _record(self, page: CrawlPage, outcome: Dict) -> None:
+        page.state = outcome['state']
+        page.status_code = outcome.get('status_code')
+        page.error = outcome.get('error', '')
+        page.artifacts = outcome.get('artifacts', {})
+        page.fetched_at = timezone.now()
+
+        links = outcome.get('links', [])
+        page.links_found = len(links)
+        if page.state == 'done' and page.depth < self.job.max_depth:
+            self._enqueue(links, depth=page.depth + 1)
+        page.save(update_fields=['state', 'status_code', 'error', 'artifacts', 'links_found', 'fetched_at'])
+
+        if page.state == 'failed':
+            self.job.pages_failed += 1
+        elif page.state == 'done':
+            self.job.pages_fetched += 1
+
+    def run(self, stop_event: threading.Event = None) -> CrawlJob:
+        """Crawl until the frontier is empty or the page budget is spent."""
+        stop_event = stop_event or threading.Event()
+        self._prepare()
+        started = time.monotonic()
+        last_report = started
+        run_pages = 0
+        in_flight = {}
+        host_load: Dict[str, int] = {}
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                while not stop_event.is_set():
+                    budget = self.job.max_pages - self.job.pages_fetched - self.job.pages_failed - len(in_flight)
+                    while budget > 0 and len(in_flight) < self.workers:
+                        # Breadth-first: shallowest queued pages first, on hosts below their cap.
+                        # Busy hosts are excluded in the query, so one host's pages can't fill
+                        # the window and hide every other host's.
+                        busy = [host for host, load in host_load.items() if load >= self.job.per_host_concurrency]
+                        candidates = list(
+                            self.job.pages.filter(state='queued').exclude(host__in=busy)
+                            .order_by('depth', 'id')[:self.workers * 8]
+                        )
+                        submitted = 0
+                        for page in candidates:
+                            if budget <= 0 or len(in_flight) >= self.workers:
+                                break
+                            host = page.host
+                            if host_load.get(host, 0) >= self.job.per_host_concurrency:
+                                continue
+                            page.state = 'fetching'
+                            page.save(update_fields=['state'])
+                            host_load[host] = host_load.get(host, 0) + 1
+                            in_flight[executor.submit(self._safe_fetch, page)] = (page, host)
+                            budget -= 1
+                            submitted += 1
+                        if not submitted:
+                            break
+
+                    if not in_flight:
+                        break
+
+                    done, _ = wait(in_flight, timeout=1.0, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        page, host = in_flight.pop(future)
+                        host_load[host] -= 1
+                        self._record(page, future.result())
+                        run_pages += 1
+
+                        if run_pages % self.progress_interval == 0:
+                            now = time.monotonic()
+                            logger.info(
+                                f"Crawl {self.job.id}: {self.job.pages_fetched + self.job.pages_failed} pages, "
+                                f"{self.progress_interval / max(now - last_report, 1e-6):.2f} pages/sec"
+                            )
+                            last_report = now
+                            self.job.elapsed_seconds += now - started
+                            started = now
+                            self._checkpoint()
+
+                    # Drain in-flight fetches before stopping so none are lost
+                    if stop_event.is_set():
+                        for future in in_flight:
+                            page, _ = in_flight[future]
+                            self._record(page, future.result())
+                        in_flight.clear()
+        except BaseException:
+            self.job.status = 'paused'
+            raise
+        finally:
+            self.job.elapsed_seconds += time.monotonic() - started
+            if self.job.status == 'running':
+                queued = self.job.pages.filter(state='queued').exists()
+                budget_left = self.job.pages_fetched + self.job.pages_failed < self.job.max_pages
+                if stop_event.is_set() and queued and budget_left:
+                    self.job.status = 'paused'
+                else:
+                    self.job.status = 'finished'
+                    self.job.finished_at = timezone.now()
+            self.job.pages.filter(state='fetching').update(state='queued')
+            self._checkpoint()
+
+        logger.info(f"Crawl {self.job.id} {self.job.status}: {self.job.pages_per_second:.2f} pages/sec overall")
+        return self.job
@@ -0,0 +1,156 @@
+"""
+Inverted index from extracted artifacts to the pages they appear on.
+
+Investigations and crawled pages keep their findings as JSON lists. This
+module mirrors those lists into the Entity/EntitySighting tables so "which
+other onions show this wallet" is an indexed lookup rather than a scan of
+every investigation.
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from django.db import transaction
+
+from links.models import CrawlPage, Entity, EntitySighting, Investigation
+from .politeness import host_of
+
+logger = logging.getLogger(__name__)
+
+# Artifact key -> Entity.entity_type
+ENTITY_TYPES = {
+    'emails': 'email',
+    'btc_addresses': 'btc',
+    'monero_addresses': 'xmr',
+    'ethereum_addresses': 'eth',
+    'onion_addresses': 'onion',
+}
+
+
+def normalize_entity(entity_type: str, value: str) -> str:
+    """Canonical form used for matching; case only matters for base58 values."""
+    value = value.strip()
+    if entity_type in ('email', 'eth', 'onion'):
+        return value.lower()
+    if entity_type == 'btc' and value[:3].lower() == 'bc1':
+        return value.lower()
+    return value
+
+
+def _entities_from_artifacts(artifacts: Dict[str, List[str]]) -> Set[Tuple[str, str]]:
+    pairs = set()
+    for key, entity_type in ENTITY_TYPES.items():
+        for value in artifacts.get(key) or []:
+            value = normalize_entity(entity_type, value)
+            if value and len(value) <= 255:
+                pairs.add((entity_type, value))
+    return pairs
+
+
+def investigation_entities(investigation: Investigation) -> Set[Tuple[str, str]]:
+    artifacts = dict(investigation.artifacts or {})
+    artifacts.update({
+        'emails': investigation.emails,
+        'btc_addresses': investigation.btc_addresses,
+        'monero_addresses': investigation.monero_addresses,
+        'ethereum_addresses': investigation.ethereum_addresses,
+    })
+    return _entities_from_artifacts(artifacts)
+
+
+def _resolve_entities(pairs: Iterable[Tuple[str, str]]) -> List[Entity]:
+    """Return Entity rows for ``pairs``, creating missing ones."""
+    pairs = set(pairs)
+    if not pairs:
+        return []
+    Entity.objects.bulk_create(
+        [Entity(entity_type=t, value=v) for t, v in pairs],
+        ignore_conflicts=True,
+    )
+    by_type: Dict[str, List[str]] = {}
+    for entity_type, value in pairs:
+        by_type.setdefault(entity_type, []).append(value)
+    entities = []
+    for entity_type, values in by_type.items():
+        entities.extend(Entity.objects.filter(entity_type=entity_type, value__in=values))
+    return entities
+
+
+def _sync_sightings(pairs: Set[Tuple[str, str]], onion_host: str, **owner) -> int:
+    with transaction.atomic():
+        entities = _resolve_entities(pairs)
+        EntitySighting.objects.filter(**owner).exclude(entity__in=entities).delete()
+        EntitySighting.objects.bulk_create(
+            [EntitySighting(entity=entity, onion_host=onion_host, **owner) for entity in entities],
+            ignore_conflicts=True,
+        )
+    return len(entities)
+
+
+def index_investigation(investigation: Investigation) -> int:
+    """Mirror an investigation's findings into the entity index."""
+    return _sync_sightings(
+        investigation_entities(investigation),
+        host_of(investigation.investigated_url),
+        investigation=investigation,
+    )
+
+
+def index_crawl_page(page: CrawlPage) -> int:
+    """Mirror a crawled page's artifacts into the entity index."""
+    return _sync_sightings(
+        _entities_from_artifacts(page.artifacts or {}),
+        host_of(page.url),
+        crawl_page=page,
+    )
+
+
+def find_cooccurrences(value: str, entity_type: Optional[str] = None) -> List[Dict]:
+    """
+    Find every page an entity was seen on.
+
+    Both lookups are index seeks: the entity by its (type, value) unique index
+    and its sightings by the entity foreign key.
+    """
+    entities = Entity.objects.all()
+    if entity_type:
+        entities = entities.filter(entity_type=entity_type, value=normalize_entity(entity_type, value))
+    else:
+        candidates = {value.strip(), value.strip().lower()}
+        entities = entities.filter(value__in=candidates)
+
+    results = []
+    for entity in entities:
+        sightings = (
+            entity.sightings
+            .select_related('investigation', 'crawl_page')
+            .order_by('onion_host', '-seen_at')
+        )
+        hosts: Dict[str, Dict] = {}
+        for sighting in sightings:
+            entry = hosts.setdefault(sighting.onion_host, {
+                'onion_host': sighting.onion_host,
+                'investigations': [],
+                'crawl_pages': [],
+                'last_seen': sighting.seen_at.isoformat(),
+            })
+            if sighting.investigation_id:
+                entry['investigations'].append({
+                    'id': sighting.investigation_id,
+                    'url': sighting.investigation.investigated_url,
+                })
+            if sighting.crawl_page_id:
+                entry['crawl_pages'].append({
+                    'id': sighting.crawl_page_id,
+                    'url': sighting.crawl_page.url,
+                    'job_id': sighting.crawl_page.job_id,
+                })
+        results.append({
+            'entity_type': entity.entity_type,
+            'value': entity.value,
+            'host_count': len(hosts),
+            'hosts': list(hosts.values()),
+        })
+    return results
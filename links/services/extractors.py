@@ -0,0 +1,421 @@
+"""
+Single-pass artifact extraction for investigated pages.
+
+Every registered extractor contributes (or shares) one branch of a combined,
+precompiled regular expression, so a document is scanned exactly once no
+matter how many artifact types are registered. Optional validators (base58check, bech32,
+EIP-55, Monero checksums) drop look-alike strings before they reach the
+database.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import html
+import logging
+import re
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+# --- Checksum helpers
+
+_B58_ALPHABET = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+_B58_INDEX = {c: i for i, c in enumerate(_B58_ALPHABET)}
+
+
+def b58decode(value: str) -> Optional[bytes]:
+    """Decode a Bitcoin-style base58 string, or return None if it is not base58."""
+    num = 0
+    for char in value:
+        digit = _B58_INDEX.get(char)
+        if digit is None:
+            return None
+        num = num * 58 + digit
+    body = num.to_bytes((num.bit_length() + 7) // 8, 'big') if num else b''
+    pad = len(value) - len(value.lstrip('1'))
+    return b'\x00' * pad + body
+
+
+def b58encode(data: bytes) -> str:
+    num = int.from_bytes(data, 'big')
+    encoded = ''
+    while num:
+        num, rem = divmod(num, 58)
+        encoded = _B58_ALPHABET[rem] + encoded
+    pad = len(data) - len(data.lstrip(b'\x00'))
+    return '1' * pad + encoded
+
+
+def is_valid_base58check_address(address: str) -> bool:
+    """Validate a P2PKH/P2SH address: 25 bytes with a double-SHA256 checksum."""
+    raw = b58decode(address)
+    if raw is None or len(raw) != 25 or raw[0] not in (0x00, 0x05):
+        return False
+    digest = hashlib.sha256(hashlib.sha256(raw[:-4]).digest()).digest()
+    return digest[:4] == raw[-4:]
+
+
+_BECH32_CHARSET = 'qpzry9x8gf2tvdw0s3jn54khce6mua7l'
+_BECH32_INDEX = {c: i for i, c in enumerate(_BECH32_CHARSET)}
+_BECH32_CONST = 1
+_BECH32M_CONST = 0x2BC830A3
+
+
+def _bech32_polymod(values: Iterable[int]) -> int:
+    generator = (0x3B6A57B2, 0x26508E6D, 0x1EA119FA, 0x3D4233DD, 0x2A1462B3)
+    chk = 1
+    for value in values:
+        top = chk >> 25
+        chk = (chk & 0x1FFFFFF) << 5 ^ value
+        for i in range(5):
+            if (top >> i) & 1:
+                chk ^= generator[i]
+    return chk
+
+
+def _convert_bits(data: Iterable[int], from_bits: int, to_bits: int) -> Optional[List[int]]:
+    acc = 0
+    bits = 0
+    out = []
+    maxv = (1 << to_bits) - 1
+    for value in data:
+        acc = (acc << from_bits) | value
+        bits += from_bits
+        while bits >= to_bits:
+            bits -= to_bits
+            out.append((acc >> bits) & maxv)
+    if bits >= from_bits or ((acc << (to_bits - bits)) & maxv):
+        return None
+    return out
+
+
+def is_valid_bech32_address(address: str, hrp: str = 'bc') -> bool:
+    """Validate a segwit address (BIP-173 for v0, BIP-350 bech32m for v1+)."""
+    if address.lower() != address and address.upper() != address:
+        return False
+    address = address.lower()
+    pos = address.rfind('1')
+    if address[:pos] != hrp or pos + 7 > len(address) or len(address) > 90:
+        return False
+    try:
+        data = [_BECH32_INDEX[c] for c in address[pos + 1:]]
+    except KeyError:
+        return False
+    hrp_expanded = [ord(c) >> 5 for c in hrp] + [0] + [ord(c) & 31 for c in hrp]
+    const = _bech32_polymod(hrp_expanded + data)
+    witness_version = data[0]
+    if const != (_BECH32_CONST if witness_version == 0 else _BECH32M_CONST):
+        return False
+    program = _convert_bits(data[1:-6], 5, 8)
+    if program is None or witness_version > 16 or not 2 <= len(program) <= 40:
+        return False
+    return witness_version != 0 or len(program) in (20, 32)
+
+
+_KECCAK_ROUND_CONSTANTS = (
+    0x0000000000000001, 0x0000000000008082, 0x800000000000808A, 0x8000000080008000,
+    0x000000000000808B, 0x0000000080000001, 0x8000000080008081, 0x8000000000008009,
+    0x000000000000008A, 0x0000000000000088, 0x0000000080008009, 0x000000008000000A,
+    0x000000008000808B, 0x800000000000008B, 0x8000000000008089, 0x8000000000008003,
+    0x8000000000008002, 0x8000000000000080, 0x000000000000800A, 0x800000008000000A,
+    0x8000000080008081, 0x8000000000008080, 0x0000000080000001, 0x8000000080008008,
+)
+# Rotation offsets indexed as [x][y]
+_KECCAK_ROTATIONS = (
+    (0, 36, 3, 41, 18),
+    (1, 44, 10, 45, 2),
+    (62, 6, 43, 15, 61),
+    (28, 55, 25, 21, 56),
+    (27, 20, 39, 8, 14),
+)
+_MASK64 = (1 << 64) - 1
+
+
+def _rol64(value: int, shift: int) -> int:
+    return ((value << shift) | (value >> (64 - shift))) & _MASK64 if shift else value
+
+
+def _keccak_f1600(state: List[int]) -> None:
+    for rc in _KECCAK_ROUND_CONSTANTS:
+        c = [state[x] ^ state[x + 5] ^ state[x + 10] ^ state[x + 15] ^ state[x + 20] for x in range(5)]
+        d = [c[(x - 1) % 5] ^ _rol64(c[(x + 1) % 5], 1) for x in range(5)]
+        b = [0] * 25
+        for x in range(5):
+            for y in range(5):
+                b[y + 5 * ((2 * x + 3 * y) % 5)] = _rol64(state[x + 5 * y] ^ d[x], _KECCAK_ROTATIONS[x][y])
+        for y in range(0, 25, 5):
+            row = b[y:y + 5]
+            for x in range(5):
+                state[y + x] = row[x] ^ (~row[(x + 1) % 5] & row[(x + 2) % 5])
+        state[0] ^= rc
+
+
+def keccak256(data: bytes) -> bytes:
+    """
+    Original Keccak-256 as used by Ethereum and Monero.
+
+    This differs from ``hashlib.sha3_256`` only in the padding byte, which is
+    why the standard library cannot be used directly.
+    """
+    rate = 136
+    padded = bytearray(data)
+    padded.append(0x01)
+    padded.extend(b'\x00' * (-len(padded) % rate))
+    padded[-1] |= 0x80
+    state = [0] * 25
+    for offset in range(0, len(padded), rate):
+        block = padded[offset:offset + rate]
+        for i in range(rate // 8):
+            state[i] ^= int.from_bytes(block[i * 8:i * 8 + 8], 'little')
+        _keccak_f1600(state)
+    return b''.join(state[i].to_bytes(8, 'little') for i in range(4))
+
+
+def is_valid_eip55_address(address: str) -> bool:
+    """
+    Validate an Ethereum address checksum (EIP-55).
+
+    All-lowercase and all-uppercase addresses carry no checksum and are
+    accepted as-is; mixed-case addresses must match the Keccak-derived casing.
+    """
+    body = address[2:]
+    if body.islower() or body.isupper() or body.isdigit():
+        return True
+    digest = keccak256(body.lower().encode('ascii')).hex()
+    for char, nibble in zip(body, digest):
+        if char.isalpha() and char.isupper() != (int(nibble, 16) >= 8):
+            return False
+    return True
+
+
+# Monero base58 encodes 8-byte blocks as 11 characters; partial blocks use this table
+_XMR_ENCODED_BLOCK_SIZES = (0, 2, 3, 5, 6, 7, 9, 10, 11)
+
+
+def _monero_b58decode(value: str) -> Optional[bytes]:
+    out = bytearray()
+    for start in range(0, len(value), 11):
+        chunk = value[start:start + 11]
+        try:
+            size = _XMR_ENCODED_BLOCK_SIZES.index(len(chunk))
+        except ValueError:
+            return None
+        num = 0
+        for char in chunk:
+            digit = _B58_INDEX.get(char)
+            if digit is None:
+                return None
+            num = num * 58 + digit
+        if num >= 1 << (8 * size):
+            return None
+        out.extend(num.to_bytes(size, 'big'))
+    return bytes(out)
+
+
+def is_valid_monero_address(address: str) -> bool:
+    """Validate a standard/subaddress Monero address (Keccak-256 checksum)."""
+    raw = _monero_b58decode(address)
+    if raw is None or len(raw) != 69:
+        return False
+    return keccak256(raw[:-4])[:4] == raw[-4:]
+
+
+def is_valid_onion_v3(host: str) -> bool:
+    """Validate a v3 onion host: base32(pubkey | checksum | version=3)."""
+    import base64
+
+    label = host.lower()
+    if label.endswith('.onion'):
+        label = label[:-6]
+    if len(label) != 56:
+        return False
+    try:
+        raw = base64.b32decode(label.upper())
+    except Exception:
+        return False
+    pubkey, checksum, version = raw[:32], raw[32:34], raw[34]
+    if version != 3:
+        return False
+    expected = hashlib.sha3_256(b'.onion checksum' + pubkey + bytes([version])).digest()[:2]
+    return checksum == expected
+
+
+# --- Registry
+
+# Candidate scanner shared by the address extractors: long alphanumeric runs,
+# optionally followed by ".onion". Matching a handful of candidates against
+# each address pattern is far cheaper than trying every address pattern at
+# every offset of the page.
+TOKEN_TRIGGER = r'(?<![A-Za-z0-9])[A-Za-z0-9]{14,}(?:\.onion)?\b'
+
+
+@dataclass(frozen=True)
+class Extractor:
+    """
+    A single artifact type.
+
+    Without a ``trigger`` the ``pattern`` is scanned for directly; it must not
+    contain numbered capture groups, and a named group called ``value`` (if
+    any) is used as the artifact value. With a ``trigger`` the pattern is
+    instead full-matched against each candidate the trigger produces.
+    """
+    name: str
+    pattern: str
+    validator: Optional[Callable[[str], bool]] = None
+    normalizer: Optional[Callable[[str], str]] = None
+    trigger: Optional[str] = None
+
+
+class ExtractorRegistry:
+    """Collects extractors and compiles them into a single alternation."""
+
+    def __init__(self):
+        self._extractors: Dict[str, Extractor] = {}
+        self._compiled = None
+        self._lock = threading.Lock()
+
+    def register(self, extractor: Extractor) -> Extractor:
+        with self._lock:
+            self._extractors[extractor.name] = extractor
+            self._compiled = None
+        return extractor
+
+    def unregister(self, name: str) -> None:
+        with self._lock:
+            self._extractors.pop(name, None)
+            self._compiled = None
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._extractors)
+
+    def _compile(self):
+        compiled = self._compiled
+        if compiled is not None:
+            return compiled
+        with self._lock:
+            if self._compiled is None:
+                branches = []
+                # group name -> (value group, [(extractor, full-match regex or None)])
+                groups = {}
+                trigger_groups = {}
+                for extractor in self._extractors.values():
+                    if extractor.trigger:
+                        group = trigger_groups.get(extractor.trigger)
+                        if group is None:
+                            group = trigger_groups[extractor.trigger] = f'x{len(branches)}'
+                            branches.append(f'(?P<{group}>{extractor.trigger})')
+                            groups[group] = (group, [])
+                        groups[group][1].append((extractor, re.compile(extractor.pattern)))
+                    else:
+                        group = f'x{len(branches)}'
+                        value_group = f'{group}v'
+                        pattern = extractor.pattern.replace('(?P<value>', f'(?P<{value_group}>')
+                        branches.append(f'(?P<{group}>{pattern})')
+                        groups[group] = (value_group if value_group in pattern else group, [(extractor, None)])
+                self._compiled = (re.compile('|'.join(branches)), groups)
+            return self._compiled
+
+    def extract(self, text: str, validate: bool = True) -> Dict[str, List[str]]:
+        """
+        Scan ``text`` once and return ``{extractor name: unique values}``.
+
+        Values keep first-seen order. Validators run once per distinct value.
+        """
+        regex, groups = self._compile()
+        found: Dict[str, Dict[str, None]] = {name: {} for name in self._extractors}
+        for match in regex.finditer(text):
+            value_group, candidates = groups[match.lastgroup]
+            value = match.group(value_group)
+            for extractor, full_match in candidates:
+                if full_match is None or full_match.fullmatch(value):
+                    found[extractor.name][value] = None
+
+        results = {}
+        for extractor in self._extractors.values():
+            values = []
+            seen = set()
+            for value in found[extractor.name]:
+                if extractor.normalizer:
+                    value = extractor.normalizer(value)
+                if value in seen:
+                    continue
+                seen.add(value)
+                if validate and extractor.validator and not extractor.validator(value):
+                    continue
+                values.append(value)
+            results[extractor.name] = values
+        return results
+
+
+default_registry = ExtractorRegistry()
+
+
+def register_extractor(name: str, pattern: str, validator=None, normalizer=None, trigger=None) -> Extractor:
+    """Register an extractor on the default registry."""
+    return default_registry.register(Extractor(name, pattern, validator, normalizer, trigger))
+
+
+def extract_artifacts(text: str, validate: bool = True) -> Dict[str, List[str]]:
+    """Extract all registered artifact types from ``text`` in a single pass."""
+    return default_registry.extract(text, validate=validate)
+
+
+def _validate_btc(address: str) -> bool:
+    if address[:3].lower() == 'bc1':
+        return is_valid_bech32_address(address)
+    return is_valid_base58check_address(address)
+
+
+def _normalize_onion(host: str) -> str:
+    return host.lower()
+
+
+def _validate_onion(host: str) -> bool:
+    # v2 hosts have no checksum; keep them so they can be reported as legacy
+    return len(host) == 22 or is_valid_onion_v3(host)
+
+
+# The lookbehind anchors the scan at the start of a token, which keeps the
+# engine from re-trying every suffix of a long word.
+register_extractor(
+    'emails',
+    r'(?<![A-Za-z0-9._%+-])[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b',
+)
+register_extractor(
+    'btc_addresses',
+    r'[13][1-9A-HJ-NP-Za-km-z]{25,33}|bc1[ac-hj-np-z02-9]{11,71}|BC1[AC-HJ-NP-Z02-9]{11,71}',
+    validator=_validate_btc,
+    trigger=TOKEN_TRIGGER,
+)
+register_extractor(
+    'monero_addresses',
+    r'[48][0-9AB][1-9A-HJ-NP-Za-km-z]{93}',
+    validator=is_valid_monero_address,
+    trigger=TOKEN_TRIGGER,
+)
+register_extractor(
+    'ethereum_addresses',
+    r'0x[0-9a-fA-F]{40}',
+    validator=is_valid_eip55_address,
+    trigger=TOKEN_TRIGGER,
+)
+register_extractor(
+    'onion_addresses',
+    r'(?:[A-Za-z2-7]{56}|[A-Za-z2-7]{16})\.onion',
+    validator=_validate_onion,
+    normalizer=_normalize_onion,
+    trigger=TOKEN_TRIGGER,
+)
+# All <a href> values, relative ones included. The zero-width lookahead on the
+# value lets the scan continue into the URL and still see onion hosts or emails
+# embedded in it.
+register_extractor(
+    'links',
+    r'''(?i:<a\s[^>]*?\bhref\s*=\s*)(?=["']?(?P<value>[^"'\s<>]+))''',
+    normalizer=html.unescape,
+)
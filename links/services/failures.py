@@ -0,0 +1,138 @@
+"""
+Typed reasons for failed link checks.
+
+Tor reports onion service failures as SOCKS5 reply codes. With the
+``ExtendedErrors`` SocksPort flag (set on a Tor launched by tor_service)
+these are specific codes 0xF0-0xF7; otherwise they are mostly 0x04 (host
+unreachable). The SOCKS libraries surface the code as ``0xNN: message`` in
+the exception text. ``classify`` maps that, or the kind of timeout or
+connection error, to one reason, which is stored on the link
+(OnionLink.failure_reason) and counted per reason in the metrics.
+
+Each reason is one of:
+
+- permanent: the onion can't answer as addressed (no descriptor, invalid
+  address, needs client auth). The check fails at once and is not retried.
+- transient: Tor reached the service but the circuit failed (introduction,
+  rendezvous), or Tor itself hiccupped. These are retried once.
+- neither: timeouts and unclassified errors. A retry would cost another full
+  timeout, so they are not retried.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Optional, Union
+
+import requests
+
+# Tor's extended SOCKS5 replies (tor-spec: socks-extensions, "ExtendedErrors")
+TOR_SOCKS_ERRORS = {
+    0xF0: 'Onion service descriptor can not be found',
+    0xF1: 'Onion service descriptor is invalid',
+    0xF2: 'Onion service introduction failed',
+    0xF3: 'Onion service rendezvous failed',
+    0xF4: 'Onion service missing client authorization',
+    0xF5: 'Onion service wrong client authorization',
+    0xF6: 'Onion service invalid address',
+    0xF7: 'Onion service introduction timed out',
+}
+
+DESCRIPTOR_NOT_FOUND = 'descriptor_not_found'
+DESCRIPTOR_INVALID = 'descriptor_invalid'
+INTRO_FAILED = 'intro_failed'
+RENDEZVOUS_FAILED = 'rendezvous_failed'
+CLIENT_AUTH = 'client_auth'
+INVALID_ADDRESS = 'invalid_address'
+INTRO_TIMEOUT = 'intro_timeout'
+HOST_UNREACHABLE = 'host_unreachable'
+CONNECTION_REFUSED = 'connection_refused'
+TTL_EXPIRED = 'ttl_expired'
+PROXY_ERROR = 'proxy_error'
+TOR_UNAVAILABLE = 'tor_unavailable'
+CONNECT_TIMEOUT = 'connect_timeout'
+READ_TIMEOUT = 'read_timeout'
+CONNECTION_RESET = 'connection_reset'
+TLS_ERROR = 'tls_error'
+HTTP_STATUS = 'http_status'
+OTHER = 'other'
+
+FAILURE_REASON_CHOICES = [
+    (DESCRIPTOR_NOT_FOUND, 'Descriptor not found'),
+    (DESCRIPTOR_INVALID, 'Descriptor invalid'),
+    (INTRO_FAILED, 'Introduction failed'),
+    (RENDEZVOUS_FAILED, 'Rendezvous failed'),
+    (CLIENT_AUTH, 'Client authorization required'),
+    (INVALID_ADDRESS, 'Invalid address'),
+    (INTRO_TIMEOUT, 'Introduction timed out'),
+    (HOST_UNREACHABLE, 'Host unreachable'),
+    (CONNECTION_REFUSED, 'Connection refused by the service'),
+    (TTL_EXPIRED, 'Circuit timed out (TTL expired)'),
+    (PROXY_ERROR, 'Tor proxy failure'),
+    (TOR_UNAVAILABLE, 'Tor not reachable'),
+    (CONNECT_TIMEOUT, 'Connect timeout'),
+    (READ_TIMEOUT, 'Read timeout'),
+    (CONNECTION_RESET, 'Connection reset'),
+    (TLS_ERROR, 'TLS error'),
+    (HTTP_STATUS, 'Non-200 HTTP status'),
+    (OTHER, 'Other'),
+]
+
+PERMANENT = frozenset({DESCRIPTOR_NOT_FOUND, DESCRIPTOR_INVALID, CLIENT_AUTH, INVALID_ADDRESS, HTTP_STATUS})
+TRANSIENT = frozenset({INTRO_FAILED, RENDEZVOUS_FAILED, TTL_EXPIRED, PROXY_ERROR, CONNECTION_RESET})
+
+_SOCKS_REASONS = {
+    0x01: PROXY_ERROR,
+    0x02: PROXY_ERROR,
+    0x03: HOST_UNREACHABLE,
+    0x04: HOST_UNREACHABLE,
+    0x05: CONNECTION_REFUSED,
+    0x06: TTL_EXPIRED,
+    0x07: PROXY_ERROR,
+    0x08: INVALID_ADDRESS,
+    0xF0: DESCRIPTOR_NOT_FOUND,
+    0xF1: DESCRIPTOR_INVALID,
+    0xF2: INTRO_FAILED,
+    0xF3: RENDEZVOUS_FAILED,
+    0xF4: CLIENT_AUTH,
+    0xF5: CLIENT_AUTH,
+    0xF6: INVALID_ADDRESS,
+    0xF7: INTRO_TIMEOUT,
+}
+
+_SOCKS_CODE = re.compile(r'\b0x([0-9a-fA-F]{2}): ')
+
+
+def socks_code(error: Union[BaseException, str]) -> Optional[int]:
+    """SOCKS5 reply code in an error raised by PySocks or the async client"""
+    match = _SOCKS_CODE.search(str(error))
+    return int(match.group(1), 16) if match else None
+
+
+def classify(error: Union[BaseException, str]) -> str:
+    """Failure reason for an exception (or its text) raised while fetching an onion"""
+    code = socks_code(error)
+    if code is not None:
+        return _SOCKS_REASONS.get(code, PROXY_ERROR)
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return CONNECT_TIMEOUT
+    if isinstance(error, (requests.exceptions.ReadTimeout, TimeoutError)):
+        return READ_TIMEOUT
+    if isinstance(error, requests.exceptions.SSLError):
+        return TLS_ERROR
+    text = str(error)
+    if 'Error connecting to SOCKS' in text:
+        return TOR_UNAVAILABLE
+    if 'timed out' in text.lower():
+        return READ_TIMEOUT
+    if any(marker in text for marker in ('Connection reset', 'Connection aborted', 'RemoteDisconnected')):
+        return CONNECTION_RESET
+    return OTHER
+
+
+def is_permanent(reason: Optional[str]) -> bool:
+    return reason in PERMANENT
+
+
+def is_retryable(reason: Optional[str]) -> bool:
+    return reason in TRANSIENT
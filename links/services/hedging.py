@@ -0,0 +1,213 @@
+"""
+Hedged requests against Tor's heavy latency tail.
+
+A request that lands on a bad circuit can take 25 seconds where a fresh
+circuit answers in 2. When a request has no response after the host's p90
+time to first byte (Deadlines.hedge_after, see services.timeouts), a second
+attempt is started:
+
+- over Tor, on another circuit: Tor isolates streams by SOCKS credentials
+  (IsolateSOCKSAuth, on by default), so the hedge connects with one of
+  HEDGE_CIRCUITS username/password pairs
+- in cloud mode, through the next Tor2Web gateway
+
+The first successful response wins and the other attempt is cancelled (its
+socket is closed, or for the sync client, it stops reading as soon as it
+notices). A failure only wins once both attempts have failed.
+
+Hedges are bounded by a process-wide budget: each request earns
+HEDGE_BUDGET_RATIO of a hedge, so at most that share of requests (plus a
+small burst) is ever sent twice.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from django.conf import settings
+
+from links.models import LinkStats
+from .metrics import HEDGES
+from .probe_timing import ProbeTimer, current_timer
+from .timeouts import TimeoutModel
+
+# Threads running hedged attempts (both the primary and the hedge run on them)
+MAX_THREADS = 256
+# Saved-up hedges, so a quiet process can still hedge its next few requests
+BUDGET_BURST = 10
+# Hedge delays looked up for the sandbox are reused this long per host
+HOST_DELAY_TTL = 60.0
+
+
+def hedging_enabled() -> bool:
+    return getattr(settings, 'HEDGING_ENABLED', True)
+
+
+class HedgeBudget:
+    """Token budget: each request earns ``ratio`` of a hedge, a hedge costs one"""
+
+    def __init__(self, ratio: float, burst: float = BUDGET_BURST):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = burst
+        self._lock = threading.Lock()
+
+    def record_request(self) -> None:
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+_budget: Optional[HedgeBudget] = None
+_executor: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+_circuits = itertools.count()
+
+
+def get_hedge_budget() -> HedgeBudget:
+    global _budget
+    if _budget is None:
+        with _lock:
+            if _budget is None:
+                _budget = HedgeBudget(getattr(settings, 'HEDGE_BUDGET_RATIO', 0.1))
+    return _budget
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=MAX_THREADS, thread_name_prefix='hedged-fetch')
+    return _executor
+
+
+def isolation_credentials() -> Tuple[str, str]:
+    """SOCKS username/password that put a hedge on a circuit of its own"""
+    slot = next(_circuits) % max(1, getattr(settings, 'HEDGE_CIRCUITS', 8))
+    return f'hedge-{slot}', 'x'
+
+
+def isolated_proxies(proxies: Dict[str, str]) -> Dict[str, str]:
+    """``proxies`` (socks5h://host:port) with isolation credentials added"""
+    user, password = isolation_credentials()
+    isolated = {}
+    for scheme, proxy in proxies.items():
+        parts = urlparse(proxy)
+        isolated[scheme] = f'{parts.scheme}://{user}:{password}@{parts.hostname}:{parts.port}'
+    return isolated
+
+
+def _timed(attempt: Callable[[threading.Event], Any], cancelled: threading.Event):
+    with ProbeTimer() as timer:
+        result = attempt(cancelled)
+    return result, timer
+
+
+def _credit(caller: Optional[ProbeTimer], timer: ProbeTimer) -> None:
+    if caller is not None:
+        caller.connect += timer.connect
+
+
+def run_hedged(primary: Callable[[threading.Event], Any], hedge: Callable[[threading.Event], Any],
+               delay: float, succeeded: Callable[[Any], bool]) -> Any:
+    """
+    Run ``primary``; if it hasn't returned after ``delay`` seconds and the
+    budget allows, run ``hedge`` too. Returns the first result that
+    ``succeeded``, or the last one if neither did. Each attempt gets an
+    Event that is set once its result is no longer wanted. The winner's
+    connect time is added to the caller's ProbeTimer.
+    """
+    budget = get_hedge_budget()
+    budget.record_request()
+    caller = current_timer()
+    executor = _get_executor()
+    first_cancelled = threading.Event()
+    first = executor.submit(_timed, primary, first_cancelled)
+    done, _ = wait([first], timeout=delay)
+    if not done and not budget.try_spend():
+        HEDGES.labels(outcome='denied').inc()
+        done = {first}
+    if done:
+        result, timer = first.result()
+        _credit(caller, timer)
+        return result
+
+    HEDGES.labels(outcome='launched').inc()
+    second_cancelled = threading.Event()
+    second = executor.submit(_timed, hedge, second_cancelled)
+    pending = {first: first_cancelled, second: second_cancelled}
+    while True:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in sorted(done, key=lambda f: not succeeded(f.result()[0])):
+            pending.pop(future)
+            result, timer = future.result()
+            if succeeded(result) or not pending:
+                for cancelled in pending.values():
+                    cancelled.set()
+                HEDGES.labels(outcome='hedge_won' if future is second else 'primary_won').inc()
+                _credit(caller, timer)
+                return result
+
+
+async def run_hedged_async(primary: Callable[[], Awaitable[Any]], hedge: Callable[[], Awaitable[Any]],
+                           delay: float, discard: Callable[[Any], Awaitable[None]]) -> Any:
+    """
+    Async run_hedged: awaitables that raise on failure. The losing attempt
+    is cancelled, or passed to ``discard`` if it had already succeeded.
+    """
+    budget = get_hedge_budget()
+    budget.record_request()
+    first = asyncio.ensure_future(primary())
+    done, _ = await asyncio.wait({first}, timeout=delay)
+    if not done and not budget.try_spend():
+        HEDGES.labels(outcome='denied').inc()
+        done = {first}
+    if done:
+        return await first
+
+    HEDGES.labels(outcome='launched').inc()
+    second = asyncio.ensure_future(hedge())
+    pending = {first, second}
+    while True:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        succeeded = [task for task in done if task.exception() is None]
+        if succeeded or not pending:
+            winner = succeeded[0] if succeeded else next(iter(done))
+            for task in pending:
+                task.cancel()
+            for task in succeeded[1:]:
+                await discard(task.result())
+            HEDGES.labels(outcome='hedge_won' if winner is second else 'primary_won').inc()
+            return winner.result()
+
+
+_host_delays: Dict[str, Tuple[float, Optional[float]]] = {}
+
+
+def hedge_delay_for_url(url: str, timeout: float) -> Optional[float]:
+    """Hedge delay for requests to ``url``'s host from its check history (sandbox requests)"""
+    host = (urlparse(url).hostname or '').lower()
+    cached = _host_delays.get(host)
+    if cached is not None and time.monotonic() - cached[0] < HOST_DELAY_TTL:
+        return cached[1]
+    stats = LinkStats.objects.filter(
+        onion_link__url__in=[f'http://{host}/', f'https://{host}/'],
+    ).order_by('-check_count').first()
+    delay = TimeoutModel(timeout).for_stats(stats).hedge_after
+    if len(_host_delays) > 10000:
+        _host_delays.clear()
+    _host_delays[host] = (time.monotonic(), delay)
+    return delay
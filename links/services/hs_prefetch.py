@@ -0,0 +1,212 @@
+"""
+Onion service descriptor prefetch for bulk checks.
+
+Most of a first contact with an onion is the descriptor lookup on the
+HSDirs, followed by rendezvous setup. When the checker does the lookup
+inside a SOCKS connect, a worker slot waits on it, and for long-gone
+onions it often waits the full timeout.
+
+DescriptorPrefetcher asks Tor for the descriptors of a whole batch up front
+with ``HSFETCH`` on the control port, a bounded number at a time, in the
+order the checker will dispatch them. It watches the ``HS_DESC`` events:
+
+- RECEIVED: the descriptor is now in Tor's cache and the check skips the
+  lookup (FOUND)
+- FAILED with NOT_FOUND: each HSFETCH asks one HSDir. The fetch is repeated
+  (Tor picks a different HSDir each time) until NOT_FOUND_DIRS distinct
+  HSDirs have no descriptor, or Tor has no HSDir left to ask. The service is
+  then ABSENT, and the checker marks it dead without spending a worker slot.
+- any other failure, or no answer within the timeout: UNKNOWN, checked
+  normally
+
+Needs ``stem`` and a Tor control port (see tor_service); otherwise start()
+returns False and checks run as before.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, Optional, Set
+
+from django.conf import settings
+
+from .metrics import HS_PREFETCH
+
+try:
+    from stem.control import EventType
+except ImportError:  # stem is optional
+    EventType = None
+
+logger = logging.getLogger(__name__)
+
+# Host states
+QUEUED = 'queued'    # not fetched yet
+PENDING = 'pending'  # HSFETCH in flight
+FOUND = 'found'
+ABSENT = 'absent'
+UNKNOWN = 'unknown'  # failed for another reason, timed out, or left to the checker
+
+ABSENT_REASON = 'Onion service descriptor not found on the HSDirs'
+NOT_FOUND_DIRS = 3
+
+
+def service_address(host: str) -> str:
+    """The v3 address HSFETCH and HS_DESC use: the label before .onion, without subdomains"""
+    host = host.lower().rstrip('.')
+    if host.endswith('.onion'):
+        host = host[:-len('.onion')]
+    return host.rsplit('.', 1)[-1]
+
+
+class DescriptorPrefetcher:
+    """Fetch descriptors for ``hosts`` (in that order) in the background; see module docstring"""
+
+    def __init__(self, hosts: Iterable[str], concurrency: Optional[int] = None, timeout: Optional[float] = None):
+        self.concurrency = concurrency or getattr(settings, 'HS_PREFETCH_CONCURRENCY', 16)
+        self.timeout = timeout or getattr(settings, 'HS_PREFETCH_TIMEOUT', 20.0)
+        self._state: Dict[str, str] = {}
+        self._queue: deque = deque()
+        for host in hosts:
+            address = service_address(host)
+            if address not in self._state:
+                self._state[address] = QUEUED
+                self._queue.append(address)
+        self._deadlines: Dict[str, float] = {}
+        self._not_found: Dict[str, Set[str]] = {}
+        self._retry: deque = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._controller = None
+        self._thread: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return len(self._state)
+
+    def start(self) -> bool:
+        """Open the control port and start fetching; False if Tor can't be asked"""
+        if EventType is None or not self._queue:
+            return False
+        from .tor_service import get_tor_service
+        controller = get_tor_service().open_controller()
+        if controller is None:
+            return False
+        try:
+            controller.add_event_listener(self._on_event, EventType.HS_DESC)
+        except Exception as e:
+            logger.info(f"Descriptor prefetch unavailable: {e}")
+            controller.close()
+            return False
+        self._controller = controller
+        self._thread = threading.Thread(target=self._run, name='hs-prefetch', daemon=True)
+        self._thread.start()
+        return True
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if self._controller is not None:
+            try:
+                self._controller.remove_event_listener(self._on_event)
+            except Exception:
+                pass
+            self._controller.close()
+            self._controller = None
+
+    # --- Checker side
+
+    def state(self, host: str) -> Optional[str]:
+        """State of ``host``'s descriptor, or None if it isn't part of the batch"""
+        return self._state.get(service_address(host))
+
+    def claim(self, host: str) -> None:
+        """The checker is about to connect to ``host`` itself; don't fetch it as well"""
+        address = service_address(host)
+        with self._cond:
+            if self._state.get(address) == QUEUED:
+                self._resolve(address, UNKNOWN, 'skipped')
+
+    def wait(self, timeout: float) -> None:
+        """Block until some host changes state, or ``timeout``"""
+        with self._cond:
+            self._cond.wait(timeout)
+
+    # --- Fetching
+
+    def _resolve(self, address: str, state: str, result: Optional[str] = None) -> None:
+        # Caller holds self._cond
+        self._state[address] = state
+        self._deadlines.pop(address, None)
+        HS_PREFETCH.labels(result=result or state).inc()
+        self._cond.notify_all()
+
+    def _next_fetch(self) -> Optional[str]:
+        """Wait for a free slot and a host to fetch (or a retry); None once done or closed"""
+        with self._cond:
+            while True:
+                if self._closed:
+                    return None
+                now = time.monotonic()
+                for address, deadline in list(self._deadlines.items()):
+                    if now >= deadline:
+                        self._resolve(address, UNKNOWN, 'timeout')
+                if self._retry:
+                    return self._retry.popleft()
+                if len(self._deadlines) < self.concurrency:
+                    while self._queue:
+                        address = self._queue.popleft()
+                        if self._state[address] == QUEUED:
+                            self._state[address] = PENDING
+                            self._deadlines[address] = now + self.timeout
+                            return address
+                    if not self._deadlines:
+                        return None
+                wake = min(self._deadlines.values(), default=now + 1) - now
+                self._cond.wait(max(0.05, wake))
+
+    def _run(self) -> None:
+        while True:
+            address = self._next_fetch()
+            if address is None:
+                return
+            try:
+                response = self._controller.msg(f'HSFETCH {address}')
+                ok = response.is_ok()
+            except Exception as e:
+                logger.debug(f"HSFETCH {address} failed: {e}")
+                ok = False
+            if not ok:
+                with self._cond:
+                    if self._state.get(address) == PENDING:
+                        self._resolve(address, UNKNOWN, 'error')
+
+    def _on_event(self, event) -> None:
+        """HS_DESC listener (runs on stem's event thread; never calls the controller)"""
+        address = event.address
+        action = str(event.action)
+        with self._cond:
+            if self._state.get(address) != PENDING:
+                return
+            if action == 'RECEIVED':
+                self._resolve(address, FOUND)
+            elif action == 'FAILED':
+                reason = str(event.reason or '')
+                if reason == 'NOT_FOUND':
+                    dirs = self._not_found.setdefault(address, set())
+                    dirs.add(event.directory_fingerprint or event.directory or '')
+                    if len(dirs) >= NOT_FOUND_DIRS:
+                        self._resolve(address, ABSENT)
+                    else:
+                        # Ask again; Tor skips HSDirs it queried recently
+                        self._retry.append(address)
+                        self._cond.notify_all()
+                elif reason == 'QUERY_NO_HSDIR' and self._not_found.get(address):
+                    # Every HSDir Tor would ask has already said NOT_FOUND
+                    self._resolve(address, ABSENT)
+                else:
+                    self._resolve(address, UNKNOWN, 'failed')
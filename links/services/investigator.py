@@ -1,12 +1,43 @@
-import requests
-from bs4 import BeautifulSoup
-import re
+import hashlib
+import math
+import threading
 import time
-from typing import Dict, List, Set
+import requests
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List
 import logging
+from django.conf import settings
+from django.utils import timezone
+from links.models import Investigation
+from .extractors import extract_artifacts
+from .metrics import INVESTIGATION_STAGE_SECONDS, INVESTIGATIONS
+from .onion_url import canonicalize_onion_url
+from .politeness import HostRateLimiter, host_of
+from .tor_service import configured_socks_port
+from .snapshots import decode_body, get_snapshot_store
 
 logger = logging.getLogger(__name__)
 
+# Artifact types that have dedicated columns on Investigation; everything else
+# the extractor registry produces is stored under Investigation.artifacts.
+DEDICATED_ARTIFACTS = ('emails', 'btc_addresses', 'monero_addresses', 'ethereum_addresses')
+MAX_EXTERNAL_LINKS = 50
+
+_probe_executor = None
+_probe_executor_lock = threading.Lock()
+
+
+def get_probe_executor() -> ThreadPoolExecutor:
+    """Get the process-wide pool for /server-status probes"""
+    global _probe_executor
+    if _probe_executor is None:
+        with _probe_executor_lock:
+            if _probe_executor is None:
+                workers = getattr(settings, 'INVESTIGATION_PROBE_WORKERS', 4)
+                _probe_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='server-status-probe')
+    return _probe_executor
+
 
 class OnionInvestigator:
     """
@@ -14,68 +45,136 @@ class OnionInvestigator:
     Based on the HIFR tool functionality.
     """
 
-    def __init__(self, timeout=30):
+    def __init__(self, timeout=30, validate_checksums=True):
         self.timeout = timeout
+        self.validate_checksums = validate_checksums
         self.session = requests.Session()
         # Configure SOCKS5 proxy for Tor
+        port = configured_socks_port()
         self.session.proxies = {
-            'http': 'socks5h://127.0.0.1:9150',
-            'https': 'socks5h://127.0.0.1:9150',
+            'http': f'socks5h://127.0.0.1:{port}',
+            'https': f'socks5h://127.0.0.1:{port}',
         }
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         })
 
-    def investigate(self, url: str) -> Dict:
+    def investigate(self, url: str, stage_callback=None, previous: Investigation = None) -> Dict:
         """
         Investigate an onion URL and extract all possible information.
 
+        When ``previous`` is given the fetch is conditional (ETag /
+        Last-Modified), and if the server answers 304 or the body hashes the
+        same as last time, extraction is skipped and the result is marked
+        ``unchanged``.
+
         Args:
             url: The onion URL to investigate
+            stage_callback: Optional callback function(stage) called as each step starts
+            previous: Optional earlier Investigation of the same URL
 
         Returns:
             dict: Dictionary containing all extracted information
         """
         if not url.startswith('http://') and not url.startswith('https://'):
             url = 'http://' + url
+        onion = canonicalize_onion_url(url)
 
         result = {
             'url': url,
             'success': False,
+            'unchanged': False,
             'emails': [],
             'btc_addresses': [],
             'monero_addresses': [],
             'ethereum_addresses': [],
             'external_links': [],
+            'artifacts': {},
             'has_server_status': False,
             'server_status_content': None,
+            'content_hash': '',
+            'etag': '',
+            'last_modified': '',
             'error': None
         }
 
+        current_stage = {'key': None, 'started': 0.0}
+
+        def stage(name, key=None):
+            # Each stage's duration is recorded when the next one starts
+            now = time.perf_counter()
+            if current_stage['key']:
+                INVESTIGATION_STAGE_SECONDS.labels(stage=current_stage['key']).observe(now - current_stage['started'])
+            current_stage['key'], current_stage['started'] = key, now
+            if stage_callback and name:
+                stage_callback(name)
+
+        if not onion.is_valid:
+            # Unreachable address: fail before spending a Tor timeout on it
+            result['error'] = onion.message
+            return result
+
+        headers = {}
+        if previous is not None:
+            if previous.etag:
+                headers['If-None-Match'] = previous.etag
+            if previous.last_modified:
+                headers['If-Modified-Since'] = previous.last_modified
+
+        # Probe /server-status in parallel with the main page fetch. On
+        # re-investigations the probe waits until we know the page changed.
+        probe_pool = get_probe_executor()
+        server_status_future = None
+        if previous is None:
+            server_status_future = probe_pool.submit(self._check_server_status, url)
         try:
-            # Fetch the main page
-            response = self.session.get(url, timeout=self.timeout)
-            response.raise_for_status()
-            source_code = response.text
-
-            # Extract emails
-            result['emails'] = self._extract_emails(source_code)
-
-            # Extract cryptocurrency addresses
-            result['btc_addresses'] = self._extract_btc_addresses(source_code)
-            result['monero_addresses'] = self._extract_monero_addresses(source_code)
-            result['ethereum_addresses'] = self._extract_ethereum_addresses(source_code)
-
-            # Extract external links
-            result['external_links'] = self._extract_links(source_code, url)
-
-            # Check for server-status
-            server_status = self._check_server_status(url)
-            result['has_server_status'] = server_status['found']
-            result['server_status_content'] = server_status.get('content')
+            # Fetch the main page, unless another service fetched it moments ago
+            store = get_snapshot_store()
+            snapshot = store.get_fresh(url)
+            body = store.read(snapshot) if snapshot is not None else None
+            if body is not None:
+                stage('Reusing recent snapshot', 'snapshot')
+                status_code = snapshot.status_code
+                text = decode_body(body, snapshot.content_type)
+                result['etag'] = snapshot.etag
+                result['last_modified'] = snapshot.last_modified
+            else:
+                stage('Fetching page through Tor', 'fetch')
+                response = self.session.get(url, timeout=self.timeout, headers=headers)
+                response.raise_for_status()
+                status_code = response.status_code
+                body = response.content
+                text = response.text
+                # Sized to the Investigation columns, as SnapshotStore.save does
+                result['etag'] = response.headers.get('ETag', '')[:255]
+                result['last_modified'] = response.headers.get('Last-Modified', '')[:64]
+                if status_code != 304:
+                    self._store_snapshot(url, response)
+
+            if status_code == 304:
+                result['unchanged'] = True
+            else:
+                result['content_hash'] = hashlib.sha256(body).hexdigest()
+                result['unchanged'] = previous is not None and result['content_hash'] == previous.content_hash
+
+            if result['unchanged']:
+                stage('Unchanged since last investigation')
+                logger.info(f"{url} unchanged since last investigation")
+            else:
+                if server_status_future is None:
+                    server_status_future = probe_pool.submit(self._check_server_status, url)
+
+                # Extract emails, crypto addresses, onion hosts and links in one scan
+                stage('Extracting artifacts', 'extract')
+                self._apply_artifacts(result, text)
+
+                stage('Waiting for server-status probe', 'server_status')
+                server_status = server_status_future.result()
+                result['has_server_status'] = server_status['found']
+                result['server_status_content'] = server_status.get('content')
+                logger.info(f"Successfully investigated {url}")
 
             result['success'] = True
-            logger.info(f"Successfully investigated {url}")
 
         except requests.exceptions.Timeout:
             result['error'] = 'Request timed out'
@@ -86,57 +185,43 @@ class OnionInvestigator:
         except Exception as e:
             result['error'] = str(e)
             logger.error(f"Error investigating {url}: {str(e)}")
-
+        finally:
+            stage(None)
+            # Drop a probe whose result is no longer needed; one already running is
+            # bounded by the request timeout and the shared pool's size
+            if server_status_future is not None:
+                server_status_future.cancel()
+
+        if not result['success']:
+            INVESTIGATIONS.labels(outcome='failed').inc()
+        else:
+            INVESTIGATIONS.labels(outcome='unchanged' if result['unchanged'] else 'changed').inc()
         return result
 
-    def _extract_emails(self, source_code: str) -> List[str]:
-        """Extract email addresses from source code"""
-        email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b'
-        emails = re.findall(email_pattern, source_code)
-        # Return unique emails
-        return list(set(emails))
-
-    def _extract_btc_addresses(self, source_code: str) -> List[str]:
-        """Extract Bitcoin addresses from source code"""
-        # Bitcoin address pattern (P2PKH and P2SH)
-        btc_pattern = r'\b[13][a-km-zA-HJ-NP-Z0-9]{26,33}\b'
-        addresses = re.findall(btc_pattern, source_code)
-        # Return unique addresses
-        return list(set(addresses))
-
-    def _extract_monero_addresses(self, source_code: str) -> List[str]:
-        """Extract Monero (XMR) addresses from source code"""
-        # Monero address pattern (starts with 4)
-        monero_pattern = r'\b(?:4[0-9AB][1-9A-HJ-NP-Za-km-z]{93})\b'
-        addresses = re.findall(monero_pattern, source_code)
-        # Return unique addresses
-        return list(set(addresses))
-
-    def _extract_ethereum_addresses(self, source_code: str) -> List[str]:
-        """Extract Ethereum addresses from source code"""
-        # Ethereum address pattern (0x followed by 40 hex chars)
-        eth_pattern = r'\b(?:0x)[0-9a-fA-F]{40}\b'
-        addresses = re.findall(eth_pattern, source_code)
-        # Return unique addresses
-        return list(set(addresses))
-
-    def _extract_links(self, source_code: str, base_url: str) -> List[str]:
-        """Extract all external links from the page"""
+    def _store_snapshot(self, url: str, response) -> None:
+        """Keep the fetched body so the checker and sandbox can reuse it"""
         try:
-            soup = BeautifulSoup(source_code, 'html.parser')
-            links = []
-
-            for link in soup.find_all('a', href=True):
-                href = link.get('href', '')
-                # Only include external links (http/https)
-                if href.startswith('http://') or href.startswith('https://'):
-                    links.append(href)
-
-            # Return unique links (limit to 50 to avoid huge lists)
-            return list(set(links))[:50]
+            get_snapshot_store().save(
+                url,
+                response.content,
+                response.status_code,
+                'investigator',
+                content_type=response.headers.get('Content-Type', ''),
+                etag=response.headers.get('ETag', ''),
+                last_modified=response.headers.get('Last-Modified', ''),
+            )
         except Exception as e:
-            logger.error(f"Error extracting links: {str(e)}")
-            return []
+            logger.warning(f"Could not store snapshot of {url}: {e}")
+
+    def _apply_artifacts(self, result: Dict, source_code: str) -> None:
+        """Run every registered extractor over the page in one pass"""
+        artifacts = extract_artifacts(source_code, validate=self.validate_checksums)
+        for name in DEDICATED_ARTIFACTS:
+            result[name] = artifacts.pop(name, [])
+        # Only keep absolute links (limit to 50 to avoid huge lists)
+        links = [link for link in artifacts.pop('links', []) if link.startswith(('http://', 'https://'))]
+        result['external_links'] = links[:MAX_EXTERNAL_LINKS]
+        result['artifacts'] = artifacts
 
     def _check_server_status(self, url: str) -> Dict:
         """Check if server-status page exists"""
@@ -155,30 +240,123 @@ class OnionInvestigator:
 
         return {'found': False}
 
-    def bulk_investigate(self, urls: List[str], progress_callback=None) -> List[Dict]:
+    def bulk_investigate(self, urls: List[str], progress_callback=None, max_workers=5,
+                         per_host_concurrency=1, per_host_delay=2.0, previous: Dict = None) -> List[Dict]:
         """
-        Investigate multiple URLs.
+        Investigate multiple URLs concurrently.
+
+        Different onion hosts are investigated in parallel (up to ``max_workers``
+        at once), while requests to the same host are limited to
+        ``per_host_concurrency`` at a time and started at least
+        ``per_host_delay`` seconds apart.
 
         Args:
             urls: List of URLs to investigate
-            progress_callback: Optional callback function(result) called after each URL
+            progress_callback: Optional callback function(result) called as each URL finishes
+            max_workers: Global limit on simultaneous investigations
+            per_host_concurrency: Simultaneous investigations allowed per onion host
+            per_host_delay: Minimum seconds between investigations of the same host
+            previous: Optional mapping of URL to its earlier Investigation, for change detection
 
         Returns:
-            list: List of investigation results
+            list: Investigation results in the same order as ``urls``
         """
-        results = []
-
+        limiter = HostRateLimiter(max_per_host=per_host_concurrency, min_interval=per_host_delay)
+        results: List[Dict] = [None] * len(urls)
+        previous = previous or {}
+        max_workers = max(1, max_workers)
+
+        # Hosts are scheduled here rather than inside the pool, so a worker is never
+        # parked on a busy host while URLs for idle hosts wait behind it
+        pending: Dict[str, deque] = {}
         for i, url in enumerate(urls):
-            logger.info(f"Investigating {i+1}/{len(urls)}: {url}")
-            result = self.investigate(url)
-            results.append(result)
+            pending.setdefault(host_of(url), deque()).append(i)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            future_to_index = {}
+            done_count = 0
+            while pending or future_to_index:
+                retry_in = math.inf
+                submitted = True
+                while submitted and len(future_to_index) < max_workers:
+                    submitted = False
+                    for host in list(pending):
+                        if len(future_to_index) >= max_workers:
+                            break
+                        wait_for = limiter.acquire_nowait(host)
+                        if wait_for:
+                            retry_in = min(retry_in, wait_for)
+                            continue
+                        i = pending[host].popleft()
+                        if not pending[host]:
+                            del pending[host]
+                        future = executor.submit(self.investigate, urls[i], previous=previous.get(urls[i]))
+                        future_to_index[future] = (i, host)
+                        submitted = True
+
+                if not future_to_index:
+                    # Every remaining host is waiting out its start interval
+                    time.sleep(retry_in)
+                    continue
+                done, _ = wait(future_to_index, timeout=None if retry_in == math.inf else retry_in,
+                               return_when=FIRST_COMPLETED)
+                for future in done:
+                    i, host = future_to_index.pop(future)
+                    limiter.release(host)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = {'url': urls[i], 'success': False, 'error': str(e)}
+                    results[i] = result
+                    done_count += 1
+                    logger.info(f"Investigated {done_count}/{len(urls)}: {result['url']}")
+
+                    if progress_callback:
+                        progress_callback(result)
 
-            if progress_callback:
-                progress_callback(result)
+        return results
 
-            # Be polite - wait between requests
-            if i < len(urls) - 1:
-                time.sleep(2)
 
-        return results
+def save_investigation(onion_link, result: Dict, investigated_url: str = None) -> Investigation:
+    """
+    Persist a successful investigate() result for ``onion_link``.
 
+    Unchanged results only bump ``verified_at`` on the existing row.
+    """
+    investigated_url = investigated_url or result['url']
+    now = timezone.now()
+    if result.get('unchanged'):
+        investigation = Investigation.objects.filter(onion_link=onion_link, investigated_url=investigated_url).first()
+        if investigation is not None:
+            fields = {'verified_at': now}
+            # Keep validators fresh in case the server only now started sending them
+            if result['etag']:
+                fields['etag'] = result['etag']
+            if result['last_modified']:
+                fields['last_modified'] = result['last_modified']
+            Investigation.objects.filter(pk=investigation.pk).update(**fields)
+            for name, value in fields.items():
+                setattr(investigation, name, value)
+            return investigation
+        # The earlier row is gone, so force a full extraction next time
+        result = dict(result, content_hash='', etag='', last_modified='')
+
+    investigation, _ = Investigation.objects.update_or_create(
+        onion_link=onion_link,
+        investigated_url=investigated_url,
+        defaults={
+            'emails': result['emails'],
+            'btc_addresses': result['btc_addresses'],
+            'monero_addresses': result['monero_addresses'],
+            'ethereum_addresses': result['ethereum_addresses'],
+            'artifacts': result['artifacts'],
+            'external_links': result['external_links'],
+            'has_server_status': result['has_server_status'],
+            'server_status_content': result['server_status_content'],
+            'content_hash': result['content_hash'],
+            'etag': result['etag'],
+            'last_modified': result['last_modified'],
+            'verified_at': now,
+        }
+    )
+    return investigation
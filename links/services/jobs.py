@@ -0,0 +1,122 @@
+"""
+Background pool for investigations.
+
+Investigations take up to two Tor round trips, so running them inside the POST
+handler ties up a web worker for minutes. Jobs are recorded as
+InvestigationJob rows and executed on a dedicated, bounded thread pool that is
+separate from the link checker's executors; the job page polls the row for
+progress.
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections
+from django.utils import timezone
+
+from links.models import Investigation, InvestigationJob
+from .investigator import OnionInvestigator, save_investigation
+from .profiling import profiled_job
+
+logger = logging.getLogger(__name__)
+
+# Running jobs whose worker died (deploy, crash) stay 'running' forever unless expired
+STALE_JOB_AFTER = timedelta(minutes=15)
+# A restart drops the in-memory pool queue; jobs still queued this long were lost with it
+STALE_QUEUED_JOB_AFTER = timedelta(hours=1)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_job_executor() -> ThreadPoolExecutor:
+    """Get the process-wide investigation job pool"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = getattr(settings, 'INVESTIGATION_JOB_WORKERS', 2)
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='investigation-job')
+    return _executor
+
+
+def submit_investigation(onion_link, url: str, profile: bool = False) -> InvestigationJob:
+    """
+    Queue an investigation of ``url`` and return its job.
+
+    An investigation already queued or running for the same URL is reused
+    rather than fetched twice. ``profile`` forces a profile of the job run.
+    """
+    expire_stale_jobs()
+    try:
+        job = InvestigationJob.objects.create(onion_link=onion_link, url=url, stage='Waiting for a free worker')
+    except IntegrityError:
+        # An active job for this URL exists (possibly inserted concurrently)
+        job = InvestigationJob.objects.filter(url=url, status__in=['queued', 'running']).first()
+        if job is None:
+            # It finished between our insert and this read
+            return submit_investigation(onion_link, url, profile=profile)
+        if job.status == 'running':
+            return job
+    # A queued job left behind by a restarted process is picked up again here; a job
+    # already in this pool's queue is claimed by only one of its runs
+    get_job_executor().submit(run_investigation_job, job.id, profile=profile)
+    return job
+
+
+@profiled_job('investigation_job')
+def run_investigation_job(job_id: int) -> None:
+    try:
+        # Claim atomically: a job that is already running, finished or expired is skipped
+        claimed = InvestigationJob.objects.filter(id=job_id, status='queued').update(
+            status='running', started_at=timezone.now()
+        )
+        if not claimed:
+            return
+        job = InvestigationJob.objects.select_related('onion_link').get(id=job_id)
+
+        def stage_callback(stage):
+            InvestigationJob.objects.filter(id=job_id).update(stage=stage)
+
+        previous = Investigation.objects.filter(onion_link=job.onion_link, investigated_url=job.url).first()
+        investigator = OnionInvestigator(timeout=60)
+        result = investigator.investigate(job.url, stage_callback=stage_callback, previous=previous)
+
+        if result['success']:
+            stage_callback('Saving results')
+            job.investigation = save_investigation(job.onion_link, result, investigated_url=job.url)
+            job.status = 'done'
+            if result['unchanged']:
+                job.stage = 'Page unchanged since the last investigation.'
+            else:
+                job.stage = f'Investigation complete! Found {job.investigation.total_findings} items.'
+        else:
+            job.status = 'failed'
+            job.stage = 'Investigation failed'
+            job.error = result['error']
+        job.finished_at = timezone.now()
+        job.save()
+    except Exception as e:
+        logger.error(f"Investigation job {job_id} crashed: {e}")
+        InvestigationJob.objects.filter(id=job_id).update(
+            status='failed', stage='Investigation failed', error=str(e), finished_at=timezone.now()
+        )
+    finally:
+        close_old_connections()
+
+
+def expire_stale_jobs() -> int:
+    """Fail jobs orphaned by a restarted worker process"""
+    now = timezone.now()
+    running = InvestigationJob.objects.filter(
+        status='running',
+        started_at__lt=now - STALE_JOB_AFTER,
+    ).update(status='failed', stage='Investigation failed', error='Job was interrupted', finished_at=now)
+    queued = InvestigationJob.objects.filter(
+        status='queued',
+        created_at__lt=now - STALE_QUEUED_JOB_AFTER,
+    ).update(status='failed', stage='Investigation failed', error='Job was never started', finished_at=now)
+    return running + queued
@@ -0,0 +1,201 @@
+"""
+Checker workers that share the check workload through database leases.
+
+Any number of ``manage.py check_worker`` processes, on any node with its own
+Tor client, run against the shared database. Each worker loops:
+
+1. claim up to CHECK_WORKER_BATCH links that are due (LinkStats.next_check_at,
+   see services.scheduler) and not leased, marking them leased_by itself
+   until now + CHECK_LEASE_SECONDS. On PostgreSQL the candidate rows are
+   locked with ``SELECT ... FOR UPDATE SKIP LOCKED``, so concurrent workers
+   pick different links instead of queueing on each other's locks.
+2. check them with check_links_bulk, paced by its own Tor budget
+3. release the leases; the checks have already moved next_check_at on
+
+A heartbeat thread renews the worker's leases every third of the lease
+time and writes its throughput to its CheckWorker row. If a worker dies,
+its leases simply expire: expired leases count as free when claiming, and
+release_expired() clears them (and counts them on the reclaiming worker).
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import socket
+import threading
+import uuid
+from datetime import timedelta
+from typing import List, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from links.models import CheckWorker, LinkStats, OnionLink
+from .metrics import CHECK_LEASES
+from .scheduler import TokenBucket, reschedule_unchecked
+
+logger = logging.getLogger(__name__)
+
+# Sleep when nothing is due
+IDLE_SECONDS = 15.0
+# Weight of the latest heartbeat interval in checks_per_minute
+RATE_ALPHA = 0.3
+
+
+def _free(now) -> Q:
+    return Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lt=now)
+
+
+def _due(now) -> Q:
+    return Q(next_check_at__isnull=True) | Q(next_check_at__lte=now)
+
+
+def claim(worker: str, limit: int, seconds: float) -> List[OnionLink]:
+    """Lease up to ``limit`` due links to ``worker`` for ``seconds``"""
+    now = timezone.now()
+    expires = now + timedelta(seconds=seconds)
+    candidates = LinkStats.objects.filter(_due(now), _free(now))
+    if connection.features.has_select_for_update_skip_locked:
+        candidates = candidates.select_for_update(skip_locked=True)
+    candidates = candidates.order_by(F('next_check_at').asc(nulls_first=True)).values('id')[:limit]
+    # One UPDATE ... WHERE id IN (SELECT ... LIMIT n): no read-then-write lock upgrade, which
+    # SQLite would fail under concurrent workers; the lease is re-checked in the outer WHERE
+    with transaction.atomic():
+        claimed = LinkStats.objects.filter(_free(now), id__in=candidates).update(
+            leased_by=worker, lease_expires_at=expires,
+        )
+    if claimed:
+        CHECK_LEASES.labels(event='claimed').inc(claimed)
+    return list(OnionLink.objects.filter(stats__leased_by=worker, stats__lease_expires_at=expires))
+
+
+def renew(worker: str, seconds: float) -> int:
+    """Extend all of ``worker``'s leases; returns how many it holds"""
+    return LinkStats.objects.filter(leased_by=worker).update(
+        lease_expires_at=timezone.now() + timedelta(seconds=seconds),
+    )
+
+
+def release(worker: str, links: Optional[List[OnionLink]] = None) -> int:
+    """Give up ``worker``'s leases (all of them, or those of ``links``)"""
+    held = LinkStats.objects.filter(leased_by=worker)
+    if links is not None:
+        held = held.filter(onion_link_id__in=[link.id for link in links])
+    return held.update(leased_by='', lease_expires_at=None)
+
+
+def release_expired() -> int:
+    """Clear leases whose worker stopped renewing them"""
+    expired = LinkStats.objects.filter(lease_expires_at__lt=timezone.now()).update(
+        leased_by='', lease_expires_at=None,
+    )
+    if expired:
+        CHECK_LEASES.labels(event='expired').inc(expired)
+    return expired
+
+
+class LeaseWorker:
+    """One checker worker process; see the module docstring"""
+
+    def __init__(self, checker, name: Optional[str] = None, batch_size: Optional[int] = None,
+                 budget: Optional[float] = None, workers: int = 8):
+        self.checker = checker
+        hostname = socket.gethostname()
+        self.name = name or f'{hostname}:{os.getpid()}:{uuid.uuid4().hex[:6]}'
+        self.batch_size = batch_size or getattr(settings, 'CHECK_WORKER_BATCH', 20)
+        self.lease_seconds = getattr(settings, 'CHECK_LEASE_SECONDS', 120)
+        self.budget = budget or getattr(settings, 'RECHECK_BUDGET_PER_MINUTE', 30)
+        self.workers = workers
+        # A batch's worth of tokens, so claims wait for budget rather than leases idling in memory
+        self.bucket = TokenBucket(self.budget, burst=self.batch_size)
+        self.stop_event = threading.Event()
+        self.record, _ = CheckWorker.objects.update_or_create(
+            name=self.name,
+            defaults={'hostname': hostname, 'pid': os.getpid(), 'last_heartbeat': timezone.now(), 'stopped_at': None},
+        )
+        self._counted = 0
+        self._lock = threading.Lock()
+        self._heartbeat: Optional[threading.Thread] = None
+
+    def stop(self) -> None:
+        self.stop_event.set()
+
+    def _count(self, alive: int, dead: int, reclaimed: int = 0) -> None:
+        with self._lock:
+            self.record.checks += alive + dead
+            self.record.alive += alive
+            self.record.dead += dead
+            self.record.leases_reclaimed += reclaimed
+
+    def beat(self, interval: float) -> None:
+        """Renew leases and publish throughput (``interval``: seconds since the last beat)"""
+        renew(self.name, self.lease_seconds)
+        with self._lock:
+            recent = self.record.checks - self._counted
+            self._counted = self.record.checks
+            rate = recent / interval * 60 if interval > 0 else 0.0
+            self.record.checks_per_minute = RATE_ALPHA * rate + (1 - RATE_ALPHA) * self.record.checks_per_minute
+            self.record.last_heartbeat = timezone.now()
+            self.record.save(update_fields=[
+                'checks', 'alive', 'dead', 'leases_reclaimed', 'checks_per_minute', 'last_heartbeat',
+            ])
+
+    def _heartbeat_loop(self) -> None:
+        interval = self.lease_seconds / 3
+        try:
+            while not self.stop_event.wait(interval):
+                try:
+                    self.beat(interval)
+                except Exception as e:
+                    logger.warning(f"Heartbeat of {self.name} failed: {e}")
+        finally:
+            close_old_connections()
+
+    def run_once(self) -> int:
+        """Claim and check one batch; returns links checked (0 if nothing was due)"""
+        reclaimed = release_expired()
+        if reclaimed:
+            self._count(0, 0, reclaimed)
+        size = self.bucket.take(self.batch_size, self.stop_event)
+        if not size:
+            return 0
+        links = claim(self.name, size, self.lease_seconds)
+        if not links:
+            return 0
+        try:
+            alive, dead, _ = self.checker.check_links_bulk(
+                links, max_workers=min(self.workers, len(links)), collapse_mirrors=True,
+            )
+            self._count(alive, dead)
+        finally:
+            reschedule_unchecked(links)
+            release(self.name, links)
+        return len(links)
+
+    def run(self, max_checks: Optional[int] = None) -> int:
+        """Run until stop() (or ``max_checks`` links); returns links checked"""
+        self._heartbeat = threading.Thread(target=self._heartbeat_loop, name='check-worker-heartbeat', daemon=True)
+        self._heartbeat.start()
+        checked = 0
+        try:
+            while not self.stop_event.is_set():
+                if max_checks is not None and checked >= max_checks:
+                    break
+                try:
+                    done = self.run_once()
+                except Exception as e:
+                    logger.exception(f"Check batch of {self.name} failed: {e}")
+                    done = 0
+                checked += done
+                if not done:
+                    self.stop_event.wait(IDLE_SECONDS)
+        finally:
+            self.stop_event.set()
+            release(self.name)
+            self.record.stopped_at = timezone.now()
+            self.beat(self.lease_seconds / 3)
+            self.record.save(update_fields=['stopped_at'])
+        return checked
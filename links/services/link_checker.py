@@ -1,13 +1,108 @@
 import requests
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from django.conf import settings
 from django.utils import timezone
 from links.models import OnionLink
+from .check_history import get_check_history
+from .failures import (
+    DESCRIPTOR_NOT_FOUND, HTTP_STATUS, INVALID_ADDRESS, OTHER, classify, is_permanent, is_retryable,
+)
+from .hedging import hedging_enabled, isolated_proxies, run_hedged
+from .hs_prefetch import ABSENT, ABSENT_REASON, PENDING, DescriptorPrefetcher
+from .metrics import CHECK_FAILURES, CHECK_RETRIES, CHECK_SECONDS, CHECKS, CHECKS_IN_FLIGHT, DB_WRITE_SECONDS
+from .mirrors import assign_fingerprint, group_by_cluster
+from .onion_url import REJECTION_MESSAGES, check_onion_host
+from .prioritizer import CheckQueue, prioritize, record_check, source_hit_rates
+from .probe_timing import ProbeTimer, current_timer, mount_timed_adapter
+from .snapshots import decode_body, get_snapshot_store
+from .timeouts import Deadlines, TimeoutModel
+import itertools
 import time
 import logging
 import os
+from urllib.parse import urlparse
 
 logger = logging.getLogger(__name__)
 
+# Pre-bound metric children for the per-check hot path
+_DB_CHECK_RESULT = DB_WRITE_SECONDS.labels(operation='check_result')
+_DB_SNAPSHOT = DB_WRITE_SECONDS.labels(operation='snapshot')
+_DB_FINGERPRINT = DB_WRITE_SECONDS.labels(operation='fingerprint')
+
+# Pause before retrying a transient failure (see failures.TRANSIENT)
+RETRY_DELAY = 1.0
+# Links are not dispatched with less than this left of a search deadline
+MIN_CHECK_SECONDS = 3.0
+# Links read ahead from the iterable given to iter_check_links
+STREAM_WINDOW = 500
+BODY_CHUNK_SIZE = 64 * 1024
+SKIPPED_REASON = 'Search deadline reached before this link was checked'
+
+
+class TotalTimeout(requests.exceptions.ReadTimeout):
+    """The response body did not arrive within the check's total deadline"""
+
+
+class HedgeCancelled(requests.exceptions.RequestException):
+    """The other attempt of a hedged request answered first"""
+
+
+def _read_body(response, deadline_at, cancelled=None):
+    """
+    Read a streamed body, giving up once ``deadline_at`` (perf_counter) has
+    passed between chunks, or once ``cancelled`` (an Event) is set
+    """
+    chunks = []
+    for chunk in response.iter_content(BODY_CHUNK_SIZE):
+        if cancelled is not None and cancelled.is_set():
+            response.close()
+            raise HedgeCancelled(f"Hedged request for {response.url} answered first")
+        chunks.append(chunk)
+        if time.perf_counter() > deadline_at:
+            response.close()
+            raise TotalTimeout(f"Total deadline exceeded while reading {response.url}")
+    response._content = b''.join(chunks)
+    return response._content
+
+
+class _db_write:
+    """Time a block of DB writes into its metric and the running probe's timings"""
+
+    __slots__ = ('_child', '_start')
+
+    def __init__(self, child):
+        self._child = child
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self._start
+        self._child.observe(elapsed)
+        timer = current_timer()
+        if timer is not None:
+            timer.db += elapsed
+        return False
+
+
+def _host(link_obj):
+    return urlparse(link_obj.url).hostname or ''
+
+
+def is_cloud_environment():
+    """Detect if running in cloud environment (Render, Heroku, etc.)"""
+    # Check for common cloud environment variables
+    cloud_indicators = [
+        'RENDER',  # Render
+        'DYNO',  # Heroku
+        'RAILWAY_ENVIRONMENT',  # Railway
+        'VERCEL',  # Vercel
+        'NETLIFY',  # Netlify
+        'AWS_EXECUTION_ENV',  # AWS Lambda
+    ]
+
+    return any(os.environ.get(indicator) for indicator in cloud_indicators)
+
 
 class OnionLinkCheckerService:
     """
@@ -31,21 +126,12 @@ class OnionLinkCheckerService:
             # Local environment - try to use Tor SOCKS proxy
             logger.info("Local environment detected - using Tor proxy")
             self.session = requests.Session()
+            mount_timed_adapter(self.session)
             self._setup_tor_proxy()
 
     def _detect_cloud_environment(self):
         """Detect if running in cloud environment (Render, Heroku, etc.)"""
-        # Check for common cloud environment variables
-        cloud_indicators = [
-            'RENDER',  # Render
-            'DYNO',  # Heroku
-            'RAILWAY_ENVIRONMENT',  # Railway
-            'VERCEL',  # Vercel
-            'NETLIFY',  # Netlify
-            'AWS_EXECUTION_ENV',  # AWS Lambda
-        ]
-
-        return any(os.environ.get(indicator) for indicator in cloud_indicators)
+        return is_cloud_environment()
 
     def _setup_tor_proxy(self):
         """Setup Tor SOCKS proxy for local environment"""
@@ -66,51 +152,171 @@ class OnionLinkCheckerService:
             logger.error(f"Error setting up Tor proxy: {e}")
             self.session.proxies = {}
 
-    def _fetch_with_cloud_proxy(self, url):
-        """Fetch using cloud-friendly Tor2Web gateway"""
-        result = self.cloud_proxy.fetch(url, timeout=self.timeout)
+    def _fetch_with_cloud_proxy(self, url, deadlines=None, gateway=None):
+        """Fetch using cloud-friendly Tor2Web gateway (the first one unless ``gateway``)"""
+        result = self.cloud_proxy.fetch(url, timeout=deadlines.total if deadlines else self.timeout, gateway=gateway)
         return result
 
-    def _fetch_with_tor_proxy(self, url):
-        """Fetch using local Tor SOCKS proxy"""
+    def _fetch_with_tor_proxy(self, url, deadlines=None, proxies=None, cancelled=None):
+        """
+        Fetch using local Tor SOCKS proxy, within ``deadlines`` (connect, first
+        byte, total). ``proxies`` overrides the session's (hedging uses it for
+        circuit isolation); ``cancelled`` stops reading the body.
+        """
+        deadlines = deadlines or Deadlines.fixed(self.timeout)
         try:
-            response = self.session.get(url, timeout=self.timeout)
+            started = time.perf_counter()
+            response = self.session.get(
+                url, timeout=(deadlines.connect, deadlines.first_byte), stream=True, proxies=proxies,
+            )
+            _read_body(response, started + deadlines.total, cancelled)
             return {
                 'success': True,
                 'content': response.text,
                 'binary_content': response.content,
                 'status_code': response.status_code,
                 'headers': dict(response.headers),
-                'url': response.url
+                'url': response.url,
+                'elapsed': response.elapsed.total_seconds()
             }
         except Exception as e:
             return {
                 'success': False,
                 'error': str(e),
+                'failure': classify(e),
                 'status_code': None
             }
 
-    def check_single_link(self, link_obj):
+    def _fetch(self, url, deadlines=None):
+        """Fetch over the environment's transport, hedged past ``deadlines.hedge_after`` (services.hedging)"""
+        if deadlines is None or deadlines.hedge_after is None or not hedging_enabled():
+            return self._fetch_once(url, deadlines)
+        # The hedge gets what is left of the deadlines once it starts
+        hedge_deadlines = deadlines.capped(deadlines.total - deadlines.hedge_after)
+        return run_hedged(
+            lambda cancelled: self._fetch_once(url, deadlines, cancelled=cancelled),
+            lambda cancelled: self._fetch_once(url, hedge_deadlines, hedge=True, cancelled=cancelled),
+            deadlines.hedge_after,
+            succeeded=lambda result: result['success'],
+        )
+
+    def _fetch_once(self, url, deadlines=None, hedge=False, cancelled=None):
+        if self.is_cloud:
+            gateways = self.cloud_proxy.tor2web_gateways
+            gateway = gateways[1 % len(gateways)] if hedge else None
+            return self._fetch_with_cloud_proxy(url, deadlines, gateway=gateway)
+        proxies = isolated_proxies(self.session.proxies) if hedge and self.session.proxies else None
+        return self._fetch_with_tor_proxy(url, deadlines, proxies=proxies, cancelled=cancelled)
+
+    @staticmethod
+    def failure_of(result):
+        """Failure reason of a fetch result, or None if the page answered 200"""
+        if result['success']:
+            return None if result['status_code'] == 200 else HTTP_STATUS
+        return result.get('failure') or classify(result.get('error', ''))
+
+    def check_single_link(self, link_obj, deadlines=None):
         """
         Check a single onion link for 200 OK status.
         Automatically uses correct method based on environment.
+        ``deadlines`` (services.timeouts) bound each phase; by default every
+        phase gets the checker's timeout.
+        The result's ``timings`` break down where the time went.
         """
+        with CHECKS_IN_FLIGHT.track_in_progress(), ProbeTimer() as timer:
+            result = self._check_single_link(link_obj, deadlines or Deadlines.fixed(self.timeout))
+        result['timings'] = timer.as_dict()
+        CHECKS.labels(outcome=self.outcome_of(result)).inc()
+        return result
+
+    @staticmethod
+    def outcome_of(result):
+        """alive, dead, snapshot (proven by a fresh snapshot) or rejected (unreachable address)"""
+        if result.get('from_snapshot'):
+            return 'snapshot'
+        if result.get('cached_failure'):
+            return 'cached'
+        if result.get('reason') in REJECTION_MESSAGES:
+            return 'rejected'
+        if result.get('reason') == ABSENT_REASON:
+            return 'absent'
+        return result['status']
+
+    def _check_single_link(self, link_obj, deadlines):
+        # v2 and malformed addresses can never answer; don't spend a Tor timeout on them
+        problem = check_onion_host(urlparse(link_obj.url).hostname or '')
+        if problem:
+            return self._handle_dead_link(link_obj, problem, INVALID_ADDRESS)
+
+        # A permanent failure (no descriptor, needs client auth...) seen moments ago still holds
+        ttl = getattr(settings, 'PERMANENT_FAILURE_TTL', 900)
+        if (ttl and link_obj.status == 'dead' and is_permanent(link_obj.failure_reason)
+                and link_obj.last_checked and (timezone.now() - link_obj.last_checked).total_seconds() < ttl):
+            return {
+                'url': link_obj.url,
+                'status': 'dead',
+                'reason': link_obj.get_failure_reason_display(),
+                'failure': link_obj.failure_reason,
+                'cached_failure': True,
+            }
+
         try:
-            start_time = time.time()
+            # A page fetched moments ago by the sandbox or investigator proves liveness
+            snapshot = get_snapshot_store().get_fresh(link_obj.url)
+            if snapshot is not None:
+                link_obj.status = 'alive'
+                link_obj.failure_reason = ''
+                link_obj.status_code = snapshot.status_code
+                link_obj.last_checked = timezone.now()
+                with _db_write(_DB_CHECK_RESULT):
+                    link_obj.save()
+                    self._record(link_obj, True)
+                return {
+                    'url': link_obj.url,
+                    'status': 'alive',
+                    'status_code': snapshot.status_code,
+                    'response_time': link_obj.response_time,
+                    'from_snapshot': True
+                }
 
-            if self.is_cloud:
-                result = self._fetch_with_cloud_proxy(link_obj.url)
-            else:
-                result = self._fetch_with_tor_proxy(link_obj.url)
+            start_time = time.time()
+            timer = current_timer()
+            retries = max(0, getattr(settings, 'CHECK_TRANSIENT_RETRIES', 1))
+            for attempt in range(retries + 1):
+                connect_before = timer.connect if timer is not None else 0.0
+                result = self._fetch(link_obj.url, deadlines)
+                failure = self.failure_of(result)
+                # Only failures Tor reports quickly are retried; a retried timeout costs another full timeout
+                if not is_retryable(failure) or attempt == retries or time.time() - start_time > deadlines.total / 2:
+                    break
+                CHECK_RETRIES.labels(reason=failure).inc()
+                time.sleep(RETRY_DELAY)
 
             response_time = time.time() - start_time
+            connect = timer.connect - connect_before if timer is not None else None
+            if timer is not None:
+                timer.first_byte = result.get('elapsed')
+            alive = failure is None
+            CHECK_SECONDS.labels(
+                transport='gateway' if self.is_cloud else 'tor',
+                outcome='alive' if alive else 'dead',
+            ).observe(response_time)
+            with _db_write(_DB_SNAPSHOT):
+                self._store_snapshot(link_obj.url, result, 'checker')
 
-            if result['success'] and result['status_code'] == 200:
+            if alive:
                 link_obj.status = 'alive'
+                link_obj.failure_reason = ''
                 link_obj.status_code = result['status_code']
                 link_obj.response_time = response_time
                 link_obj.last_checked = timezone.now()
-                link_obj.save()
+                elapsed = result.get('elapsed')
+                wait = max(0.0, elapsed - connect) if elapsed is not None and connect is not None else None
+                with _db_write(_DB_CHECK_RESULT):
+                    link_obj.save()
+                    self._record(link_obj, True, response_time, connect, wait)
+                with _db_write(_DB_FINGERPRINT):
+                    self._fingerprint(link_obj, result.get('content') or '')
 
                 return {
                     'url': link_obj.url,
@@ -119,71 +325,311 @@ class OnionLinkCheckerService:
                     'response_time': response_time
                 }
             else:
-                return self._handle_dead_link(link_obj, result.get('error', 'non_200_status'))
+                return self._handle_dead_link(link_obj, result.get('error', 'non_200_status'), failure)
+
+        except Exception as e:
+            return self._handle_dead_link(link_obj, str(e), classify(e))
+
+    def _store_snapshot(self, url, result, source):
+        """Keep the fetched body so other services can reuse it"""
+        if not result.get('success') or result.get('from_snapshot'):
+            return
+        try:
+            headers = result.get('headers') or {}
+            get_snapshot_store().save(
+                url,
+                result.get('binary_content'),
+                result.get('status_code'),
+                source,
+                content_type=headers.get('Content-Type', ''),
+                etag=headers.get('ETag', ''),
+                last_modified=headers.get('Last-Modified', ''),
+            )
+        except Exception as e:
+            logger.warning(f"Could not store snapshot of {url}: {e}")
+
+    def _record(self, link_obj, alive, response_time=None, connect=None, first_byte=None):
+        """Feed the outcome into the link's rollups (prioritization, deadlines) and its check history"""
+        try:
+            record_check(link_obj, alive, response_time, connect, first_byte)
+        except Exception as e:
+            logger.warning(f"Could not record check history for {link_obj.url}: {e}")
+        get_check_history().add(link_obj.id, alive, response_time, link_obj.failure_reason)
 
+    def _fingerprint(self, link_obj, content):
+        """Place the link in its mirror cluster based on the fetched page"""
+        try:
+            assign_fingerprint(link_obj, content)
         except Exception as e:
-            return self._handle_dead_link(link_obj, str(e))
+            logger.warning(f"Could not fingerprint {link_obj.url}: {e}")
 
-    def _handle_dead_link(self, link_obj, reason):
-        """Handle a dead link by updating database"""
+    def _handle_dead_link(self, link_obj, reason, failure=OTHER):
+        """Handle a dead link by updating database; ``failure`` is its reason from services.failures"""
         link_obj.status = 'dead'
+        link_obj.failure_reason = failure
         link_obj.last_checked = timezone.now()
-        link_obj.save()
+        with _db_write(_DB_CHECK_RESULT):
+            link_obj.save()
+            self._record(link_obj, False)
+        CHECK_FAILURES.labels(reason=failure).inc()
 
         return {
             'url': link_obj.url,
             'status': 'dead',
-            'reason': reason
+            'reason': reason,
+            'failure': failure,
         }
 
-    def check_links_bulk(self, links_queryset, max_workers=20, progress_callback=None):
-        alive_links = []
-        dead_links = []
+    def check_links_bulk(self, links_queryset, max_workers=20, progress_callback=None, collapse_mirrors=False,
+                         tracer=None, deadline=None):
+        """
+        Check many links concurrently; returns (alive count, dead count, results).
+
+        Collects what iter_check_links yields (see there), calling
+        ``progress_callback`` with each result as it arrives.
+        """
+        alive = dead = 0
         results = []
+        for result in self.iter_check_links(links_queryset, max_workers=max_workers,
+                                            collapse_mirrors=collapse_mirrors, tracer=tracer, deadline=deadline):
+            results.append(result)
+            if result['status'] == 'alive':
+                alive += 1
+            elif result['status'] == 'dead':
+                dead += 1
+            if progress_callback:
+                progress_callback(result)
+        return alive, dead, results
 
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_link = {
-                executor.submit(self.check_single_link, link): link
-                for link in links_queryset
-            }
+    def iter_check_links(self, links, max_workers=20, collapse_mirrors=False, tracer=None, deadline=None,
+                         window=None):
+        """
+        Check links from any iterable concurrently, yielding each result as it completes.
 
-            for future in as_completed(future_to_link):
-                result = future.result()
-                results.append(result)
+        ``links`` is read ``window`` links at a time (default STREAM_WINDOW),
+        and the next window only once fewer links are queued than there are
+        workers, so memory stays flat however many links there are (pass
+        ``queryset.iterator()`` for a whole table). Within what has been
+        read, links are dispatched in order of predicted alive results per
+        second (see prioritizer); likely-dead links wait on a low-priority
+        lane with a few reserved slots. With ``collapse_mirrors`` only one
+        representative per mirror cluster (within a window) is fetched; its
+        outcome is copied to the other members, whose results carry
+        ``mirror_of`` (the representative's URL). A ``tracer``
+        (SearchTracer) receives each check's queue wait and timings.
 
-                if result['status'] == 'alive':
-                    alive_links.append(result)
-                else:
-                    dead_links.append(result)
+        Over Tor, descriptors are prefetched for each window (see
+        hs_prefetch). Links whose onion has no descriptor are marked dead
+        without a worker. Links whose descriptor is still being fetched wait
+        while there is other work to hand out.
 
-                # Call progress callback if provided
-                if progress_callback:
-                    progress_callback(result)
+        Each check gets per-host deadlines from its latency history (see
+        timeouts). With ``deadline`` (seconds) the whole run is capped:
+        no check runs past it, and links not started by then get a
+        ``skipped`` result, which leaves them unchanged in the database.
+        """
+        links = iter(links)
+        max_workers = max(1, max_workers)
+        window = window or max(STREAM_WINDOW, max_workers * 4)
+        queue = CheckQueue([], low_lane_slots=max(1, max_workers // 5))
+        in_flight = {}
+        low_in_flight = 0
+        mirrors_of = {}
+        queued_at = {}  # link id -> when its window was read, for the tracer
+        prefetch_of = {}  # link id -> its window's prefetcher, until dispatched
+        prefetch_left = {}  # prefetcher -> its links not dispatched yet
+        if tracer is None:
+            check = lambda link, deadlines, queued: self.check_single_link(link, deadlines)  # noqa: E731
+        else:
+            check = lambda link, deadlines, queued: self._traced_check(link, deadlines, tracer, queued)  # noqa: E731
+        timeouts = TimeoutModel(self.timeout)
+        # A full-table aggregate: once per run, not per window
+        rates = source_hit_rates()
+        deadline_at = time.monotonic() + deadline if deadline else None
+        exhausted = False
+        waiting = []  # predictions whose descriptor fetch is in flight
 
-                # Small delay to avoid overwhelming Tor network
-                time.sleep(0.5)
+        def read_window():
+            chunk = list(itertools.islice(links, window))
+            if collapse_mirrors and chunk:
+                groups = group_by_cluster(chunk)
+                chunk = [rep for rep, _ in groups]
+                mirrors_of.update((rep.id, mirrors) for rep, mirrors in groups if mirrors)
+            predictions = prioritize(chunk, timeout=self.timeout, rates=rates)
+            prefetcher = self._start_prefetch([prediction.link for prediction in predictions])
+            now = time.perf_counter()
+            for prediction in predictions:
+                queue.push(prediction)
+                queued_at[prediction.link.id] = now
+                if prefetcher is not None:
+                    prefetch_of[prediction.link.id] = prefetcher
+            if prefetcher is not None:
+                prefetch_left[prefetcher] = len(predictions)
+            return bool(chunk)
 
-        return len(alive_links), len(dead_links), results
+        def dequeued(prediction):
+            """``prediction`` left the queue; close its window's prefetcher once all its links have"""
+            queued = queued_at.pop(prediction.link.id)
+            prefetcher = prefetch_of.pop(prediction.link.id, None)
+            if prefetcher is not None:
+                prefetch_left[prefetcher] -= 1
+                if not prefetch_left[prefetcher]:
+                    del prefetch_left[prefetcher]
+                    prefetcher.close()
+            return queued
+
+        def finish(prediction, result):
+            link_results = [result]
+            mirrors = mirrors_of.pop(prediction.link.id, None)
+            if mirrors and result['status'] == 'skipped':
+                link_results.extend(dict(result, url=mirror.url, mirror_of=result['url']) for mirror in mirrors)
+            elif mirrors:
+                link_results.extend(self._apply_to_mirrors(mirrors, result))
+            return link_results
+
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                while True:
+                    # Read ahead only as far as the workers need, so priority holds within a window
+                    while not exhausted and len(queue) + len(waiting) < max_workers:
+                        exhausted = not read_window()
+                    if not (queue or in_flight or waiting):
+                        break
+                    remaining = deadline_at - time.monotonic() if deadline_at is not None else None
+                    if remaining is not None and remaining < MIN_CHECK_SECONDS:
+                        # Out of time: whatever hasn't started won't be checked in this run
+                        for prediction in waiting + [queue.pop(low_in_flight) for _ in range(len(queue))]:
+                            dequeued(prediction)
+                            yield from finish(prediction, self._skipped(prediction.link))
+                        waiting = []
+                        for link in links:
+                            yield self._skipped(link)
+                        exhausted = True
+                    if waiting:
+                        for prediction in [p for p in waiting if prefetch_of[p.link.id].state(_host(p.link)) != PENDING]:
+                            waiting.remove(prediction)
+                            queue.push(prediction)
+
+                    # Only hand out as many links as there are workers, so priority holds
+                    while queue and len(in_flight) < max_workers:
+                        prediction = queue.pop(low_in_flight)
+                        prefetcher = prefetch_of.get(prediction.link.id)
+                        if prefetcher is not None:
+                            state = prefetcher.state(_host(prediction.link))
+                            if state == PENDING:
+                                waiting.append(prediction)
+                                continue
+                            prefetcher.claim(_host(prediction.link))
+                        queued = dequeued(prediction)
+                        if prefetcher is not None and state == ABSENT:
+                            yield from finish(prediction, self._check_absent(prediction.link, tracer, queued))
+                            continue
+                        deadlines = timeouts.for_stats(prediction.stats)
+                        if remaining is not None:
+                            deadlines = deadlines.capped(remaining)
+                        low_in_flight += prediction.low_priority
+                        in_flight[executor.submit(check, prediction.link, deadlines, queued)] = prediction
+
+                    if not in_flight:
+                        if waiting:
+                            # Free workers, and nothing to do until a descriptor fetch resolves
+                            prefetch_of[waiting[0].link.id].wait(0.5)
+                        continue
+                    # Wake up early when free workers could take a link whose descriptor just arrived
+                    timeout = 0.25 if waiting and len(in_flight) < max_workers else None
+                    done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        prediction = in_flight.pop(future)
+                        low_in_flight -= prediction.low_priority
+                        yield from finish(prediction, future.result())
+        finally:
+            for prefetcher in prefetch_left:
+                prefetcher.close()
+            get_check_history().flush()
+
+    def _start_prefetch(self, links):
+        """Descriptor prefetcher for a bulk check over Tor, or None"""
+        if self.is_cloud or not self.session.proxies or not getattr(settings, 'HS_PREFETCH_ENABLED', True):
+            return None
+        hosts = [_host(link) for link in links]
+        hosts = [host for host in hosts if not check_onion_host(host)]
+        if len(hosts) < 2:
+            return None
+        prefetcher = DescriptorPrefetcher(hosts)
+        if not prefetcher.start():
+            return None
+        logger.info(f"Prefetching descriptors for {len(prefetcher)} onion services")
+        return prefetcher
+
+    def _skipped(self, link_obj):
+        CHECKS.labels(outcome='skipped').inc()
+        return {'url': link_obj.url, 'status': 'skipped', 'reason': SKIPPED_REASON}
+
+    def _check_absent(self, link_obj, tracer, queued):
+        """Result for a link whose onion has no descriptor, recorded without a network call"""
+        started = time.perf_counter()
+        result = self._handle_dead_link(link_obj, ABSENT_REASON, DESCRIPTOR_NOT_FOUND)
+        CHECKS.labels(outcome='absent').inc()
+        if tracer is not None:
+            tracer.probe(link_obj.id, link_obj.url, queued, started, None, 'absent')
+        return result
+
+    def _traced_check(self, link_obj, deadlines, tracer, queued):
+        started = time.perf_counter()
+        result = self.check_single_link(link_obj, deadlines)
+        tracer.probe(link_obj.id, link_obj.url, queued, started, result.get('timings'), self.outcome_of(result))
+        return result
+
+    def _apply_to_mirrors(self, mirrors, result):
+        """Record a representative's check outcome on the rest of its cluster"""
+        now = timezone.now()
+        fields = {'status': result['status'], 'failure_reason': result.get('failure') or '', 'last_checked': now}
+        if result['status'] == 'alive':
+            fields['status_code'] = result.get('status_code')
+        OnionLink.objects.filter(id__in=[m.id for m in mirrors]).update(**fields)
+
+        mirror_results = []
+        for mirror in mirrors:
+            mirror_result = dict(result, url=mirror.url, mirror_of=result['url'])
+            mirror_result.pop('from_snapshot', None)
+            mirror_result.pop('timings', None)
+            mirror_results.append(mirror_result)
+        return mirror_results
 
     def fetch_content(self, url, timeout=None):
-        """Fetch HTML content from onion URL"""
+        """Fetch HTML content from onion URL, reusing a fresh snapshot if there is one"""
         try:
+            store = get_snapshot_store()
+            snapshot = store.get_fresh(url)
+            body = store.read(snapshot) if snapshot is not None else None
+            if body is not None:
+                return {
+                    'success': True,
+                    'content': decode_body(body, snapshot.content_type),
+                    'status_code': snapshot.status_code,
+                    'headers': {'Content-Type': snapshot.content_type},
+                    'url': url,
+                    'from_snapshot': True
+                }
+
             if self.is_cloud:
                 result = self.cloud_proxy.fetch(url, timeout=timeout or self.timeout)
-                return result
             else:
                 response = self.session.get(
                     url,
                     timeout=timeout or self.timeout,
                     allow_redirects=True
                 )
-                return {
+                result = {
                     'success': True,
                     'content': response.text,
+                    'binary_content': response.content,
                     'status_code': response.status_code,
                     'headers': dict(response.headers),
                     'url': response.url
                 }
+            self._store_snapshot(url, result, 'sandbox')
+            return result
         except Exception as e:
             return {
                 'success': False,
@@ -0,0 +1,446 @@
+"""
+In-process metrics registry with Prometheus text exposition.
+
+Counters, gauges and histograms live in plain Python objects; an update is a
+dict lookup (cached per label set) plus a few arithmetic operations under an
+uncontended lock, so instrumentation can stay on the hot path
+(``manage.py benchmark_metrics`` measures it).
+
+Gunicorn runs several worker processes, each with its own registry. When
+METRICS_DIR is set, every process periodically writes a snapshot of its
+registry to ``METRICS_DIR/<pid>-<token>.json``; ``/metrics`` merges all
+snapshots. Counters and histograms are summed across live and exited
+processes (so totals never go backwards), gauges only across live ones.
+Clear METRICS_DIR on deploy.
+"""
+
+from __future__ import annotations
+
+import bisect
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds; Tor round trips range from sub-second to the 30-60s timeouts
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+
+class _Child:
+    """One label set of a metric"""
+
+    __slots__ = ('_lock', 'value')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def track_in_progress(self) -> '_Child':
+        """``with gauge.track_in_progress():`` counts the block while it runs"""
+        return self
+
+    def __enter__(self):
+        self.inc()
+        return self
+
+    def __exit__(self, *exc):
+        self.dec()
+        return False
+
+
+class _Timer:
+    # A plain class: generator-based context managers cost several times more
+    __slots__ = ('_histogram', '_start')
+
+    def __init__(self, histogram: '_HistogramChild'):
+        self._histogram = histogram
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._histogram.observe(time.perf_counter() - self._start)
+        return False
+
+
+class _HistogramChild:
+    __slots__ = ('_lock', '_upper_bounds', 'counts', 'sum')
+
+    def __init__(self, upper_bounds: Sequence[float]):
+        self._lock = threading.Lock()
+        self._upper_bounds = upper_bounds
+        # One slot per bucket plus +Inf; made cumulative only when rendered
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self._upper_bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self) -> _Timer:
+        return _Timer(self)
+
+
+class Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), **kwargs):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lookup: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self._child(())
+
+    def _new_child(self):
+        return _Child()
+
+    def _child(self, key: Tuple[str, ...]):
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def labels(self, *values, **kwargs):
+        """Child for one label set; keep the result to skip the lookup on hot paths"""
+        key = tuple([kwargs[name] for name in self.labelnames]) if kwargs else values
+        child = self._lookup.get(key)
+        if child is None:
+            # Keyed by the caller's spelling (e.g. ints) so the next lookup is a single dict hit
+            child = self._lookup[key] = self._child(tuple(str(v) for v in key))
+        return child
+
+    def samples(self) -> Dict[Tuple[str, ...], object]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1) -> None:
+        self._default.inc(amount)
+
+    def samples(self):
+        return {key: child.value for key, child in list(self._children.items())}
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), multiprocess_mode: str = 'sum'):
+        # 'sum' adds live workers' values (e.g. in-flight work), 'max' takes the largest
+        self.multiprocess_mode = multiprocess_mode
+        super().__init__(name, documentation, labelnames)
+
+    def inc(self, amount: float = 1) -> None:
+        self._default.inc(amount)
+
+    def dec(self, amount: float = 1) -> None:
+        self._default.dec(amount)
+
+    def set(self, value: float) -> None:
+        self._default.set(value)
+
+    def track_in_progress(self):
+        return self._default.track_in_progress()
+
+    def samples(self):
+        return {key: child.value for key, child in list(self._children.items())}
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+    def samples(self):
+        return {key: (list(child.counts), child.sum) for key, child in list(self._children.items())}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, documentation, labelnames=(), **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (), multiprocess_mode: str = 'sum') -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames, multiprocess_mode=multiprocess_mode)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def snapshot(self) -> Dict:
+        """JSON-serializable state of every metric"""
+        data = {}
+        for name, metric in list(self._metrics.items()):
+            entry = {
+                'kind': metric.kind,
+                'help': metric.documentation,
+                'labelnames': list(metric.labelnames),
+                'samples': [[list(key), value] for key, value in metric.samples().items()],
+            }
+            if isinstance(metric, Histogram):
+                entry['buckets'] = list(metric.buckets)
+            if isinstance(metric, Gauge):
+                entry['mode'] = metric.multiprocess_mode
+            data[name] = entry
+        return data
+
+
+registry = MetricsRegistry()
+
+
+# --- Multi-process snapshots
+
+_process_token = uuid.uuid4().hex[:8]
+_flusher_started = False
+_flush_interval: Optional[float] = None
+_flusher_lock = threading.Lock()
+
+
+def _metrics_dir() -> Optional[Path]:
+    from django.conf import settings
+
+    path = getattr(settings, 'METRICS_DIR', None)
+    return Path(path) if path else None
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def flush() -> None:
+    """Write this process's snapshot to METRICS_DIR (no-op without it)"""
+    directory = _metrics_dir()
+    if directory is None:
+        return
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f'{os.getpid()}-{_process_token}.json'
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'w') as fh:
+            json.dump(registry.snapshot(), fh)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def start_flusher(interval: float = 5.0) -> None:
+    """Flush snapshots in the background so idle workers still report"""
+    global _flusher_started, _flush_interval
+    if _metrics_dir() is None or _flusher_started:
+        return
+    with _flusher_lock:
+        if _flusher_started:
+            return
+        _flusher_started = True
+        _flush_interval = interval
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                flush()
+            except Exception as e:
+                logger.warning(f"Could not write metrics snapshot: {e}")
+
+    threading.Thread(target=run, name='metrics-flusher', daemon=True).start()
+
+
+def _restart_flusher_after_fork() -> None:
+    """Gunicorn forks workers after the app is loaded; threads don't survive fork"""
+    global _flusher_started, _flusher_lock
+    _flusher_lock = threading.Lock()
+    _flusher_started = False
+    if _flush_interval is not None:
+        start_flusher(_flush_interval)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_flusher_after_fork)
+
+
+def _merge(snapshots: List[Tuple[bool, Dict]]) -> Dict:
+    merged: Dict[str, Dict] = {}
+    for alive, snapshot in snapshots:
+        for name, entry in snapshot.items():
+            if entry['kind'] == 'gauge' and not alive:
+                continue
+            target = merged.setdefault(name, dict(entry, samples={}))
+            samples = target['samples']
+            for labels, value in entry['samples']:
+                key = tuple(labels)
+                if entry['kind'] == 'histogram':
+                    counts, total = samples.get(key, ([0] * len(value[0]), 0.0))
+                    samples[key] = ([a + b for a, b in zip(counts, value[0])], total + value[1])
+                elif entry['kind'] == 'gauge' and entry.get('mode') == 'max':
+                    samples[key] = max(samples.get(key, value), value)
+                else:
+                    samples[key] = samples.get(key, 0) + value
+    return merged
+
+
+def collect() -> Dict:
+    """Registry state merged across every worker process"""
+    directory = _metrics_dir()
+    if directory is None:
+        return _merge([(True, registry.snapshot())])
+
+    flush()
+    snapshots = []
+    for path in directory.glob('*.json'):
+        try:
+            pid = int(path.name.split('-', 1)[0])
+            snapshots.append((_pid_alive(pid), json.loads(path.read_text())))
+        except (ValueError, OSError) as e:
+            logger.debug(f"Skipping metrics snapshot {path}: {e}")
+    return _merge(snapshots)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra: str = '') -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+    lines = []
+    for name, entry in sorted(collect().items()):
+        lines.append(f'# HELP {name} {entry["help"]}')
+        lines.append(f'# TYPE {name} {entry["kind"]}')
+        names = entry['labelnames']
+        for key, value in sorted(entry['samples'].items()):
+            if entry['kind'] == 'histogram':
+                counts, total = value
+                cumulative = 0
+                for bound, count in zip(entry['buckets'] + [float('inf')], counts):
+                    cumulative += count
+                    le = 'le="+Inf"' if bound == float('inf') else f'le="{_number(bound)}"'
+                    lines.append(f'{name}_bucket{_labels(names, key, le)} {cumulative}')
+                lines.append(f'{name}_sum{_labels(names, key)} {_number(total)}')
+                lines.append(f'{name}_count{_labels(names, key)} {cumulative}')
+            else:
+                lines.append(f'{name}{_labels(names, key)} {_number(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+# --- Application metrics
+
+SCRAPE_SECONDS = registry.histogram(
+    'darkweb_scrape_seconds', 'Time to fetch and parse one search source', ['source'])
+SCRAPED_LINKS = registry.counter(
+    'darkweb_scraped_links_total', 'Links returned by search sources after canonicalization', ['source'])
+SCRAPE_ERRORS = registry.counter(
+    'darkweb_scrape_errors_total', 'Search source requests that failed', ['source'])
+
+CHECK_SECONDS = registry.histogram(
+    'darkweb_check_seconds', 'Duration of one link check by transport and outcome', ['transport', 'outcome'])
+CHECKS = registry.counter(
+    'darkweb_checks_total', 'Link checks by outcome (alive, dead, snapshot, rejected, absent, cached, skipped)', ['outcome'])
+CHECK_FAILURES = registry.counter(
+    'darkweb_check_failures_total', 'Failed link checks by failure reason (see services.failures)', ['reason'])
+CHECK_RETRIES = registry.counter(
+    'darkweb_check_retries_total', 'Link checks retried after a transient failure', ['reason'])
+HS_PREFETCH = registry.counter(
+    'darkweb_hs_prefetch_total',
+    'Descriptor prefetches by result (found, absent, failed, timeout, error, skipped)', ['result'])
+CHECK_LEASES = registry.counter(
+    'darkweb_check_leases_total', 'Check worker leases by event (claimed, expired)', ['event'])
+HEDGES = registry.counter(
+    'darkweb_hedged_requests_total',
+    'Hedged checker and sandbox requests (launched, hedge_won, primary_won, denied by the budget)', ['outcome'])
+CHECKS_IN_FLIGHT = registry.gauge(
+    'darkweb_checks_in_flight', 'Link checks currently running')
+DB_WRITE_SECONDS = registry.histogram(
+    'darkweb_db_write_seconds', 'Time spent writing check results to the database', ['operation'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5))
+
+SNAPSHOT_LOOKUPS = registry.counter(
+    'darkweb_snapshot_lookups_total', 'Fresh snapshot lookups (hit = Tor fetch avoided)', ['result'])
+RESOURCE_CACHE = registry.counter(
+    'darkweb_resource_cache_total',
+    'Sandbox resource cache lookups (hit, coalesced = waited for another worker\'s fetch, miss)', ['result'])
+SHARED_STATE_BYTES = registry.gauge(
+    'darkweb_shared_state_bytes', 'Size of the shared state store (search progress, resource cache)',
+    multiprocess_mode='max')
+
+GATEWAY_SECONDS = registry.histogram(
+    'darkweb_gateway_request_seconds', 'Tor2Web gateway request latency', ['gateway', 'outcome'])
+
+INVESTIGATION_STAGE_SECONDS = registry.histogram(
+    'darkweb_investigation_stage_seconds', 'Time spent in each investigation stage', ['stage'])
+INVESTIGATIONS = registry.counter(
+    'darkweb_investigations_total', 'Investigations by outcome (changed, unchanged, failed)', ['outcome'])
+
+TOR_START_SECONDS = registry.histogram(
+    'darkweb_tor_start_seconds', 'Time to find or launch a Tor SOCKS proxy', ['method'])
+TOR_RUNNING = registry.gauge(
+    'darkweb_tor_running', 'Whether this process has a usable Tor SOCKS proxy', multiprocess_mode='max')
+TOR_BOOTSTRAP_PERCENT = registry.gauge(
+    'darkweb_tor_bootstrap_percent', 'Tor bootstrap progress reported on the control port', multiprocess_mode='max')
+
+SANDBOX_SECONDS = registry.histogram(
+    'darkweb_sandbox_request_seconds', 'Sandbox proxy response time', ['view', 'outcome'])
@@ -0,0 +1,276 @@
+"""
+Near-duplicate (mirror / clone) detection with SimHash.
+
+Each fetched page gets a 64-bit SimHash of its title, description and visible
+text. Fingerprints are split into four 16-bit bands stored in indexed
+columns: two fingerprints within MAX_MIRROR_DISTANCE (3) bits must agree on at
+least one band, so candidate mirrors are found with indexed equality lookups
+and only those candidates are compared bit by bit.
+
+Links whose pages are near-duplicates share a cluster, represented by the
+oldest link in it. Search results collapse a cluster into one row and bulk
+checks probe only its representative.
+
+Batch fingerprinting uses numpy when it is installed and falls back to pure
+Python otherwise.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import html
+import logging
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.db.models import Q
+from django.utils import timezone
+
+from links.models import OnionLink, PageFingerprint
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - optional dependency
+    numpy = None
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_BITS = 64
+BANDS = 4
+BAND_BITS = FINGERPRINT_BITS // BANDS
+MAX_MIRROR_DISTANCE = 3
+# Only the start of a page is fingerprinted; clones differ below the fold, if at all
+MAX_TEXT_CHARS = 100_000
+
+_MASK64 = (1 << FINGERPRINT_BITS) - 1
+_BIGRAM_PRIME = 0x9E3779B97F4A7C15
+_SCRIPT_STYLE_RE = re.compile(r'<(script|style|noscript)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+_TAG_RE = re.compile(r'<[^>]+>')
+_WORD_RE = re.compile(r'[a-z0-9]{2,}')
+# Onion hosts differ between mirrors by construction and must not count as content
+_ONION_RE = re.compile(r'[a-z2-7]{16,56}\.onion', re.IGNORECASE)
+
+
+def html_to_text(page: str) -> str:
+    """Visible text of an HTML page (scripts, styles and tags removed)"""
+    page = _SCRIPT_STYLE_RE.sub(' ', page[:MAX_TEXT_CHARS * 4])
+    return html.unescape(_TAG_RE.sub(' ', page))
+
+
+def _words(text: str) -> List[str]:
+    return _WORD_RE.findall(_ONION_RE.sub(' ', text.lower())[:MAX_TEXT_CHARS])
+
+
+@lru_cache(maxsize=262_144)
+def _word_hash(word: str) -> int:
+    return int.from_bytes(hashlib.blake2b(word.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def _mix(z: int) -> int:
+    """splitmix64 finalizer: turns a combination of word hashes into a bigram hash"""
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return z ^ (z >> 31)
+
+
+def _features_python(word_hashes: Sequence[int]) -> List[int]:
+    """Word-bigram feature hashes (the word itself for one-word texts)"""
+    if len(word_hashes) < 2:
+        return list(word_hashes)
+    return [_mix(((a * _BIGRAM_PRIME) & _MASK64) ^ b) for a, b in zip(word_hashes, word_hashes[1:])]
+
+
+def _simhash_python(features: Sequence[int]) -> int:
+    totals = [0] * FINGERPRINT_BITS
+    for h in features:
+        for bit in range(FINGERPRINT_BITS):
+            totals[bit] += 1 if (h >> bit) & 1 else -1
+    return sum(1 << bit for bit, total in enumerate(totals) if total > 0)
+
+
+def _features_numpy(word_hashes: Sequence[int]):
+    h = numpy.array(word_hashes, dtype=numpy.uint64)
+    if len(h) < 2:
+        return h
+    z = (h[:-1] * numpy.uint64(_BIGRAM_PRIME)) ^ h[1:]
+    z = (z ^ (z >> numpy.uint64(30))) * numpy.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> numpy.uint64(27))) * numpy.uint64(0x94D049BB133111EB)
+    return z ^ (z >> numpy.uint64(31))
+
+
+def _simhash_numpy(docs: Sequence[Sequence[int]]) -> List[int]:
+    """SimHash of many documents (lists of word hashes), one bit plane at a time"""
+    features = [_features_numpy(word_hashes) for word_hashes in docs]
+    lengths = numpy.array([len(f) for f in features], dtype=numpy.int64)
+    if not lengths.sum():
+        return [0] * len(docs)
+    hashes = numpy.concatenate(features)
+    nonempty = lengths > 0
+    starts = (numpy.cumsum(lengths) - lengths)[nonempty]
+
+    packed = numpy.zeros(len(starts), dtype=numpy.uint64)
+    for bit in range(FINGERPRINT_BITS):
+        is_set = ((hashes >> numpy.uint64(bit)) & numpy.uint64(1)).astype(numpy.int64)
+        set_count = numpy.add.reduceat(is_set, starts)
+        # More features with the bit set than clear, without building the sign matrix
+        packed |= (2 * set_count > lengths[nonempty]).astype(numpy.uint64) << numpy.uint64(bit)
+
+    result = numpy.zeros(len(docs), dtype=numpy.uint64)
+    result[nonempty] = packed
+    return [int(v) for v in result]
+
+
+def _page_words(title: Optional[str], description: Optional[str], page: str) -> List[str]:
+    return _words(' '.join(filter(None, [title, description, html_to_text(page or '')])))
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash of the word bigrams of ``text`` (0 for text without words)"""
+    word_hashes = [_word_hash(w) for w in _words(text)]
+    if not word_hashes:
+        return 0
+    if numpy is not None:
+        return _simhash_numpy([word_hashes])[0]
+    return _simhash_python(_features_python(word_hashes))
+
+
+def fingerprint_page(title: Optional[str], description: Optional[str], page: str = '') -> int:
+    """SimHash of a link's title, description and page body"""
+    return simhash(' '.join(filter(None, [title, description, html_to_text(page or '')])))
+
+
+def fingerprint_many(documents: Iterable[Tuple[Optional[str], Optional[str], str]]) -> List[int]:
+    """
+    Fingerprint many (title, description, page) tuples.
+
+    Words are hashed once per vocabulary entry and bigram hashes are derived
+    arithmetically from them; with numpy the bigram mixing and the per-bit
+    counts of the whole batch are vectorized.
+    """
+    docs = [[_word_hash(w) for w in _page_words(*doc)] for doc in documents]
+    if numpy is None:
+        return [_simhash_python(_features_python(d)) if d else 0 for d in docs]
+    return _simhash_numpy(docs)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin((a ^ b) & _MASK64).count('1')
+
+
+def bands_of(fingerprint: int) -> List[int]:
+    mask = (1 << BAND_BITS) - 1
+    return [(fingerprint >> (i * BAND_BITS)) & mask for i in range(BANDS)]
+
+
+def to_signed(fingerprint: int) -> int:
+    """Map an unsigned 64-bit fingerprint into BigIntegerField range"""
+    return fingerprint - (1 << FINGERPRINT_BITS) if fingerprint >= 1 << (FINGERPRINT_BITS - 1) else fingerprint
+
+
+def to_unsigned(value: int) -> int:
+    return value & _MASK64
+
+
+def find_mirror(fingerprint: int, exclude_link_id: Optional[int] = None) -> Optional[int]:
+    """
+    Representative link id of the closest existing cluster within
+    MAX_MIRROR_DISTANCE bits of ``fingerprint``, or None.
+    """
+    bands = bands_of(fingerprint)
+    query = Q()
+    for i, band in enumerate(bands):
+        query |= Q(**{f'band_{i}': band})
+    candidates = PageFingerprint.objects.filter(query)
+    if exclude_link_id is not None:
+        candidates = candidates.exclude(onion_link_id=exclude_link_id)
+
+    best = None
+    for link_id, cluster_id, value in candidates.values_list('onion_link_id', 'cluster_id', 'simhash'):
+        distance = hamming_distance(fingerprint, to_unsigned(value))
+        if distance <= MAX_MIRROR_DISTANCE and (best is None or distance < best[0]):
+            best = (distance, cluster_id or link_id)
+    return best[1] if best else None
+
+
+def assign_fingerprint(link: OnionLink, page: str = '') -> PageFingerprint:
+    """Fingerprint a freshly fetched page and place its link in a mirror cluster"""
+    fingerprint = fingerprint_page(link.title, link.description, page)
+    cluster_id = None
+    if fingerprint:
+        cluster_id = find_mirror(fingerprint, exclude_link_id=link.id)
+        if cluster_id == link.id:
+            cluster_id = None
+
+    bands = bands_of(fingerprint)
+    fields = {
+        'simhash': to_signed(fingerprint),
+        'band_0': bands[0],
+        'band_1': bands[1],
+        'band_2': bands[2],
+        'band_3': bands[3],
+        'cluster_id': cluster_id,
+        'updated_at': timezone.now(),
+    }
+    # Single-statement writes, no read-then-write transaction: on SQLite, concurrent checker
+    # threads can't upgrade a read lock and fail with "database is locked" (as in leases.claim)
+    if not PageFingerprint.objects.filter(onion_link=link).update(**fields):
+        PageFingerprint.objects.bulk_create([PageFingerprint(onion_link=link, **fields)], ignore_conflicts=True)
+        # Lost a race with another check of the same link: the newest page wins
+        PageFingerprint.objects.filter(onion_link=link).update(**fields)
+    if cluster_id is not None:
+        # This link led a cluster of its own: fold its mirrors into the new one
+        PageFingerprint.objects.filter(cluster=link).update(cluster_id=cluster_id)
+    return PageFingerprint(onion_link=link, **fields)
+
+
+def cluster_ids(links: Iterable[OnionLink]) -> Dict[int, int]:
+    """Map each link id to the id of its cluster representative (itself if unclustered)"""
+    ids = [link.id for link in links]
+    clusters = dict(
+        PageFingerprint.objects.filter(onion_link_id__in=ids, cluster__isnull=False)
+        .values_list('onion_link_id', 'cluster_id')
+    )
+    return {link_id: clusters.get(link_id, link_id) for link_id in ids}
+
+
+def group_by_cluster(links: Sequence[OnionLink]) -> List[Tuple[OnionLink, List[OnionLink]]]:
+    """
+    Split ``links`` into (representative, mirrors) pairs.
+
+    The cluster's own representative is preferred when it is among ``links``;
+    otherwise the first member listed stands in for it.
+    """
+    clusters = cluster_ids(links)
+    groups: Dict[int, List[OnionLink]] = {}
+    for link in links:
+        groups.setdefault(clusters[link.id], []).append(link)
+
+    result = []
+    for rep_id, members in groups.items():
+        members.sort(key=lambda link: link.id != rep_id)
+        result.append((members[0], members[1:]))
+    return result
+
+
+def rebuild_clusters(fingerprints: Sequence[Tuple[int, int]]) -> Dict[int, Optional[int]]:
+    """
+    Cluster ``(link_id, fingerprint)`` pairs in memory, oldest link first.
+
+    Returns link id -> representative id (None for representatives). Used by
+    backfills, where one in-memory band index beats a query per link.
+    """
+    index: List[Dict[int, List[Tuple[int, int]]]] = [{} for _ in range(BANDS)]
+    assignment: Dict[int, Optional[int]] = {}
+    for link_id, fingerprint in sorted(fingerprints):
+        best = None
+        if fingerprint:
+            for i, band in enumerate(bands_of(fingerprint)):
+                for other_id, other_fp in index[i].get(band, ()):
+                    distance = hamming_distance(fingerprint, other_fp)
+                    if distance <= MAX_MIRROR_DISTANCE and (best is None or distance < best[0]):
+                        best = (distance, assignment[other_id] or other_id)
+            for i, band in enumerate(bands_of(fingerprint)):
+                index[i].setdefault(band, []).append((link_id, fingerprint))
+        assignment[link_id] = best[1] if best else None
+    return assignment
@@ -0,0 +1,120 @@
+"""
+Canonical form and pre-flight validation of onion URLs.
+
+Every path that stores or probes an onion URL (scrapers, search, direct
+investigations, bulk commands, the crawler) passes it through
+``canonicalize_onion_url`` so that spelling variants of one page map to one
+OnionLink row and one Tor probe:
+
+- a missing scheme becomes ``http://`` and ``https://`` becomes ``http://``
+  (onion transport is already end-to-end encrypted; one row per service)
+- scheme and host are lower-cased; userinfo, default ports and fragments go
+- an empty path becomes ``/`` and default documents (``index.html`` ...)
+  collapse onto their directory
+
+Addresses are checked before any network call: v3 hosts must be 56 base32
+characters with a valid checksum, and retired v2 (16 character) hosts, which
+always burn a full timeout, are rejected.
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import urlsplit, urlunsplit
+
+from .extractors import is_valid_onion_v3
+
+DEFAULT_DOCUMENTS = ('index.html', 'index.htm', 'index.php', 'default.html', 'default.htm')
+
+_V2_LABEL_RE = re.compile(r'^[a-z2-7]{16}$')
+
+# Reasons a URL is rejected
+NOT_ONION = 'not_onion'
+MALFORMED = 'malformed'
+V2_ADDRESS = 'v2_address'
+BAD_CHECKSUM = 'bad_checksum'
+
+REJECTION_MESSAGES = {
+    NOT_ONION: 'Not a .onion URL',
+    MALFORMED: 'Malformed onion address',
+    V2_ADDRESS: 'v2 onion addresses were retired in 2021 and can no longer be reached',
+    BAD_CHECKSUM: 'Invalid v3 onion address (checksum mismatch)',
+}
+
+
+@dataclass(frozen=True)
+class OnionURL:
+    """Result of canonicalizing a URL: ``url`` is set only when it is usable"""
+    url: Optional[str]
+    host: str = ''
+    problem: Optional[str] = None
+
+    @property
+    def is_valid(self) -> bool:
+        return self.problem is None
+
+    @property
+    def message(self) -> str:
+        return REJECTION_MESSAGES.get(self.problem, '')
+
+
+def check_onion_host(host: str) -> Optional[str]:
+    """Return a rejection reason for ``host``, or None for a valid v3 address"""
+    host = host.lower().rstrip('.')
+    if not host.endswith('.onion'):
+        return NOT_ONION
+    # Subdomains are allowed; the service address is the label before .onion
+    label = host[:-len('.onion')].rsplit('.', 1)[-1]
+    if _V2_LABEL_RE.match(label):
+        return V2_ADDRESS
+    if len(label) != 56 or not re.fullmatch(r'[a-z2-7]+', label):
+        return MALFORMED
+    if not is_valid_onion_v3(label):
+        return BAD_CHECKSUM
+    return None
+
+
+def normalize_onion_url(url: str) -> Optional[str]:
+    """
+    Canonical spelling of ``url`` without validating the address.
+
+    Returns None when the URL cannot be parsed at all.
+    """
+    url = (url or '').strip()
+    if not url:
+        return None
+    if '://' not in url:
+        url = 'http://' + url
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return None
+    if parts.scheme.lower() not in ('http', 'https') or not parts.hostname:
+        return None
+
+    host = parts.hostname.lower().rstrip('.')
+    netloc = host if port in (None, 80, 443) else f'{host}:{port}'
+
+    path = parts.path or '/'
+    directory, _, last = path.rpartition('/')
+    if last.lower() in DEFAULT_DOCUMENTS:
+        path = directory + '/'
+
+    return urlunsplit(('http', netloc, path, parts.query, ''))
+
+
+def canonicalize_onion_url(url: str) -> OnionURL:
+    """Normalize ``url`` and validate its onion address before any network call"""
+    canonical = normalize_onion_url(url)
+    if canonical is None:
+        return OnionURL(url=None, problem=MALFORMED)
+    host = urlsplit(canonical).hostname or ''
+    problem = check_onion_host(host)
+    if problem:
+        return OnionURL(url=None, host=host, problem=problem)
+    if len(canonical) > 500:
+        return OnionURL(url=None, host=host, problem=MALFORMED)
+    return OnionURL(url=canonical, host=host)
@@ -0,0 +1,93 @@
+"""
+Per-host politeness for concurrent onion fetching.
+
+Onion services are often a single small box behind Tor; hitting one with many
+parallel requests both looks abusive and gets slower answers. HostRateLimiter
+caps concurrent requests per host and spaces out request starts to the same
+host, while leaving different hosts free to run in parallel.
+
+``slot`` blocks the calling thread until the host is free. Schedulers that
+feed a shared pool use ``acquire_nowait``/``release`` instead, so a worker
+is only handed a URL once its host can take it.
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict
+from urllib.parse import urlparse
+
+
+def host_of(url: str) -> str:
+    """Return the lowercased host of ``url`` (scheme optional)."""
+    if '://' not in url:
+        url = 'http://' + url
+    return (urlparse(url).hostname or '').lower()
+
+
+class HostRateLimiter:
+    """
+    Limit concurrency and request rate per host.
+
+    Args:
+        max_per_host: Maximum simultaneous slots held for a single host
+        min_interval: Minimum seconds between two slot grants for the same host
+    """
+
+    def __init__(self, max_per_host: int = 1, min_interval: float = 2.0):
+        self.max_per_host = max(1, max_per_host)
+        self.min_interval = max(0.0, min_interval)
+        self._lock = threading.Lock()
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._next_start: Dict[str, float] = {}
+
+    def _semaphore(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            sem = self._semaphores.get(host)
+            if sem is None:
+                sem = self._semaphores[host] = threading.BoundedSemaphore(self.max_per_host)
+            return sem
+
+    def _reserve_start(self, host: str) -> float:
+        """Reserve the next start time for ``host`` and return how long to wait."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start.get(host, 0.0))
+            self._next_start[host] = start + self.min_interval
+            return start - now
+
+    @contextmanager
+    def slot(self, url: str):
+        """Hold a politeness slot for the host of ``url`` for the duration of the block."""
+        host = host_of(url)
+        sem = self._semaphore(host)
+        with sem:
+            delay = self._reserve_start(host)
+            if delay > 0:
+                time.sleep(delay)
+            yield host
+
+    def acquire_nowait(self, host: str) -> float:
+        """
+        Take a slot for ``host`` if one is free and its start interval has passed.
+
+        Returns 0 when the slot was taken, otherwise the seconds until it is worth
+        asking again (``math.inf`` while the host is at its concurrency cap).
+        """
+        sem = self._semaphore(host)
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_start.get(host, 0.0) - now
+            if wait > 0:
+                return wait
+            if not sem.acquire(blocking=False):
+                return math.inf
+            self._next_start[host] = now + self.min_interval
+            return 0.0
+
+    def release(self, host: str) -> None:
+        """Give back a slot taken with ``acquire_nowait``."""
+        self._semaphore(host).release()
@@ -0,0 +1,188 @@
+"""
+Check ordering by predicted liveness and latency.
+
+A bulk check is bounded by its worker count, so the order links are handed to
+workers decides how soon the first alive result appears. Each link gets a
+predicted probability of being alive and an expected response time from its
+history (LinkStats), its last status and its search source's hit rate; links
+are then checked in order of expected alive results per second.
+
+Links that are probably dead go to a low-priority lane: only a few of them
+are in flight while better candidates wait, so they cannot occupy every
+worker for a full timeout each.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from links.models import LinkStats, OnionLink
+
+from .scheduler import schedule_next
+
+# Recent response times kept per link for the median
+RESPONSE_TIME_WINDOW = 15
+# Weight of the newest response time in the moving average
+EWMA_ALPHA = 0.3
+# Alive probability assumed for a source with no checked links yet
+DEFAULT_SOURCE_HIT_RATE = 0.3
+# Weight (in pseudo-checks) of the source hit rate prior and of the last status
+SOURCE_PRIOR_WEIGHT = 2.0
+LAST_STATUS_WEIGHT = 1.0
+# Links below this alive probability are checked on the low-priority lane
+LOW_PRIORITY_THRESHOLD = 0.15
+
+
+@dataclass
+class Prediction:
+    link: OnionLink
+    alive_probability: float
+    expected_latency: float
+    stats: Optional[LinkStats] = None
+
+    @property
+    def priority(self) -> float:
+        """Expected alive results per second of worker time"""
+        return self.alive_probability / max(self.expected_latency, 0.1)
+
+    @property
+    def low_priority(self) -> bool:
+        return self.alive_probability < LOW_PRIORITY_THRESHOLD
+
+
+def source_hit_rates() -> Dict[Optional[int], float]:
+    """Share of checked links that were alive, per search source"""
+    rows = (
+        OnionLink.objects.filter(last_checked__isnull=False)
+        .values('source_id')
+        .annotate(checked=Count('id'), alive=Count('id', filter=Q(status='alive')))
+    )
+    return {row['source_id']: row['alive'] / row['checked'] for row in rows if row['checked']}
+
+
+def predict(link: OnionLink, stats: Optional[LinkStats], source_rate: float, timeout: float) -> Prediction:
+    """
+    Predict one link's outcome.
+
+    The alive probability is the link's alive/check ratio smoothed towards its
+    source's hit rate, with the last observed status counted once more so a
+    link that just died drops quickly. Expected latency is the median recent
+    response time; a link that is probably dead is expected to cost a timeout.
+    """
+    checks = stats.check_count if stats else 0
+    alive = stats.alive_count if stats else 0
+    if link.last_checked is not None:
+        last_alive = 1.0 if link.status == 'alive' else 0.0
+        probability = (alive + last_alive * LAST_STATUS_WEIGHT + source_rate * SOURCE_PRIOR_WEIGHT) / (
+            checks + LAST_STATUS_WEIGHT + SOURCE_PRIOR_WEIGHT
+        )
+    else:
+        probability = source_rate
+
+    median = stats.median_response_time if stats else None
+    latency = median or link.response_time or timeout / 2
+    # A dead link costs a full timeout, weighted by how likely that is
+    expected_latency = probability * latency + (1 - probability) * timeout
+    return Prediction(link=link, alive_probability=probability, expected_latency=expected_latency, stats=stats)
+
+
+def prioritize(links: Iterable[OnionLink], timeout: float = 30,
+               rates: Optional[Dict[Optional[int], float]] = None,
+               stats: Optional[Dict[int, Optional[LinkStats]]] = None) -> List[Prediction]:
+    """
+    Predictions for ``links``, best candidates first. ``rates``
+    (source_hit_rates()) and ``stats`` (link id -> LinkStats) are loaded
+    when not given; callers prioritizing many batches pass the rates once.
+    """
+    links = list(links)
+    if stats is None:
+        stats = {s.onion_link_id: s for s in LinkStats.objects.filter(onion_link_id__in=[link.id for link in links])}
+    if rates is None:
+        rates = source_hit_rates()
+    predictions = [
+        predict(link, stats.get(link.id), rates.get(link.source_id, DEFAULT_SOURCE_HIT_RATE), timeout)
+        for link in links
+    ]
+    predictions.sort(key=lambda p: p.priority, reverse=True)
+    return predictions
+
+
+class CheckQueue:
+    """
+    Two-lane priority queue for check dispatch.
+
+    The main lane is always served first. The low lane is served when the
+    main lane is empty, or while fewer than ``low_lane_slots`` low-priority
+    checks are in flight (so it makes progress without starving).
+    """
+
+    def __init__(self, predictions: Sequence[Prediction], low_lane_slots: int = 1):
+        self.low_lane_slots = low_lane_slots
+        self._counter = itertools.count()
+        self._main: list = []
+        self._low: list = []
+        for prediction in predictions:
+            self.push(prediction)
+
+    def push(self, prediction: Prediction) -> None:
+        lane = self._low if prediction.low_priority else self._main
+        heapq.heappush(lane, (-prediction.priority, next(self._counter), prediction))
+
+    def pop(self, low_in_flight: int) -> Optional[Prediction]:
+        if self._low and (not self._main or low_in_flight < self.low_lane_slots):
+            return heapq.heappop(self._low)[2]
+        if self._main:
+            return heapq.heappop(self._main)[2]
+        return None
+
+    def __len__(self) -> int:
+        return len(self._main) + len(self._low)
+
+
+def _window(values, value: float) -> list:
+    return (list(values or []) + [round(value, 3)])[-RESPONSE_TIME_WINDOW:]
+
+
+def record_check(link: OnionLink, alive: bool, response_time: Optional[float] = None,
+                 connect: Optional[float] = None, first_byte: Optional[float] = None) -> None:
+    """
+    Add one check outcome to the link's rolling history and rollups, and
+    schedule its next background recheck. For alive checks, ``connect`` and
+    ``first_byte`` (wait after connecting) feed the per-host deadlines in
+    services.timeouts.
+    """
+    stats, _ = LinkStats.objects.get_or_create(onion_link=link)
+    # The interval is computed on this copy; the row is written below
+    stats.check_count += 1
+    stats.dead_streak = 0 if alive else stats.dead_streak + 1
+    fields = ['next_check_at', 'updated_at']
+    if alive:
+        stats.alive_count += 1
+        stats.last_seen_alive = timezone.now()
+        fields.append('last_seen_alive')
+        if response_time is not None:
+            stats.recent_response_times = _window(stats.recent_response_times, response_time)
+            previous = stats.ewma_response_time
+            stats.ewma_response_time = round(
+                response_time if previous is None else EWMA_ALPHA * response_time + (1 - EWMA_ALPHA) * previous, 3)
+            fields += ['recent_response_times', 'ewma_response_time']
+        if connect:
+            stats.recent_connect_times = _window(stats.recent_connect_times, connect)
+            fields.append('recent_connect_times')
+        if first_byte is not None:
+            stats.recent_first_byte_times = _window(stats.recent_first_byte_times, first_byte)
+            fields.append('recent_first_byte_times')
+    schedule_next(stats)
+
+    # Counters as increments, and only the fields set here: search hits, lease renewals
+    # and other checks of this link may have written the row since it was read
+    stats.check_count = F('check_count') + 1
+    stats.alive_count = F('alive_count') + (1 if alive else 0)
+    stats.dead_streak = 0 if alive else F('dead_streak') + 1
+    stats.save(update_fields=['check_count', 'alive_count', 'dead_streak', *fields])
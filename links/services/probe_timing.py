@@ -0,0 +1,125 @@
+"""
+Per-request timing breakdown for link probes.
+
+``requests`` reports only the time until response headers
+(``Response.elapsed``). To split out the connection phase, which over Tor
+covers the SOCKS handshake, circuit building and onion rendezvous, sessions
+mount ``TimedHTTPAdapter``. Its urllib3 connections time ``connect()`` and
+add the result to the ProbeTimer that is active on the calling thread.
+A reused keep-alive connection adds nothing.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Optional
+
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.connection import HTTPConnection, HTTPSConnection
+
+try:
+    from urllib3.contrib.socks import (
+        SOCKSConnection, SOCKSHTTPConnectionPool, SOCKSHTTPSConnection,
+        SOCKSHTTPSConnectionPool, SOCKSProxyManager,
+    )
+except ImportError:  # pragma: no cover - PySocks not installed
+    SOCKSProxyManager = None
+
+_local = threading.local()
+
+
+class ProbeTimer:
+    """Timings of one probe in seconds; use as ``with ProbeTimer() as timer:``"""
+
+    __slots__ = ('connect', 'first_byte', 'total', 'db', '_start', '_previous')
+
+    def __init__(self):
+        self.connect = 0.0
+        self.first_byte: Optional[float] = None
+        self.total = 0.0
+        self.db = 0.0
+
+    def __enter__(self):
+        self._previous = getattr(_local, 'timer', None)
+        _local.timer = self
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.total = time.perf_counter() - self._start
+        _local.timer = self._previous
+        return False
+
+    def as_dict(self):
+        return {'connect': self.connect, 'first_byte': self.first_byte, 'total': self.total, 'db': self.db}
+
+
+def current_timer() -> Optional[ProbeTimer]:
+    return getattr(_local, 'timer', None)
+
+
+class _TimedConnect:
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            timer = getattr(_local, 'timer', None)
+            if timer is not None:
+                timer.connect += time.perf_counter() - start
+
+
+class _TimedHTTPConnection(_TimedConnect, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnect, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+_DIRECT_POOLS = {'http': _TimedHTTPConnectionPool, 'https': _TimedHTTPSConnectionPool}
+
+if SOCKSProxyManager is not None:
+    class _TimedSOCKSConnection(_TimedConnect, SOCKSConnection):
+        pass
+
+    class _TimedSOCKSHTTPSConnection(_TimedConnect, SOCKSHTTPSConnection):
+        pass
+
+    class _TimedSOCKSHTTPConnectionPool(SOCKSHTTPConnectionPool):
+        ConnectionCls = _TimedSOCKSConnection
+
+    class _TimedSOCKSHTTPSConnectionPool(SOCKSHTTPSConnectionPool):
+        ConnectionCls = _TimedSOCKSHTTPSConnection
+
+    _SOCKS_POOLS = {'http': _TimedSOCKSHTTPConnectionPool, 'https': _TimedSOCKSHTTPSConnectionPool}
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose connections report their connect time to the active ProbeTimer"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = _DIRECT_POOLS
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        if SOCKSProxyManager is not None and isinstance(manager, SOCKSProxyManager):
+            manager.pool_classes_by_scheme = _SOCKS_POOLS
+        return manager
+
+
+def mount_timed_adapter(session) -> None:
+    adapter = TimedHTTPAdapter()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
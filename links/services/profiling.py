@@ -0,0 +1,200 @@
+"""
+Opt-in sampling profiler for requests and background jobs.
+
+When PROFILING_ENABLED is off, the middleware removes itself at startup
+(MiddlewareNotUsed), no SQL hook is installed and the job helpers call
+straight through. When it is on, only these runs are profiled:
+
+- a request from a staff user carrying the PROFILING_HEADER header
+- a random PROFILING_SAMPLE_RATE share of requests and jobs
+- a job started by a profiled request
+
+For a profiled run, a sampler thread reads the profiled threads' stacks
+every PROFILING_INTERVAL seconds via ``sys._current_frames``. A job also
+counts threads it starts, such as the checker's worker pool. A Django
+execute wrapper counts the run's SQL queries and their time. The result is
+stored as a RequestProfile: collapsed stacks (``frame;frame;frame count``,
+the input format of flamegraph tools) keyed by the request ID or search ID.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import nullcontext
+from functools import wraps
+from typing import Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Profiles being recorded; replaced (never mutated) so the SQL hook can read it without a lock
+_active: tuple = ()
+_active_lock = threading.Lock()
+_labels: dict = {}
+
+
+def enabled() -> bool:
+    return getattr(settings, 'PROFILING_ENABLED', False)
+
+
+def sampled() -> bool:
+    rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+    return rate > 0 and random.random() < rate
+
+
+def _label(code) -> str:
+    label = _labels.get(code)
+    if label is None:
+        label = _labels[code] = f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+    return label
+
+
+def _stack(frame) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(_label(frame.f_code))
+        frame = frame.f_back
+    labels.reverse()
+    return ';'.join(labels)
+
+
+class Profile:
+    """One profiled request or job; use as a context manager around the work"""
+
+    def __init__(self, kind: str, name: str, key: str, include_new_threads: bool = False):
+        self.kind = kind
+        self.name = name[:200]
+        self.key = key[:64]
+        self.status_code: Optional[int] = None
+        self.interval = getattr(settings, 'PROFILING_INTERVAL', 0.005)
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.sql_queries = 0
+        self.sql_time = 0.0
+        self._owner = threading.get_ident()
+        self._baseline = {t.ident for t in threading.enumerate()} if include_new_threads else None
+        self._sql_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name=f'profiler-{self.key}', daemon=True)
+
+    def owns(self, ident: int) -> bool:
+        if ident == self._owner:
+            return True
+        return self._baseline is not None and ident not in self._baseline and ident != self._sampler.ident
+
+    def add_query(self, seconds: float) -> None:
+        with self._sql_lock:
+            self.sql_queries += 1
+            self.sql_time += seconds
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if self.owns(ident):
+                    self.stacks[_stack(frame)] += 1
+            self.samples += 1
+
+    def __enter__(self):
+        global _active
+        with _active_lock:
+            _active = _active + (self,)
+        self._started = time.perf_counter()
+        self._sampler.start()
+        return self
+
+    def __exit__(self, *exc):
+        global _active
+        self.duration = time.perf_counter() - self._started
+        self._stop.set()
+        self._sampler.join()
+        with _active_lock:
+            _active = tuple(p for p in _active if p is not self)
+        try:
+            self.save()
+        except Exception as e:
+            logger.warning(f"Could not save profile {self.key}: {e}")
+        return False
+
+    def save(self):
+        from links.models import RequestProfile
+
+        top = self.stacks.most_common(getattr(settings, 'PROFILING_MAX_STACKS', 300))
+        profile = RequestProfile.objects.create(
+            key=self.key,
+            kind=self.kind,
+            name=self.name,
+            status_code=self.status_code,
+            duration=self.duration,
+            sql_queries=self.sql_queries,
+            sql_time=self.sql_time,
+            samples=self.samples,
+            interval=self.interval,
+            stacks='\n'.join(f'{stack} {count}' for stack, count in top),
+        )
+        keep = getattr(settings, 'PROFILING_KEEP', 500)
+        stale = list(RequestProfile.objects.order_by('-created_at', '-id').values_list('id', flat=True)[keep:])
+        if stale:
+            RequestProfile.objects.filter(id__in=stale).delete()
+        return profile
+
+
+def sql_hook(execute, sql, params, many, context):
+    """Execute wrapper attributing query time to the profiles owning the current thread"""
+    profiles = _active
+    if not profiles:
+        return execute(sql, params, many, context)
+    ident = threading.get_ident()
+    owners = [p for p in profiles if p.owns(ident)]
+    if not owners:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        for profile in owners:
+            profile.add_query(elapsed)
+
+
+def install_sql_hook(sender, connection, **kwargs):
+    """connection_created receiver; connected only when profiling is enabled"""
+    if sql_hook not in connection.execute_wrappers:
+        connection.execute_wrappers.append(sql_hook)
+
+
+def new_request_key() -> str:
+    return uuid.uuid4().hex
+
+
+def profile_job(name: str, key: str, force: bool = False):
+    """
+    Context manager profiling a background run (and the threads it starts)
+    when profiling is enabled and the run is forced or sampled.
+    """
+    if not enabled() or not (force or sampled()):
+        return nullcontext()
+    return Profile('job', name, key, include_new_threads=True)
+
+
+def profiled_job(name: str):
+    """
+    Decorator for job functions whose first argument identifies the run.
+    Callers may pass ``profile=True`` to force profiling of that call.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, profile=False, **kwargs):
+            if not enabled():
+                return func(*args, **kwargs)
+            with profile_job(name, f'{name}-{args[0]}' if args else name, force=profile):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
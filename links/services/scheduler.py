@@ -0,0 +1,194 @@
+"""
+Background rechecks, so link statuses stay fresh between searches.
+
+Each link has a recheck interval:
+
+    RECHECK_INTERVAL / (popularity factor x volatility factor) x 2^dead streak
+
+clamped to [RECHECK_MIN_INTERVAL, RECHECK_MAX_INTERVAL], where
+
+- popularity is the number of searches that returned the link
+  (LinkStats.search_hits) plus its investigations, on a log scale
+- volatility is 4p(1-p) for the link's alive ratio p: links that flip
+  between alive and dead are rechecked up to twice as often as stable ones
+- the dead streak (consecutive dead checks) backs off links that stay dead,
+  up to 2^RECHECK_MAX_BACKOFF
+
+Every check, whoever runs it, sets LinkStats.next_check_at from that interval
+(prioritizer.record_check), so the schedule lives in the database and
+survives restarts. RecheckScheduler (``manage.py recheck``) loads the due
+links, orders them by staleness (time since the last check over the
+interval, so popular and volatile links come first) and feeds them to the
+checker in small batches, paced by a token bucket at
+RECHECK_BUDGET_PER_MINUTE checks per minute.
+"""
+
+from __future__ import annotations
+
+import heapq
+import logging
+import math
+import threading
+import time
+from datetime import timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from links.models import LinkStats, OnionLink
+
+logger = logging.getLogger(__name__)
+
+# Due links loaded per refill, and how often the queue is rebuilt from the database
+REFILL_LIMIT = 2000
+REFILL_SECONDS = 60.0
+# Sleep when nothing is due
+IDLE_SECONDS = 30.0
+
+
+def recheck_interval(stats: Optional[LinkStats], investigations: int = 0) -> float:
+    """Seconds between checks of a link with these stats; see the module docstring"""
+    base = getattr(settings, 'RECHECK_INTERVAL', 6 * 3600)
+    low = getattr(settings, 'RECHECK_MIN_INTERVAL', 1800)
+    high = getattr(settings, 'RECHECK_MAX_INTERVAL', 7 * 86400)
+    if stats is None:
+        return base
+    popularity = 1 + math.log1p(stats.search_hits + investigations)
+    uptime = stats.uptime
+    volatility = 1 + (4 * uptime * (1 - uptime) if uptime is not None else 0)
+    backoff = 2 ** min(stats.dead_streak, getattr(settings, 'RECHECK_MAX_BACKOFF', 6))
+    return min(high, max(low, base / (popularity * volatility) * backoff))
+
+
+def schedule_next(stats: LinkStats) -> None:
+    """Set ``stats.next_check_at`` after a check (the caller saves)"""
+    stats.next_check_at = timezone.now() + timedelta(seconds=recheck_interval(stats))
+
+
+def record_search_hits(links: Iterable[OnionLink]) -> None:
+    """Count one search hit for each of ``links``"""
+    ids = [link.id for link in links]
+    if not ids:
+        return
+    LinkStats.objects.bulk_create([LinkStats(onion_link_id=link_id) for link_id in ids], ignore_conflicts=True)
+    LinkStats.objects.filter(onion_link_id__in=ids).update(search_hits=F('search_hits') + 1)
+
+
+def reschedule_unchecked(batch: List[OnionLink]) -> None:
+    """Move links a batch didn't probe (mirrors, skipped, failed writes) to their next slot"""
+    now = timezone.now()
+    ids = [link.id for link in batch]
+    LinkStats.objects.bulk_create([LinkStats(onion_link_id=link_id) for link_id in ids], ignore_conflicts=True)
+    stale = list(LinkStats.objects.filter(
+        Q(next_check_at__isnull=True) | Q(next_check_at__lte=now), onion_link_id__in=ids,
+    ))
+    for stats in stale:
+        schedule_next(stats)
+    LinkStats.objects.bulk_update(stale, ['next_check_at'])
+
+
+def due_links(limit: int = REFILL_LIMIT) -> List[Tuple[float, OnionLink]]:
+    """(staleness, link) for links due for a check, most overdue first by schedule"""
+    now = timezone.now()
+    links = (
+        OnionLink.objects
+        .filter(Q(stats__isnull=True) | Q(stats__next_check_at__isnull=True) | Q(stats__next_check_at__lte=now))
+        .exclude(stats__lease_expires_at__gt=now)
+        .select_related('stats')
+        .annotate(investigation_count=Count('investigations'))
+        .order_by(F('stats__next_check_at').asc(nulls_first=True))[:limit]
+    )
+    due = []
+    for link in links:
+        stats = getattr(link, 'stats', None)
+        if link.last_checked is None:
+            staleness = math.inf
+        else:
+            interval = recheck_interval(stats, link.investigation_count)
+            staleness = (now - link.last_checked).total_seconds() / interval
+        due.append((staleness, link))
+    return due
+
+
+class TokenBucket:
+    """``rate`` tokens per minute, at most ``burst`` saved up"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate / 60.0
+        self.burst = max(1.0, burst)
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def take(self, most: int, stop: threading.Event) -> int:
+        """Wait for at least one token, then take up to ``most``; 0 if stopped"""
+        while not stop.is_set():
+            self._refill()
+            if self._tokens >= 1:
+                taken = min(most, int(self._tokens))
+                self._tokens -= taken
+                return taken
+            stop.wait((1 - self._tokens) / self.rate)
+        return 0
+
+
+class RecheckScheduler:
+    """Feed due links to ``checker`` within the Tor budget; see the module docstring"""
+
+    def __init__(self, checker, budget: Optional[float] = None, workers: int = 4):
+        self.checker = checker
+        self.budget = budget or getattr(settings, 'RECHECK_BUDGET_PER_MINUTE', 30)
+        self.workers = workers
+        # Ten seconds' worth per batch: small, evenly spaced batches instead of bursts
+        self.bucket = TokenBucket(self.budget, burst=self.budget / 6)
+        self.stop_event = threading.Event()
+        self.checked = 0
+        self._heap: list = []
+        self._refilled = 0.0
+
+    def stop(self) -> None:
+        self.stop_event.set()
+
+    def refill(self) -> int:
+        self._heap = [(-staleness, link.id, link) for staleness, link in due_links()]
+        heapq.heapify(self._heap)
+        self._refilled = time.monotonic()
+        return len(self._heap)
+
+    def next_batch(self, size: int) -> List[OnionLink]:
+        return [heapq.heappop(self._heap)[2] for _ in range(min(size, len(self._heap)))]
+
+    def run_once(self) -> int:
+        """Check one batch when the budget allows; returns links checked (0 if nothing was due)"""
+        if not self._heap or time.monotonic() - self._refilled > REFILL_SECONDS:
+            if not self.refill():
+                return 0
+        size = self.bucket.take(max(1, math.ceil(self.budget / 6)), self.stop_event)
+        batch = self.next_batch(size)
+        if not batch:
+            return 0
+        try:
+            self.checker.check_links_bulk(batch, max_workers=min(self.workers, len(batch)), collapse_mirrors=True)
+        finally:
+            reschedule_unchecked(batch)
+        self.checked += len(batch)
+        return len(batch)
+
+    def run(self, max_checks: Optional[int] = None) -> int:
+        """Run until stop() (or ``max_checks`` links); returns links checked"""
+        while not self.stop_event.is_set():
+            if max_checks is not None and self.checked >= max_checks:
+                break
+            try:
+                if not self.run_once():
+                    self.stop_event.wait(IDLE_SECONDS)
+            except Exception as e:
+                logger.exception(f"Recheck batch failed: {e}")
+                self.stop_event.wait(IDLE_SECONDS)
+        return self.checked
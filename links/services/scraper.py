@@ -1,6 +1,12 @@
 import requests
 from bs4 import BeautifulSoup
+import logging
 import time
+from .metrics import SCRAPE_ERRORS, SCRAPE_SECONDS, SCRAPED_LINKS
+from .onion_url import canonicalize_onion_url
+from .tor_service import configured_socks_port
+
+logger = logging.getLogger(__name__)
 
 
 class OnionSearchScraper:
@@ -13,9 +19,10 @@ class OnionSearchScraper:
         self.timeout = timeout
         self.session = requests.Session()
         # Configure SOCKS5 proxy for Tor
+        port = configured_socks_port()
         self.session.proxies = {
-            'http': 'socks5h://127.0.0.1:9150',
-            'https': 'socks5h://127.0.0.1:9150',
+            'http': f'socks5h://127.0.0.1:{port}',
+            'https': f'socks5h://127.0.0.1:{port}',
         }
         # Add User-Agent header to mimic a real browser
         self.session.headers.update({
@@ -40,6 +47,7 @@ class OnionSearchScraper:
             list: List of dictionaries with url, title, description
         """
         search_url = source.search_url_pattern.replace('{query}', keyword)
+        started = time.perf_counter()
 
         try:
             response = self.session.get(search_url, timeout=self.timeout)
@@ -62,13 +70,36 @@ class OnionSearchScraper:
             else:
                 links = self._parse_generic(soup, source)
 
+            links = self._canonicalize(links, source)
+            SCRAPE_SECONDS.labels(source=source.name).observe(time.perf_counter() - started)
+            SCRAPED_LINKS.labels(source=source.name).inc(len(links))
             time.sleep(1)  # Be polite to the server
             return links
 
         except Exception as e:
+            SCRAPE_ERRORS.labels(source=source.name).inc()
             print(f"Error scraping {source.name}: {str(e)}")
             return []
 
+    def _canonicalize(self, links, source):
+        """Canonicalize result URLs, dropping duplicates and unreachable addresses"""
+        canonical_links = []
+        seen = set()
+        rejected = 0
+        for link in links:
+            onion = canonicalize_onion_url(link['url'])
+            if not onion.is_valid:
+                rejected += 1
+                continue
+            if onion.url in seen:
+                continue
+            seen.add(onion.url)
+            link['url'] = onion.url
+            canonical_links.append(link)
+        if rejected:
+            logger.info(f"{source.name}: dropped {rejected} invalid or v2 onion URL(s)")
+        return canonical_links
+
     def _parse_ahmia(self, soup, source):
         """Parse Ahmia search results"""
         links = []
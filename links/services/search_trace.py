@@ -0,0 +1,123 @@
+"""
+Per-search pipeline traces.
+
+A SearchTracer follows one progressive search through the pipeline:
+
+- the scrape of each source (duration, result count, error)
+- ingest of the scraped links into OnionLink
+- each link check (queue wait, connect, first byte, total, DB writes, outcome)
+- the trace's own writes to the database
+
+Spans are kept as rows of integer milliseconds since the search started,
+with one shared field list per kind. A search with a few hundred links takes
+a few KB. ``expand`` turns the rows into the keyed objects served as JSON.
+
+The trace is written at most every FLUSH_INTERVAL seconds while checks run,
+and once more when the search finishes. A failed write is logged and never
+affects the search itself.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Optional
+
+from django.utils import timezone
+
+from links.models import SearchTrace
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 2.0
+
+SOURCE_FIELDS = ['source', 'start', 'duration', 'results', 'error']
+INGEST_FIELDS = ['start', 'duration', 'links']
+PROBE_FIELDS = ['link_id', 'url', 'queued', 'start', 'connect', 'first_byte', 'total', 'db', 'outcome']
+FLUSH_FIELDS = ['start', 'duration']
+
+
+def _ms(seconds: Optional[float]) -> Optional[int]:
+    return None if seconds is None else int(round(seconds * 1000))
+
+
+class SearchTracer:
+    """Collects the spans of one search; safe to call from checker threads"""
+
+    def __init__(self, search_id: str, keyword: str):
+        self.search_id = search_id
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+        self._data = {'sources': [], 'ingest': None, 'probes': [], 'flushes': []}
+        self._trace = SearchTrace(search_id=search_id, keyword=keyword[:255], data=self._data)
+
+    def _offset(self, at: float) -> int:
+        return _ms(at - self._t0)
+
+    def source(self, name: str, started: float, results: int, error: str = '') -> None:
+        """Record a finished scrape; ``started`` is a ``time.perf_counter()`` value"""
+        row = [name, self._offset(started), _ms(time.perf_counter() - started), results, error[:200]]
+        with self._lock:
+            self._data['sources'].append(row)
+
+    def ingest(self, started: float, links: int) -> None:
+        row = [self._offset(started), _ms(time.perf_counter() - started), links]
+        with self._lock:
+            self._data['ingest'] = row
+
+    def probe(self, link_id: int, url: str, queued: float, started: float,
+              timings: Optional[dict], outcome: str) -> None:
+        """Record one link check; ``queued`` and ``started`` are ``time.perf_counter()`` values"""
+        timings = timings or {}
+        row = [
+            link_id, url, self._offset(queued), self._offset(started),
+            _ms(timings.get('connect')), _ms(timings.get('first_byte')),
+            _ms(timings.get('total', time.perf_counter() - started)), _ms(timings.get('db')), outcome,
+        ]
+        with self._lock:
+            self._data['probes'].append(row)
+
+    def flush(self, final: bool = False) -> None:
+        """Persist the trace; between checks this is throttled to once per FLUSH_INTERVAL"""
+        now = time.perf_counter()
+        with self._lock:
+            if not final and now - self._last_flush < FLUSH_INTERVAL:
+                return
+            self._last_flush = now
+            data = {key: (list(value) if isinstance(value, list) else value) for key, value in self._data.items()}
+        try:
+            self._trace.data = data
+            if final:
+                self._trace.finished_at = timezone.now()
+            self._trace.save()
+        except Exception as e:
+            logger.warning(f"Could not save trace of search {self.search_id}: {e}")
+            return
+        # A flush shows up in the next flush (the last one is only in the logs)
+        row = [self._offset(now), _ms(time.perf_counter() - now)]
+        with self._lock:
+            self._data['flushes'].append(row)
+
+
+def _rows(fields, rows):
+    return [dict(zip(fields, row)) for row in rows or []]
+
+
+def expand(trace: SearchTrace) -> dict:
+    """The trace with every row turned into a keyed object"""
+    data = trace.data or {}
+    ingest = data.get('ingest')
+    return {
+        'search_id': trace.search_id,
+        'keyword': trace.keyword,
+        'started_at': trace.started_at.isoformat(),
+        'finished_at': trace.finished_at.isoformat() if trace.finished_at else None,
+        'complete': trace.finished_at is not None,
+        'units': 'ms since search start',
+        'sources': _rows(SOURCE_FIELDS, data.get('sources')),
+        'ingest': dict(zip(INGEST_FIELDS, ingest)) if ingest else None,
+        'probes': _rows(PROBE_FIELDS, data.get('probes')),
+        'flushes': _rows(FLUSH_FIELDS, data.get('flushes')),
+    }
@@ -0,0 +1,731 @@
+"""
+State shared by every worker process: search progress, single-flight locks
+and the sandbox resource cache.
+
+A search's checks run on a thread in the worker that took the POST, while
+its progress polls land on any worker, possibly on another node. The
+default LocMemCache is per process (and evicts under load), so this state
+lives in a backend chosen by SHARED_STATE_URL:
+
+- ``sqlite:///path/to/file``: one SQLite file (WAL) for all processes on
+  one box; the default, next to the database
+- ``redis://[:password@]host:6379/0``: any Redis-protocol server, for
+  several nodes (spoken directly, no client library needed)
+- ``memory://``: this process only, for development and tests
+
+Keys are namespaced ``SHARED_STATE_PREFIX:namespace:name`` and every entry
+has a TTL, restarted by each write. The SQLite and memory backends keep
+entries within SHARED_STATE_MAX_BYTES: expired entries go first, then
+cached bytes (the resource cache) before state, soonest to expire first. On Redis, set
+``maxmemory`` with the ``volatile-ttl`` policy for the same effect.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .metrics import RESOURCE_CACHE, SHARED_STATE_BYTES
+
+logger = logging.getLogger(__name__)
+
+# Seconds between expiry and size sweeps of the SQLite and memory backends
+SWEEP_SECONDS = 30.0
+# Entry kinds (SQLite and memory backends)
+VALUE, COUNTER, LIST, BYTES = 'value', 'counter', 'list', 'bytes'
+
+
+def _dumps(value: Any) -> bytes:
+    return json.dumps(value, separators=(',', ':')).encode()
+
+
+def _loads(data: Optional[bytes]) -> Any:
+    return None if data is None else json.loads(data)
+
+
+class SharedState:
+    """
+    Backend interface. Values are JSON-serializable (bytes for get_bytes /
+    set_bytes); ``ttl`` is in seconds. Keys are full keys (see namespace()).
+    """
+
+    url = ''
+
+    def __init__(self, prefix: str = 'darkweb', max_bytes: int = 256 * 1024 * 1024):
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+
+    def namespace(self, *parts: str) -> 'Namespace':
+        return Namespace(self, ':'.join((self.prefix,) + parts))
+
+    def get(self, key: str, default: Any = None) -> Any:
+        raise NotImplementedError
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Values of the ``keys`` that exist"""
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        raise NotImplementedError
+
+    def add(self, key: str, value: Any, ttl: float) -> bool:
+        """Set ``key`` only if it doesn't exist; True if it was set"""
+        raise NotImplementedError
+
+    def delete(self, *keys: str) -> None:
+        raise NotImplementedError
+
+    def incr(self, key: str, amount: int = 1, ttl: float = 3600) -> int:
+        """Add to a counter (created at 0), returning the new value"""
+        raise NotImplementedError
+
+    def push(self, key: str, value: Any, ttl: float = 3600) -> None:
+        """Append to a list (created empty)"""
+        raise NotImplementedError
+
+    def get_list(self, key: str) -> List[Any]:
+        raise NotImplementedError
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set_bytes(self, key: str, data: bytes, ttl: float) -> None:
+        raise NotImplementedError
+
+    def usage(self) -> Dict[str, Any]:
+        """Entry count and size, for the memory accounting gauge and admins"""
+        return {}
+
+
+class Namespace:
+    """Key prefix over a backend: ``state.namespace('search', id).get('total')``"""
+
+    def __init__(self, state: SharedState, prefix: str):
+        self.state = state
+        self.prefix = prefix
+
+    def key(self, name: str) -> str:
+        return f'{self.prefix}:{name}'
+
+    def get(self, name, default=None):
+        return self.state.get(self.key(name), default)
+
+    def get_many(self, names: Iterable[str]) -> Dict[str, Any]:
+        keys = {self.key(name): name for name in names}
+        return {keys[key]: value for key, value in self.state.get_many(keys).items()}
+
+    def set(self, name, value, ttl):
+        self.state.set(self.key(name), value, ttl)
+
+    def add(self, name, value, ttl) -> bool:
+        return self.state.add(self.key(name), value, ttl)
+
+    def delete(self, *names):
+        self.state.delete(*(self.key(name) for name in names))
+
+    def incr(self, name, amount=1, ttl=3600) -> int:
+        return self.state.incr(self.key(name), amount, ttl)
+
+    def push(self, name, value, ttl=3600):
+        self.state.push(self.key(name), value, ttl)
+
+    def get_list(self, name) -> List[Any]:
+        return self.state.get_list(self.key(name))
+
+    def get_bytes(self, name) -> Optional[bytes]:
+        return self.state.get_bytes(self.key(name))
+
+    def set_bytes(self, name, data, ttl):
+        self.state.set_bytes(self.key(name), data, ttl)
+
+
+class MemoryState(SharedState):
+    """In-process backend (not shared between workers)"""
+
+    url = 'memory://'
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._entries: Dict[str, Tuple[str, Any, int, float]] = {}  # key -> (kind, value, size, expires)
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._swept = time.monotonic()
+
+    def _live(self, key: str) -> Optional[Tuple[str, Any, int, float]]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[3] <= time.time():
+            self._drop(key)
+            return None
+        return entry
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def _put(self, key: str, kind: str, value: Any, size: int, ttl: float) -> None:
+        self._drop(key)
+        self._entries[key] = (kind, value, size, time.time() + ttl)
+        self._bytes += size
+        if self._bytes > self.max_bytes or time.monotonic() - self._swept > SWEEP_SECONDS:
+            self._sweep()
+
+    def _sweep(self) -> None:
+        now = time.time()
+        for key in [key for key, entry in self._entries.items() if entry[3] <= now]:
+            self._drop(key)
+        if self._bytes > self.max_bytes:
+            for key, _ in sorted(self._entries.items(), key=lambda item: (item[1][0] != BYTES, item[1][3])):
+                self._drop(key)
+                if self._bytes <= self.max_bytes:
+                    break
+        self._swept = time.monotonic()
+        SHARED_STATE_BYTES.set(self._bytes)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._live(key)
+            if entry is None or entry[0] == BYTES:
+                return default
+            if entry[0] == VALUE:
+                return _loads(entry[1])
+            return list(entry[1]) if entry[0] == LIST else entry[1]
+
+    def get_many(self, keys):
+        missing = object()
+        with self._lock:
+            values = {key: self.get(key, missing) for key in keys}
+        return {key: value for key, value in values.items() if value is not missing}
+
+    def set(self, key, value, ttl):
+        data = _dumps(value)
+        with self._lock:
+            if isinstance(value, list):
+                self._put(key, LIST, _loads(data), len(key) + len(data), ttl)
+            else:
+                self._put(key, VALUE, data, len(key) + len(data), ttl)
+
+    def add(self, key, value, ttl):
+        with self._lock:
+            if self._live(key) is not None:
+                return False
+            self.set(key, value, ttl)
+            return True
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._drop(key)
+
+    def incr(self, key, amount=1, ttl=3600):
+        with self._lock:
+            entry = self._live(key)
+            value = (entry[1] if entry is not None and entry[0] == COUNTER else 0) + amount
+            self._put(key, COUNTER, value, len(key) + 8, ttl)
+            return value
+
+    def push(self, key, value, ttl=3600):
+        data = _dumps(value)
+        with self._lock:
+            entry = self._live(key)
+            items = entry[1] if entry is not None and entry[0] == LIST else []
+            size = entry[2] if entry is not None and entry[0] == LIST else len(key)
+            items.append(_loads(data))
+            self._put(key, LIST, items, size + len(data), ttl)
+
+    def get_list(self, key):
+        value = self.get(key)
+        return value if isinstance(value, list) else []
+
+    def get_bytes(self, key):
+        with self._lock:
+            entry = self._live(key)
+            return entry[1] if entry is not None and entry[0] == BYTES else None
+
+    def set_bytes(self, key, data, ttl):
+        with self._lock:
+            self._put(key, BYTES, bytes(data), len(key) + len(data), ttl)
+
+    def usage(self):
+        with self._lock:
+            return {'backend': 'memory', 'entries': len(self._entries), 'bytes': self._bytes,
+                    'max_bytes': self.max_bytes}
+
+
+class _Immediate:
+    """``with`` block running in a BEGIN IMMEDIATE transaction (write lock taken up front)"""
+
+    def __init__(self, db: sqlite3.Connection):
+        self.db = db
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.db.execute('BEGIN IMMEDIATE')
+        return self.db
+
+    def __exit__(self, exc_type, *exc):
+        self.db.execute('ROLLBACK' if exc_type else 'COMMIT')
+
+
+class SQLiteState(SharedState):
+    """
+    One SQLite file shared by the processes of one box. Each thread has its
+    own connection; writes that read first run in BEGIN IMMEDIATE
+    transactions, so concurrent workers serialize instead of losing updates.
+    """
+
+    def __init__(self, path: Path, **kwargs):
+        super().__init__(**kwargs)
+        self.path = Path(path)
+        self._local = threading.local()
+        self._swept = 0.0
+        self._sweep_lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connection() as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, kind TEXT NOT NULL, value BLOB, '
+                'size INTEGER NOT NULL, expires_at REAL NOT NULL)'
+            )
+            db.execute('CREATE INDEX IF NOT EXISTS entries_expires ON entries (expires_at)')
+
+    def _connection(self) -> sqlite3.Connection:
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+        return db
+
+    def _write(self):
+        return _Immediate(self._connection())
+
+    def _row(self, db, key: str):
+        return db.execute('SELECT kind, value FROM entries WHERE key = ? AND expires_at > ?',
+                          (key, time.time())).fetchone()
+
+    def _put(self, db, key: str, kind: str, value, size: int, expires_at: float) -> None:
+        db.execute('INSERT OR REPLACE INTO entries (key, kind, value, size, expires_at) VALUES (?, ?, ?, ?, ?)',
+                   (key, kind, value, size, expires_at))
+
+    def _maybe_sweep(self) -> None:
+        if time.monotonic() - self._swept < SWEEP_SECONDS or not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            self._swept = time.monotonic()
+            self.sweep()
+        except sqlite3.Error as e:
+            logger.warning(f"Shared state sweep failed: {e}")
+        finally:
+            self._sweep_lock.release()
+
+    def sweep(self) -> int:
+        """Drop expired entries, then evict down to max_bytes; returns the bytes held"""
+        with self._write() as db:
+            db.execute('DELETE FROM entries WHERE expires_at <= ?', (time.time(),))
+            total = db.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+            if total > self.max_bytes:
+                evict = []
+                excess = total - self.max_bytes
+                rows = db.execute("SELECT key, size FROM entries ORDER BY kind != 'bytes', expires_at")
+                for key, size in rows:
+                    if excess <= 0:
+                        break
+                    evict.append((key,))
+                    excess -= size
+                db.executemany('DELETE FROM entries WHERE key = ?', evict)
+                total = self.max_bytes + excess
+        SHARED_STATE_BYTES.set(total)
+        return total
+
+    def get(self, key, default=None):
+        row = self._row(self._connection(), key)
+        if row is None or row[0] == BYTES:
+            return default
+        if row[0] == COUNTER:
+            return int(row[1])
+        return _loads(row[1])
+
+    def get_many(self, keys):
+        keys = list(keys)
+        if not keys:
+            return {}
+        marks = ','.join('?' * len(keys))
+        rows = self._connection().execute(
+            f'SELECT key, kind, value FROM entries WHERE key IN ({marks}) AND expires_at > ?', (*keys, time.time()),
+        ).fetchall()
+        return {key: int(value) if kind == COUNTER else _loads(value) for key, kind, value in rows if kind != BYTES}
+
+    def set(self, key, value, ttl):
+        data = _dumps(value)
+        kind = LIST if isinstance(value, list) else VALUE
+        self._connection().execute(
+            'INSERT OR REPLACE INTO entries (key, kind, value, size, expires_at) VALUES (?, ?, ?, ?, ?)',
+            (key, kind, data, len(key) + len(data), time.time() + ttl),
+        )
+        self._maybe_sweep()
+
+    def add(self, key, value, ttl):
+        data = _dumps(value)
+        with self._write() as db:
+            if self._row(db, key) is not None:
+                return False
+            self._put(db, key, VALUE, data, len(key) + len(data), time.time() + ttl)
+        return True
+
+    def delete(self, *keys):
+        self._connection().executemany('DELETE FROM entries WHERE key = ?', [(key,) for key in keys])
+
+    def incr(self, key, amount=1, ttl=3600):
+        with self._write() as db:
+            row = self._row(db, key)
+            value = (int(row[1]) if row is not None and row[0] == COUNTER else 0) + amount
+            self._put(db, key, COUNTER, value, len(key) + 8, time.time() + ttl)
+        return value
+
+    def push(self, key, value, ttl=3600):
+        with self._write() as db:
+            row = self._row(db, key)
+            items = _loads(row[1]) if row is not None and row[0] == LIST else []
+            items.append(value)
+            data = _dumps(items)
+            self._put(db, key, LIST, data, len(key) + len(data), time.time() + ttl)
+
+    def get_list(self, key):
+        value = self.get(key)
+        return value if isinstance(value, list) else []
+
+    def get_bytes(self, key):
+        row = self._row(self._connection(), key)
+        return bytes(row[1]) if row is not None and row[0] == BYTES else None
+
+    def set_bytes(self, key, data, ttl):
+        self._connection().execute(
+            'INSERT OR REPLACE INTO entries (key, kind, value, size, expires_at) VALUES (?, ?, ?, ?, ?)',
+            (key, BYTES, sqlite3.Binary(data), len(key) + len(data), time.time() + ttl),
+        )
+        self._maybe_sweep()
+
+    def usage(self):
+        entries, size = self._connection().execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries WHERE expires_at > ?', (time.time(),),
+        ).fetchone()
+        return {'backend': 'sqlite', 'path': str(self.path), 'entries': entries, 'bytes': size,
+                'max_bytes': self.max_bytes}
+
+
+class RedisError(Exception):
+    pass
+
+
+class _RespConnection:
+    """One RESP2 connection: commands are sent as arrays of bulk strings"""
+
+    def __init__(self, host: str, port: int, password: Optional[str], db: int, timeout: float):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.file = self.sock.makefile('rb')
+        if password:
+            self.call('AUTH', password)
+        if db:
+            self.call('SELECT', db)
+
+    def close(self) -> None:
+        try:
+            self.file.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+    def send(self, *commands: Tuple) -> None:
+        out = bytearray()
+        for command in commands:
+            out += b'*%d\r\n' % len(command)
+            for arg in command:
+                arg = arg if isinstance(arg, bytes) else str(arg).encode()
+                out += b'$%d\r\n%s\r\n' % (len(arg), arg)
+        self.sock.sendall(out)
+
+    def read(self) -> Any:
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError('Redis closed the connection')
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest.decode()
+        if kind == b'-':
+            raise RedisError(rest.decode())
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self.file.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            length = int(rest)
+            return None if length < 0 else [self.read() for _ in range(length)]
+        raise RedisError(f'Unexpected reply: {line[:40]!r}')
+
+    def call(self, *args) -> Any:
+        self.send(args)
+        return self.read()
+
+    def pipeline(self, *commands: Tuple) -> List[Any]:
+        self.send(*commands)
+        return [self.read() for _ in commands]
+
+
+class RedisState(SharedState):
+    """
+    Redis-protocol backend for several nodes. One connection per thread;
+    a command that fails on a dropped connection is retried once on a new
+    one. Counters use INCRBY, lists RPUSH, locks SET NX, all with PX TTLs.
+    """
+
+    def __init__(self, url: str, timeout: float = 5.0, **kwargs):
+        super().__init__(**kwargs)
+        parts = urlparse(url)
+        self.url = url
+        self.host = parts.hostname or 'localhost'
+        self.port = parts.port or 6379
+        self.password = unquote(parts.password) if parts.password else None
+        self.db = int(parts.path.lstrip('/') or 0)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _run(self, *commands: Tuple) -> List[Any]:
+        for attempt in range(2):
+            connection = getattr(self._local, 'connection', None)
+            try:
+                if connection is None:
+                    connection = self._local.connection = _RespConnection(
+                        self.host, self.port, self.password, self.db, self.timeout)
+                return connection.pipeline(*commands)
+            except (OSError, ConnectionError):
+                if connection is not None:
+                    connection.close()
+                self._local.connection = None
+                if attempt:
+                    raise
+        return []
+
+    @staticmethod
+    def _ms(ttl: float) -> int:
+        return max(1, int(ttl * 1000))
+
+    def get(self, key, default=None):
+        data = self._run(('GET', key))[0]
+        return default if data is None else _loads(data)
+
+    def get_many(self, keys):
+        keys = list(keys)
+        if not keys:
+            return {}
+        values = self._run(('MGET', *keys))[0]
+        return {key: _loads(data) for key, data in zip(keys, values) if data is not None}
+
+    def set(self, key, value, ttl):
+        self._run(('SET', key, _dumps(value), 'PX', self._ms(ttl)))
+
+    def add(self, key, value, ttl):
+        return self._run(('SET', key, _dumps(value), 'NX', 'PX', self._ms(ttl)))[0] is not None
+
+    def delete(self, *keys):
+        if keys:
+            self._run(('DEL', *keys))
+
+    def incr(self, key, amount=1, ttl=3600):
+        value, _ = self._run(('INCRBY', key, amount), ('PEXPIRE', key, self._ms(ttl)))
+        return value
+
+    def push(self, key, value, ttl=3600):
+        self._run(('RPUSH', key, _dumps(value)), ('PEXPIRE', key, self._ms(ttl)))
+
+    def get_list(self, key):
+        try:
+            items = self._run(('LRANGE', key, 0, -1))[0]
+        except RedisError:
+            # A list set whole with set() is a JSON string, not a Redis list
+            return self.get(key) or []
+        return [_loads(item) for item in items or []]
+
+    def get_bytes(self, key):
+        return self._run(('GET', key))[0]
+
+    def set_bytes(self, key, data, ttl):
+        self._run(('SET', key, bytes(data), 'PX', self._ms(ttl)))
+
+    def usage(self):
+        info = self._run(('INFO', 'memory'))[0].decode()
+        fields = dict(line.split(':', 1) for line in info.splitlines() if ':' in line)
+        used = int(fields.get('used_memory', 0))
+        SHARED_STATE_BYTES.set(used)
+        return {'backend': 'redis', 'url': f'redis://{self.host}:{self.port}/{self.db}', 'bytes': used,
+                'max_bytes': int(fields.get('maxmemory', 0)), 'policy': fields.get('maxmemory_policy', '')}
+
+
+def open_shared_state(url: str, prefix: str = 'darkweb', max_bytes: int = 256 * 1024 * 1024) -> SharedState:
+    """Backend for ``url`` (see the module docstring)"""
+    scheme = urlparse(url).scheme
+    if scheme == 'sqlite':
+        state = SQLiteState(Path(unquote(url[len('sqlite://'):])), prefix=prefix, max_bytes=max_bytes)
+    elif scheme == 'redis':
+        state = RedisState(url, prefix=prefix, max_bytes=max_bytes)
+    elif scheme == 'memory':
+        state = MemoryState(prefix=prefix, max_bytes=max_bytes)
+    else:
+        raise ValueError(f'Unsupported SHARED_STATE_URL (sqlite://, redis:// or memory://): {url}')
+    state.url = url
+    return state
+
+
+_state: Optional[SharedState] = None
+_state_lock = threading.Lock()
+
+
+def get_shared_state() -> SharedState:
+    """Get the global shared state backend configured from settings"""
+    global _state
+    url = getattr(settings, 'SHARED_STATE_URL', 'memory://')
+    if _state is None or _state.url != url:
+        with _state_lock:
+            if _state is None or _state.url != url:
+                _state = open_shared_state(
+                    url,
+                    prefix=getattr(settings, 'SHARED_STATE_PREFIX', 'darkweb'),
+                    max_bytes=getattr(settings, 'SHARED_STATE_MAX_BYTES', 256 * 1024 * 1024),
+                )
+    return _state
+
+
+class SearchProgress:
+    """Progress of one search's link checks, readable from any worker"""
+
+    FIELDS = ('total', 'checked', 'skipped', 'complete')
+
+    def __init__(self, search_id: str, state: Optional[SharedState] = None):
+        self.ttl = getattr(settings, 'SEARCH_PROGRESS_TTL', 3600)
+        self.ns = (state or get_shared_state()).namespace('search', search_id)
+
+    def start(self, total: int) -> None:
+        self.ns.delete('alive', 'checked', 'skipped')
+        self.ns.set('total', total, self.ttl)
+        self.ns.set('complete', False, self.ttl)
+        self.ns.incr('checked', 0, self.ttl)
+        self.ns.incr('skipped', 0, self.ttl)
+
+    def record(self, status: str, alive_link: Optional[dict] = None) -> None:
+        """Count one result; ``alive_link`` is the row shown for an alive one"""
+        if status == 'skipped':
+            self.ns.incr('skipped', 1, self.ttl)
+        if alive_link is not None:
+            self.ns.push('alive', alive_link, self.ttl)
+        # Last, so a poll never sees a result counted before its row is there
+        self.ns.incr('checked', 1, self.ttl)
+
+    def finish(self) -> None:
+        self.ns.set('complete', True, self.ttl)
+
+    def total(self) -> int:
+        return self.ns.get('total', 0)
+
+    def snapshot(self) -> dict:
+        values = self.ns.get_many(self.FIELDS)
+        return {
+            'total': values.get('total', 0),
+            'checked': values.get('checked', 0),
+            'skipped': values.get('skipped', 0),
+            'complete': values.get('complete', False),
+            'alive': self.ns.get_list('alive'),
+        }
+
+
+class ResourceCache:
+    """
+    Sandbox resources (CSS, images, scripts) shared across workers, with
+    single-flight: when several workers miss on the same URL, one fetches
+    it (the leader, holding a lock key) and the others wait for its entry
+    instead of each making a Tor request.
+    """
+
+    def __init__(self, state: Optional[SharedState] = None):
+        self.ttl = getattr(settings, 'RESOURCE_CACHE_TTL', 3600)
+        self.max_item_bytes = getattr(settings, 'RESOURCE_CACHE_MAX_ITEM_BYTES', 2 * 1024 * 1024)
+        self.wait_seconds = getattr(settings, 'RESOURCE_SINGLE_FLIGHT_WAIT', 30)
+        self.ns = (state or get_shared_state()).namespace('resource')
+
+    @staticmethod
+    def _name(url: str) -> str:
+        return uuid.uuid5(uuid.NAMESPACE_URL, url).hex
+
+    def get(self, url: str) -> Optional[Tuple[str, bytes]]:
+        """(content type, body) of a cached resource, or None"""
+        data = self.ns.get_bytes(self._name(url))
+        if data is None:
+            return None
+        content_type, _, body = data.partition(b'\n')
+        return content_type.decode(), body
+
+    def put(self, url: str, content_type: str, body: bytes) -> bool:
+        if len(body) > self.max_item_bytes:
+            return False
+        self.ns.set_bytes(self._name(url), content_type.encode() + b'\n' + body, self.ttl)
+        return True
+
+    def lead(self, url: str) -> bool:
+        """Take the fetch of ``url``; False if another worker is fetching it"""
+        return self.ns.add(f'{self._name(url)}:lock', 1, self.wait_seconds)
+
+    def done(self, url: str) -> None:
+        self.ns.delete(f'{self._name(url)}:lock')
+
+    def finish(self, url: str, content_type: str, body: Optional[bytes], leader: bool) -> None:
+        """After a fetch: cache ``body`` (None if it failed), and let waiters go if this was the leader"""
+        try:
+            if body is not None:
+                self.put(url, content_type, body)
+        finally:
+            if leader:
+                self.done(url)
+
+    def fetching(self, url: str) -> bool:
+        return self.ns.get(f'{self._name(url)}:lock') is not None
+
+    async def aget_or_lead(self, url: str, poll: float = 0.1) -> Tuple[Optional[Tuple[str, bytes]], bool]:
+        """
+        (cached, leader): a cached entry, waiting for another worker's fetch
+        if there is one; otherwise None, with ``leader`` True if this caller
+        took the fetch (and must call done()).
+        """
+        cached = await sync_to_async(self.get, thread_sensitive=False)(url)
+        if cached is not None:
+            RESOURCE_CACHE.labels(result='hit').inc()
+            return cached, False
+        if await sync_to_async(self.lead, thread_sensitive=False)(url):
+            RESOURCE_CACHE.labels(result='miss').inc()
+            return None, True
+        deadline = time.monotonic() + self.wait_seconds
+        while time.monotonic() < deadline:
+            await asyncio.sleep(poll)
+            poll = min(poll * 1.5, 1.0)
+            cached = await sync_to_async(self.get, thread_sensitive=False)(url)
+            if cached is not None:
+                RESOURCE_CACHE.labels(result='coalesced').inc()
+                return cached, False
+            if not await sync_to_async(self.fetching, thread_sensitive=False)(url):
+                break
+        # The leader gave up (failed, or too large to cache): fetch it here
+        RESOURCE_CACHE.labels(result='miss').inc()
+        return None, False
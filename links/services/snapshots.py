@@ -0,0 +1,224 @@
+"""
+Compressed, content-addressed store for fetched onion pages.
+
+Bodies are written once per distinct SHA-256 under SNAPSHOT_ROOT (zstd when
+the optional ``zstandard`` package is installed, gzip otherwise), so identical
+mirror pages share one file. Each fetch adds a small PageSnapshot metadata row
+pointing at its blob. The checker, sandbox and investigator look here first
+and reuse a fresh snapshot instead of making another Tor round trip.
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from pathlib import Path
+from typing import Optional
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import OuterRef, ProtectedError, Subquery
+from django.utils import timezone
+
+from links.models import PageSnapshot, SnapshotBlob
+from .metrics import SNAPSHOT_LOOKUPS
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+
+def _compress(data: bytes):
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=10).compress(data), 'zstd'
+    return gzip.compress(data, compresslevel=6), 'gzip'
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('Snapshot is zstd-compressed but the zstandard package is not installed')
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def decode_body(body: bytes, content_type: str = '') -> str:
+    """Decode a stored body using the charset from its Content-Type"""
+    charset = 'utf-8'
+    for param in (content_type or '').split(';')[1:]:
+        key, _, value = param.strip().partition('=')
+        if key.lower() == 'charset' and value:
+            charset = value.strip('"\' ')
+    try:
+        return body.decode(charset, 'replace')
+    except LookupError:
+        return body.decode('utf-8', 'replace')
+
+
+class SnapshotStore:
+    """
+    Page snapshot store.
+
+    Args:
+        root: Directory for compressed blobs
+        fresh_seconds: Default age under which a snapshot may replace a fetch
+        max_bytes: Bodies larger than this are not stored
+    """
+
+    def __init__(self, root: Path, fresh_seconds: int = 600, max_bytes: int = 5 * 1024 * 1024):
+        self.root = Path(root)
+        self.fresh_seconds = fresh_seconds
+        self.max_bytes = max_bytes
+
+    def _blob_path(self, content_hash: str, codec: str) -> Path:
+        ext = 'zst' if codec == 'zstd' else 'gz'
+        return self.root / content_hash[:2] / content_hash[2:4] / f'{content_hash}.{ext}'
+
+    def _write_blob(self, body: bytes, content_hash: str) -> SnapshotBlob:
+        blob = SnapshotBlob.objects.filter(content_hash=content_hash).first()
+        if blob is not None and self._blob_path(content_hash, blob.codec).exists():
+            return blob
+
+        compressed, codec = _compress(body)
+        path = self._blob_path(content_hash, codec)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write-then-rename so readers never see a partial blob
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                fh.write(compressed)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+        if blob is not None:
+            return blob
+        try:
+            return SnapshotBlob.objects.create(
+                content_hash=content_hash,
+                size=len(body),
+                compressed_size=len(compressed),
+                codec=codec,
+            )
+        except IntegrityError:
+            # Another worker stored the same body concurrently
+            return SnapshotBlob.objects.get(content_hash=content_hash)
+
+    def save(self, url: str, body: Optional[bytes], status_code: Optional[int], source: str,
+             content_type: str = '', etag: str = '', last_modified: str = '') -> PageSnapshot:
+        """Record a fetch of ``url``; the body is stored once per distinct content."""
+        blob = None
+        if body is not None and len(body) <= self.max_bytes:
+            blob = self._write_blob(body, hashlib.sha256(body).hexdigest())
+        return PageSnapshot.objects.create(
+            url=url,
+            status_code=status_code,
+            content_type=(content_type or '')[:100],
+            etag=(etag or '')[:255],
+            last_modified=(last_modified or '')[:64],
+            blob=blob,
+            source=source,
+        )
+
+    def get_fresh(self, url: str, max_age: Optional[int] = None) -> Optional[PageSnapshot]:
+        """Latest successful snapshot of ``url`` younger than ``max_age`` seconds"""
+        max_age = self.fresh_seconds if max_age is None else max_age
+        if max_age <= 0:
+            return None
+        snapshot = (
+            PageSnapshot.objects
+            .filter(url=url, status_code=200, blob__isnull=False,
+                    fetched_at__gte=timezone.now() - timedelta(seconds=max_age))
+            .select_related('blob')
+            .order_by('-fetched_at')
+            .first()
+        )
+        SNAPSHOT_LOOKUPS.labels(result='miss' if snapshot is None else 'hit').inc()
+        return snapshot
+
+    def read(self, snapshot: PageSnapshot) -> Optional[bytes]:
+        """Return the decompressed body of ``snapshot`` (None if it has none)"""
+        if snapshot.blob is None:
+            return None
+        path = self._blob_path(snapshot.blob.content_hash, snapshot.blob.codec)
+        try:
+            return _decompress(path.read_bytes(), snapshot.blob.codec)
+        except FileNotFoundError:
+            logger.warning(f"Snapshot blob missing on disk: {path}")
+            return None
+
+    def prune(self, max_age_days: int = 30, keep_per_url: int = 1) -> dict:
+        """
+        Apply the retention policy.
+
+        Snapshots older than ``max_age_days`` are deleted, except the newest
+        ``keep_per_url`` snapshots of each URL. Blobs no longer referenced by
+        any snapshot are then removed from disk.
+        """
+        cutoff = timezone.now() - timedelta(days=max_age_days)
+        old = PageSnapshot.objects.filter(fetched_at__lt=cutoff)
+        if keep_per_url > 0:
+            # Fast path: URLs with at least keep_per_url recent snapshots lose all old ones
+            newer = (
+                PageSnapshot.objects
+                .filter(url=OuterRef('url'), fetched_at__gte=cutoff)
+                .order_by('-fetched_at')
+                .values('id')[keep_per_url - 1:keep_per_url]
+            )
+            old = old.annotate(kth_newer=Subquery(newer)).exclude(kth_newer__isnull=True)
+        deleted, _ = old.delete()
+        # The rest belong to URLs with few recent fetches: keep their newest N
+        if keep_per_url > 0:
+            for url in (PageSnapshot.objects.filter(fetched_at__lt=cutoff)
+                        .values_list('url', flat=True).distinct().iterator()):
+                keep_ids = list(
+                    PageSnapshot.objects.filter(url=url).order_by('-fetched_at')
+                    .values_list('id', flat=True)[:keep_per_url]
+                )
+                more, _ = PageSnapshot.objects.filter(url=url, fetched_at__lt=cutoff).exclude(id__in=keep_ids).delete()
+                deleted += more
+
+        orphans = 0
+        freed = 0
+        for blob in SnapshotBlob.objects.filter(snapshots__isnull=True).iterator():
+            path = self._blob_path(blob.content_hash, blob.codec)
+            try:
+                blob.delete()
+            except (IntegrityError, ProtectedError):
+                # Re-used by a snapshot saved since the query ran
+                continue
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            freed += blob.compressed_size
+            orphans += 1
+        return {'snapshots_deleted': deleted, 'blobs_deleted': orphans, 'bytes_freed': freed}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_snapshot_store() -> SnapshotStore:
+    """Get the global snapshot store configured from settings"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SnapshotStore(
+                    root=getattr(settings, 'SNAPSHOT_ROOT', Path.cwd() / 'snapshots'),
+                    fresh_seconds=getattr(settings, 'SNAPSHOT_FRESH_SECONDS', 600),
+                    max_bytes=getattr(settings, 'SNAPSHOT_MAX_BYTES', 5 * 1024 * 1024),
+                )
+    return _store
@@ -0,0 +1,173 @@
+"""
+Per-host check deadlines from latency history.
+
+One fixed timeout makes every stalled check cost the same 30 seconds,
+however fast the onion usually is. Deadlines here are per phase:
+
+- connect: SOCKS handshake, circuit and rendezvous (requests' connect timeout)
+- first byte: wait for the response after connecting (requests' read timeout)
+- total: the whole fetch, body included (enforced while reading the body)
+
+Each phase's deadline is the p95 of the host's recent alive checks
+(LinkStats) times ADAPTIVE_TIMEOUT_MARGIN. With few samples it is blended
+towards a global prior, the p95 over recently checked hosts. It never goes
+below the phase floor or above the checker's configured timeout. Hosts with
+no history, on a fresh database, get the configured timeout as before.
+
+With HEDGING_ENABLED, deadlines also carry ``hedge_after``: the host's p90
+time to first byte (connect + wait), or the global prior's, after which
+services.hedging may start a second attempt on another circuit.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Sequence
+
+from django.conf import settings
+
+from links.models import LinkStats
+
+PHASES = ('connect', 'first_byte', 'total')
+PERCENTILE = 95
+HEDGE_PERCENTILE = 90
+# Weight of the global prior, in host samples
+PRIOR_WEIGHT = 3
+# Minimum deadline per phase; onion rendezvous varies a lot even for healthy hosts
+FLOORS = {'connect': 5.0, 'first_byte': 3.0, 'total': 8.0}
+# Hosts the global prior is computed from, and how long it is reused
+PRIOR_HOSTS = 500
+PRIOR_TTL = 300
+# Until there is enough history, look again this often
+PRIOR_RETRY = 30
+# Fewer samples than this (over all hosts) and there is no prior
+PRIOR_MIN_SAMPLES = 20
+
+_prior: Optional[Dict[str, float]] = None
+_prior_expires = 0.0
+_prior_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class Deadlines:
+    """Seconds allowed per phase of one check"""
+    connect: float
+    first_byte: float
+    total: float
+    # Start a hedged attempt if there is no response yet after this long (None: don't hedge)
+    hedge_after: Optional[float] = None
+
+    @classmethod
+    def fixed(cls, timeout: float) -> 'Deadlines':
+        return cls(timeout, timeout, timeout)
+
+    def capped(self, seconds: float) -> 'Deadlines':
+        """These deadlines, none longer than ``seconds`` (e.g. what is left of a search)"""
+        hedge_after = self.hedge_after if self.hedge_after is not None and self.hedge_after < seconds else None
+        return Deadlines(min(self.connect, seconds), min(self.first_byte, seconds), min(self.total, seconds),
+                         hedge_after)
+
+    def as_dict(self):
+        return {'connect': self.connect, 'first_byte': self.first_byte, 'total': self.total,
+                'hedge_after': self.hedge_after}
+
+
+def percentile(values: Sequence[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile (q in 0..100)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), -(-len(ordered) * q // 100)))
+    return ordered[int(rank) - 1]
+
+
+def _samples(stats: Optional[LinkStats]) -> Dict[str, List[float]]:
+    if stats is None:
+        return {phase: [] for phase in PHASES}
+    return {
+        'connect': list(stats.recent_connect_times or []),
+        'first_byte': list(stats.recent_first_byte_times or []),
+        'total': list(stats.recent_response_times or []),
+    }
+
+
+def global_prior() -> Optional[Dict[str, float]]:
+    """p95 per phase over recently checked hosts, refreshed every PRIOR_TTL seconds"""
+    global _prior, _prior_expires
+    with _prior_lock:
+        if time.monotonic() < _prior_expires:
+            return _prior
+        pooled = {phase: [] for phase in PHASES}
+        recent = LinkStats.objects.order_by('-updated_at')[:PRIOR_HOSTS]
+        for stats in recent.only('recent_connect_times', 'recent_first_byte_times', 'recent_response_times'):
+            for phase, values in _samples(stats).items():
+                pooled[phase].extend(values)
+        if all(len(values) >= PRIOR_MIN_SAMPLES for values in pooled.values()):
+            _prior = {phase: percentile(values, PERCENTILE) for phase, values in pooled.items()}
+            _prior['hedge_after'] = (percentile(pooled['connect'], HEDGE_PERCENTILE)
+                                     + percentile(pooled['first_byte'], HEDGE_PERCENTILE))
+        else:
+            _prior = None
+        _prior_expires = time.monotonic() + (PRIOR_TTL if _prior is not None else PRIOR_RETRY)
+        return _prior
+
+
+def deadlines_for(stats: Optional[LinkStats], ceiling: float,
+                  prior: Optional[Dict[str, float]] = None) -> Deadlines:
+    """Deadlines for a host from its LinkStats (None if never checked), at most ``ceiling`` each"""
+    margin = getattr(settings, 'ADAPTIVE_TIMEOUT_MARGIN', 2.0)
+    samples = _samples(stats)
+    values = {}
+    for phase in PHASES:
+        own = percentile(samples[phase], PERCENTILE)
+        count = len(samples[phase])
+        if prior is not None:
+            estimate = ((own or 0.0) * count + prior[phase] * PRIOR_WEIGHT) / (count + PRIOR_WEIGHT)
+        elif own is not None and count >= PRIOR_WEIGHT:
+            estimate = own
+        else:
+            values[phase] = ceiling
+            continue
+        values[phase] = min(ceiling, max(FLOORS[phase], estimate * margin))
+    # The whole fetch can't be shorter than its phases
+    values['total'] = min(ceiling, max(values['total'], values['connect'] + values['first_byte']))
+    return Deadlines(**values)
+
+
+def hedge_delay(stats: Optional[LinkStats], deadlines: Deadlines,
+                prior: Optional[Dict[str, float]] = None) -> Optional[float]:
+    """Seconds without a response before hedging a request to this host, or None"""
+    samples = _samples(stats)
+    if len(samples['connect']) >= PRIOR_WEIGHT and len(samples['first_byte']) >= PRIOR_WEIGHT:
+        delay = (percentile(samples['connect'], HEDGE_PERCENTILE)
+                 + percentile(samples['first_byte'], HEDGE_PERCENTILE))
+    elif prior is not None:
+        delay = prior['hedge_after']
+    else:
+        return None
+    delay = max(getattr(settings, 'HEDGE_MIN_DELAY', 1.0), delay)
+    # A hedge launched this late could not answer before the request times out anyway
+    if delay >= min(deadlines.total, deadlines.connect + deadlines.first_byte):
+        return None
+    return delay
+
+
+class TimeoutModel:
+    """Deadlines for a batch of checks; reads the global prior once"""
+
+    def __init__(self, ceiling: float):
+        self.ceiling = ceiling
+        self.enabled = getattr(settings, 'ADAPTIVE_TIMEOUTS', True)
+        self.hedging = getattr(settings, 'HEDGING_ENABLED', True)
+        self.prior = global_prior() if self.enabled or self.hedging else None
+
+    def for_stats(self, stats: Optional[LinkStats]) -> Deadlines:
+        if self.enabled:
+            deadlines = deadlines_for(stats, self.ceiling, self.prior)
+        else:
+            deadlines = Deadlines.fixed(self.ceiling)
+        if self.hedging:
+            deadlines = replace(deadlines, hedge_after=hedge_delay(stats, deadlines, self.prior))
+        return deadlines
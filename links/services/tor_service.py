@@ -1,8 +1,25 @@
 
+"""
+Find or launch the Tor SOCKS proxy the checker, scraper and investigator use.
+
+An open SOCKS port only means Tor is listening, not that it can build
+circuits. When a control port is reachable (always, for a Tor launched
+here), start() waits on it for "Bootstrapped 100%" and pre-builds a few
+circuits. A fresh process then doesn't send its first requests into a
+client that is still downloading the consensus. The control port needs
+``stem``; without it start() falls back to the SOCKS port check.
+
+A launched Tor keeps its consensus and descriptor caches in TOR_DATA_DIR
+and writes its control port there. Other processes using the same data
+directory (gunicorn workers, a restarted server while the old Tor is still
+up) find and reuse that Tor instead of launching another one.
+"""
+
 from __future__ import annotations
 
 import logging
 import os
+import re
 import shutil
 import socket
 import subprocess
@@ -12,8 +29,19 @@ import time
 from pathlib import Path
 from typing import Optional
 
+from .metrics import TOR_BOOTSTRAP_PERCENT, TOR_RUNNING, TOR_START_SECONDS
+
+try:
+    from stem.control import Controller, Listener
+except ImportError:  # stem is optional; readiness falls back to the SOCKS port check
+    Controller = None
+
 logger = logging.getLogger(__name__)
 
+CONTROL_PORT_FILE = "control_port"
+CLOUD_INDICATORS = ['RENDER', 'DYNO', 'RAILWAY_ENVIRONMENT', 'VERCEL', 'NETLIFY', 'AWS_EXECUTION_ENV']
+_BOOTSTRAP_PROGRESS = re.compile(r"PROGRESS=(\d+)")
+
 
 def _is_port_open(host: str, port: int, timeout: float = 0.5) -> bool:
     try:
@@ -32,6 +60,17 @@ def _find_free_port(preferred: int, fallback_start: int = 10000, fallback_end: i
     return preferred
 
 
+def configured_socks_port(default: Optional[int] = 9150) -> Optional[int]:
+    """SOCKS port from the TOR_SOCKS_PORT setting, else ``default``"""
+    from django.conf import settings
+    return getattr(settings, 'TOR_SOCKS_PORT', None) or default
+
+
+def _setting(name: str, default=None):
+    from django.conf import settings
+    return getattr(settings, name, default)
+
+
 def _tor_executable_candidates() -> list[str]:
     candidates = []
     # 1) Environment override
@@ -72,20 +111,141 @@ class TorService:
         self._lock = threading.RLock()
         self.process: Optional[subprocess.Popen] = None
         self.is_running: bool = False
+        self.bootstrapped: bool = False
         self._socks_port: Optional[int] = None
+        self._control_port: Optional[int] = None
         self.data_dir = data_dir or (Path.cwd() / "tor_data")
         self.data_dir.mkdir(parents=True, exist_ok=True)
 
     def get_socks_port(self) -> Optional[int]:
         return self._socks_port
 
+    def open_controller(self):
+        """Authenticated stem Controller for the Tor in use (caller closes it), or None"""
+        return self._open_controller(self._control_port)
+
+    # --- Control port helpers
+    def _open_controller(self, port: Optional[int]):
+        """Authenticated stem Controller on ``port``, or None"""
+        if Controller is None or not port or not _is_port_open("127.0.0.1", port):
+            return None
+        try:
+            controller = Controller.from_port(port=port)
+        except Exception as e:
+            logger.debug(f"Tor control port {port} unavailable: {e}")
+            return None
+        try:
+            # Cookie auth for a Tor launched here; password or cookie for an existing one
+            controller.authenticate(password=_setting('TOR_CONTROL_PASSWORD'))
+            return controller
+        except Exception as e:
+            logger.debug(f"Could not authenticate to Tor control port {port}: {e}")
+            controller.close()
+            return None
+
+    def _written_control_port(self) -> Optional[int]:
+        """Control port a Tor launched with this data directory wrote out (ControlPortWriteToFile)"""
+        try:
+            text = (self.data_dir / CONTROL_PORT_FILE).read_text()
+        except OSError:
+            return None
+        match = re.search(r"PORT=[\d.]+:(\d+)", text)
+        return int(match.group(1)) if match else None
+
+    def _control_port_candidates(self, socks_port: int) -> list[int]:
+        # Configured port, then the usual pairing: 9050/9051 (system Tor), 9150/9151 (Tor Browser)
+        return [p for p in (_setting('TOR_CONTROL_PORT'), socks_port + 1) if p]
+
+    def _bootstrap_progress(self, controller) -> int:
+        match = _BOOTSTRAP_PROGRESS.search(controller.get_info("status/bootstrap-phase", ""))
+        return int(match.group(1)) if match else 0
+
+    def _wait_until_ready(self, timeout: float) -> bool:
+        """
+        Wait for "Bootstrapped 100%" on the control port, then pre-build
+        circuits if Tor was still bootstrapping. Returns False on timeout or
+        if the launched process died; True if ready or if there is no control
+        port to ask.
+        """
+        controller = self._open_controller(self._control_port)
+        if controller is None:
+            logger.info("No Tor control port available; assuming Tor is bootstrapped")
+            return True
+        deadline = time.monotonic() + timeout
+        last = None
+        with controller:
+            while True:
+                progress = self._bootstrap_progress(controller)
+                if progress != last:
+                    TOR_BOOTSTRAP_PERCENT.set(progress)
+                    logger.info(f"Tor bootstrapped {progress}%")
+                    if last is None and progress >= 100:
+                        # Already up; Tor keeps preemptive circuits of its own
+                        self.bootstrapped = True
+                        return True
+                    last = progress
+                if progress >= 100:
+                    break
+                if self.process is not None and self.process.poll() is not None:
+                    logger.error("Tor exited while bootstrapping")
+                    return False
+                if time.monotonic() > deadline:
+                    logger.error(f"Tor did not finish bootstrapping within {timeout:.0f}s (at {progress}%)")
+                    return False
+                time.sleep(0.5)
+            self.bootstrapped = True
+            self._prebuild_circuits(controller, _setting('TOR_WARM_CIRCUITS', 2), deadline)
+        return True
+
+    def _prebuild_circuits(self, controller, count: int, deadline: float) -> None:
+        """Build general-purpose circuits so the first burst of requests doesn't wait on circuit construction"""
+        built = 0
+        for _ in range(count):
+            remaining = deadline - time.monotonic()
+            if remaining <= 1:
+                break
+            try:
+                controller.new_circuit(await_build=True, timeout=min(remaining, 30))
+                built += 1
+            except Exception as e:
+                logger.warning(f"Could not pre-build a Tor circuit: {e}")
+                break
+        if built:
+            logger.info(f"Pre-built {built} Tor circuit(s)")
+
     # --- Discovery helpers
+    def _use_launched_if_running(self) -> bool:
+        """Reuse a Tor started with this data directory by another process or an earlier run"""
+        port = self._written_control_port()
+        controller = self._open_controller(port)
+        if controller is None:
+            return False
+        with controller:
+            try:
+                listeners = controller.get_listeners(Listener.SOCKS)
+            except Exception as e:
+                logger.debug(f"Could not read Tor SOCKS listeners: {e}")
+                return False
+        for _, socks_port in listeners:
+            if _is_port_open("127.0.0.1", socks_port):
+                self._socks_port = socks_port
+                self._control_port = port
+                self.is_running = True
+                logger.info(f"Using Tor from {self.data_dir} on SOCKS port {socks_port}")
+                return True
+        return False
+
     def _use_existing_if_available(self) -> bool:
         """Prefer an already-running Tor instance on common ports."""
-        # Try system Tor default first (9050), then Tor Browser (9150)
-        for p in (9050, 9150):
+        # Try a configured port, then system Tor default (9050), then Tor Browser (9150)
+        for p in (configured_socks_port(None), 9050, 9150):
+            if p is None:
+                continue
             if _is_port_open("127.0.0.1", p):
                 self._socks_port = p
+                self._control_port = next(
+                    (c for c in self._control_port_candidates(p) if _is_port_open("127.0.0.1", c)), None,
+                )
                 self.is_running = True
                 logger.info(f"Using existing Tor SOCKS proxy on port {p}")
                 return True
@@ -101,13 +261,17 @@ class TorService:
         socks_port = _find_free_port(9050)
         control_port = _find_free_port(9051)
 
+        control_file = self.data_dir / CONTROL_PORT_FILE
+        log_file = self.data_dir / "notices.log"
         torrc = self.data_dir / "torrc"
         try:
             torrc.write_text(
-                f"SocksPort {socks_port}\n"
+                f"SocksPort {socks_port} ExtendedErrors\n"
                 f"ControlPort {control_port}\n"
+                f"CookieAuthentication 1\n"
+                f"ControlPortWriteToFile {control_file.as_posix()}\n"
                 f"DataDirectory {self.data_dir.as_posix()}\n"
-                f"Log notice stdout\n"
+                f"Log notice file {log_file.as_posix()}\n"
             )
         except Exception:
             # Non-fatal; Tor can run without this file since we pass CLI args
@@ -116,10 +280,14 @@ class TorService:
         tor_exe = exe_candidates[0]
         args = [
             tor_exe,
-            f"--SocksPort", str(socks_port),
+            # ExtendedErrors: onion service failures as SOCKS codes 0xF0-0xF7 (see failures.py)
+            f"--SocksPort", f"{socks_port} ExtendedErrors",
             f"--ControlPort", str(control_port),
+            "--CookieAuthentication", "1",
+            "--ControlPortWriteToFile", str(control_file),
             f"--DataDirectory", str(self.data_dir),
-            "--Log", "notice stdout",
+            # A file, not a pipe: nobody reads stdout, and a full pipe would block Tor
+            "--Log", f"notice file {log_file}",
         ]
 
         creationflags = 0
@@ -133,16 +301,17 @@ class TorService:
         try:
             self.process = subprocess.Popen(
                 args,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
                 cwd=str(self.data_dir),
                 creationflags=creationflags,
                 startupinfo=startupinfo,
             )
-            # Wait briefly for Tor to open the SOCKS port
-            for _ in range(50):  # ~5 seconds total
+            # Wait for Tor to open the SOCKS port; bootstrapping is waited for in start()
+            for _ in range(100):  # ~10 seconds total
                 if _is_port_open("127.0.0.1", socks_port):
                     self._socks_port = socks_port
+                    self._control_port = control_port
                     self.is_running = True
                     logger.info(f"✅ Tor service started on port {socks_port}")
                     return True
@@ -162,11 +331,24 @@ class TorService:
         with self._lock:
             if self.is_running:
                 return True
+            started = time.perf_counter()
             # Prefer to use an existing Tor instance
-            if self._use_existing_if_available():
-                return True
+            if self._use_launched_if_running() or self._use_existing_if_available():
+                method = 'existing'
             # Try to start a new one
-            return self._start_new_process()
+            elif self._start_new_process():
+                method = 'launched'
+            else:
+                method = 'failed'
+            if self.is_running and not self._wait_until_ready(_setting('TOR_BOOTSTRAP_TIMEOUT', 120)):
+                if self.process is not None and self.process.poll() is not None:
+                    self.is_running = False
+                    self._socks_port = None
+                    method = 'failed'
+                # Otherwise keep going: Tor may still finish bootstrapping, requests just fail until then
+            TOR_START_SECONDS.labels(method=method).observe(time.perf_counter() - started)
+            TOR_RUNNING.set(1 if self.is_running else 0)
+            return self.is_running
 
     def stop(self) -> None:
         with self._lock:
@@ -187,7 +369,10 @@ class TorService:
                     self.is_running = True
                 else:
                     self.is_running = False
+                    self.bootstrapped = False
                     self._socks_port = None
+                    self._control_port = None
+                TOR_RUNNING.set(1 if self.is_running else 0)
 
     def __del__(self):
         # Best effort cleanup of embedded process only
@@ -208,7 +393,7 @@ def get_tor_service() -> TorService:
     if _tor_service is None:
         with _singleton_lock:
             if _tor_service is None:
-                data_dir = Path(os.environ.get("TOR_DATA_DIR", Path.cwd() / "tor_data"))
+                data_dir = Path(_setting("TOR_DATA_DIR") or Path.cwd() / "tor_data")
                 _tor_service = TorService(data_dir=data_dir)
     return _tor_service
 
@@ -223,3 +408,23 @@ def ensure_tor_running() -> Optional[int]:
         logger.error(f"ensure_tor_running error: {e}")
     return None
 
+
+
+def warm_up() -> Optional[int]:
+    """
+    Find or launch Tor and wait until it is bootstrapped. Called at startup
+    (runserver, gunicorn hooks) so a process only takes traffic once Tor can
+    serve it. Skipped in cloud environments, which use Tor2Web gateways.
+    Returns the SOCKS port if Tor is available.
+    """
+    if any(os.environ.get(indicator) for indicator in CLOUD_INDICATORS):
+        logger.info("Cloud environment detected - using Tor2Web gateways, no local Tor needed")
+        return None
+    port = ensure_tor_running()
+    if port is None:
+        logger.warning("⚠️ Tor service not available. Install Tor from https://www.torproject.org/download/")
+    elif get_tor_service().bootstrapped:
+        logger.info(f"✅ Tor ready on port {port}")
+    else:
+        logger.info(f"Tor on port {port}; bootstrap state unknown or incomplete")
+    return port
@@ -0,0 +1,32 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from .models import CrawlPage, Investigation
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Investigation)
+def index_investigation_entities(sender, instance, raw=False, **kwargs):
+    """Keep the entity index in step with an investigation's findings"""
+    if raw:
+        return
+    from .services.entity_index import index_investigation
+    try:
+        index_investigation(instance)
+    except Exception as e:
+        logger.error(f"Failed to index entities for investigation {instance.pk}: {e}")
+
+
+@receiver(post_save, sender=CrawlPage)
+def index_crawl_page_entities(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Index a crawled page once its artifacts are stored"""
+    if raw or instance.state != 'done':
+        return
+    if update_fields is not None and 'artifacts' not in update_fields:
+        return
+    from .services.entity_index import index_crawl_page
+    try:
+        index_crawl_page(instance)
+    except Exception as e:
+        logger.error(f"Failed to index entities for crawl page {instance.pk}: {e}")
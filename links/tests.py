@@ -0,0 +1,277 @@
+import hashlib
+from datetime import timedelta
+
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TransactionTestCase
+from django.utils import timezone
+
+from links.services.extractors import (
+    _keccak_f1600,
+    extract_artifacts,
+    is_valid_base58check_address,
+    is_valid_bech32_address,
+    is_valid_eip55_address,
+    is_valid_monero_address,
+    is_valid_onion_v3,
+    keccak256,
+)
+from links.services.onion_url import (
+    BAD_CHECKSUM,
+    MALFORMED,
+    NOT_ONION,
+    V2_ADDRESS,
+    canonicalize_onion_url,
+    normalize_onion_url,
+)
+
+
+def corrupt(value: str, index: int) -> str:
+    """``value`` with the character at ``index`` replaced by another one of the same kind"""
+    char = value[index]
+    if char.isdigit():
+        replacement = '3' if char != '3' else '4'
+    elif char.isupper():
+        replacement = 'C' if char != 'C' else 'D'
+    else:
+        replacement = 'c' if char != 'c' else 'd'
+    return value[:index] + replacement + value[index + 1:]
+
+
+class Base58CheckTests(SimpleTestCase):
+    VALID = [
+        '1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa',  # P2PKH (genesis block)
+        '3J98t1WpEZ73CNmQviecrnyiWrnqRhWNLy',  # P2SH
+    ]
+
+    def test_valid(self):
+        for address in self.VALID:
+            self.assertTrue(is_valid_base58check_address(address), address)
+
+    def test_one_character_corrupted(self):
+        for address in self.VALID:
+            self.assertFalse(is_valid_base58check_address(corrupt(address, 10)), address)
+
+    def test_not_base58(self):
+        self.assertFalse(is_valid_base58check_address('1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfN0'))
+
+
+class Bech32Tests(SimpleTestCase):
+    VALID = [
+        'BC1QW508D6QEJXTDG4Y5R3ZARVARY0C5XW7KV8F3T4',  # BIP-173 P2WPKH, upper case
+        'bc1qrp33g0q5c5txsp9arysrx4k6zdkfs4nce4xj0gdcccefvpysxf3qccfmv3',  # BIP-173 P2WSH
+        'bc1p0xlxvlhemja6c4dqv22uapctqupfhlxm9h8z3k2e72q4k9hcz7vqzk5jj0',  # BIP-350 taproot
+    ]
+
+    def test_valid(self):
+        for address in self.VALID:
+            self.assertTrue(is_valid_bech32_address(address), address)
+
+    def test_one_character_corrupted(self):
+        for address in self.VALID:
+            self.assertFalse(is_valid_bech32_address(corrupt(address, 12)), address)
+
+    def test_mixed_case(self):
+        self.assertFalse(is_valid_bech32_address('bc1qW508d6qejxtdg4y5r3zarvary0c5xw7kv8f3t4'))
+
+    def test_wrong_checksum_constant(self):
+        # BIP-350: a v1 program with a bech32 (not bech32m) checksum is invalid
+        self.assertFalse(is_valid_bech32_address(
+            'bc1pw508d6qejxtdg4y5r3zarvary0c5xw7kw508d6qejxtdg4y5r3zarvary0c5xw7k7grplx'))
+
+
+class KeccakTests(SimpleTestCase):
+    def test_known_digests(self):
+        self.assertEqual(keccak256(b'').hex(), 'c5d2460186f7233c927e7db2dcc703c0e500b653ca82273b7bfad8045d85a470')
+        self.assertEqual(keccak256(b'abc').hex(), '4e03657aea45a94fc7d47ba826c8d667c0d1e6e33a64a036ec44f58fa12d6c45')
+
+    def test_permutation_matches_sha3(self):
+        # SHA3-256 is the same sponge with 0x06 padding; inputs span several 136-byte blocks
+        def sha3_256(data):
+            padded = bytearray(data) + b'\x06'
+            padded.extend(b'\x00' * (-len(padded) % 136))
+            padded[-1] |= 0x80
+            state = [0] * 25
+            for offset in range(0, len(padded), 136):
+                for i in range(17):
+                    state[i] ^= int.from_bytes(padded[offset + i * 8:offset + i * 8 + 8], 'little')
+                _keccak_f1600(state)
+            return b''.join(state[i].to_bytes(8, 'little') for i in range(4))
+
+        for size in (0, 135, 136, 137, 500):
+            data = bytes(range(256)) * 2
+            self.assertEqual(sha3_256(data[:size]), hashlib.sha3_256(data[:size]).digest(), size)
+
+
+class EIP55Tests(SimpleTestCase):
+    VALID = [
+        '0x5aAeb6053F3E94C9b9A09f33669435E7Ef1BeAed',
+        '0xfB6916095ca1df60bB79Ce92cE3Ea74c37c5d359',
+        '0xdbF03B407c01E7cD3CBea99509d93f8DDDC8C6FB',
+        '0xD1220A0cf47c7B9Be7A2E6BA89F429762e7b9aDb',
+    ]
+
+    def test_valid(self):
+        for address in self.VALID:
+            self.assertTrue(is_valid_eip55_address(address), address)
+
+    def test_one_character_case_flipped(self):
+        for address in self.VALID:
+            index = next(i for i, char in enumerate(address[2:], start=2) if char.isalpha())
+            flipped = address[:index] + address[index].swapcase() + address[index + 1:]
+            self.assertFalse(is_valid_eip55_address(flipped), address)
+
+    def test_single_case_has_no_checksum(self):
+        self.assertTrue(is_valid_eip55_address(self.VALID[0].lower()))
+        self.assertTrue(is_valid_eip55_address('0x' + self.VALID[0][2:].upper()))
+
+
+class MoneroTests(SimpleTestCase):
+    VALID = '44AFFq5kSiGBoZ4NMDwYtN18obc8AemS33DBLWs3H7otXft3XjrpDtQGv7SqSsaBYBb98uNbr2VBBEt7f2wfn3RVGQBEP3A'
+
+    def test_valid(self):
+        self.assertTrue(is_valid_monero_address(self.VALID))
+
+    def test_one_character_corrupted(self):
+        self.assertFalse(is_valid_monero_address(corrupt(self.VALID, 40)))
+
+    def test_wrong_length(self):
+        self.assertFalse(is_valid_monero_address(self.VALID[:-1]))
+
+
+class OnionV3Tests(SimpleTestCase):
+    VALID = [
+        'duckduckgogg42xjoc72x3sjasowoarfbgcmvfimaftt6twagswzczad.onion',
+        '2gzyxa5ihm7nsggfxnu52rck2vv4rvmdlkiu3zzui5du4xyclen53wid.onion',
+    ]
+
+    def test_valid(self):
+        for host in self.VALID:
+            self.assertTrue(is_valid_onion_v3(host), host)
+            self.assertTrue(is_valid_onion_v3(host.upper()), host)
+
+    def test_one_character_corrupted(self):
+        for host in self.VALID:
+            self.assertFalse(is_valid_onion_v3(corrupt(host, 20)), host)
+
+    def test_wrong_length(self):
+        self.assertFalse(is_valid_onion_v3('expyuzz4wqqyqhjn.onion'))
+
+
+class ExtractArtifactsTests(SimpleTestCase):
+    def test_validators_drop_corrupted_addresses(self):
+        good_btc, good_eth = Base58CheckTests.VALID[0], EIP55Tests.VALID[0]
+        bad_btc = corrupt(good_btc, 10)
+        bad_eth = good_eth[:3] + good_eth[3].swapcase() + good_eth[4:]
+        text = f'<p>{good_btc} {bad_btc} {good_eth} {bad_eth} {MoneroTests.VALID} {OnionV3Tests.VALID[0]}</p>'
+
+        artifacts = extract_artifacts(text)
+
+        self.assertEqual(artifacts['btc_addresses'], [good_btc])
+        self.assertEqual(artifacts['ethereum_addresses'], [good_eth])
+        self.assertEqual(artifacts['monero_addresses'], [MoneroTests.VALID])
+        self.assertIn(OnionV3Tests.VALID[0], artifacts['onion_addresses'])
+
+    def test_without_validation_look_alikes_are_kept(self):
+        bad_btc = corrupt(Base58CheckTests.VALID[0], 10)
+        self.assertEqual(extract_artifacts(bad_btc, validate=False)['btc_addresses'], [bad_btc])
+
+
+HOST = 'duckduckgogg42xjoc72x3sjasowoarfbgcmvfimaftt6twagswzczad.onion'
+
+
+class CanonicalizeOnionURLTests(SimpleTestCase):
+    def test_spellings_of_one_page_share_a_url(self):
+        canonical = f'http://{HOST}/'
+        for url in [
+            HOST,
+            f'http://{HOST}',
+            f'https://{HOST}/',
+            f'HTTP://{HOST.upper()}/',
+            f'http://{HOST}:80/',
+            f'https://{HOST}:443/',
+            f'http://user:secret@{HOST}/',
+            f'http://{HOST}/#top',
+            f'http://{HOST}/index.html',
+            f'http://{HOST}/INDEX.PHP',
+            f'  http://{HOST}/default.htm  ',
+        ]:
+            self.assertEqual(canonicalize_onion_url(url).url, canonical, url)
+
+    def test_default_document_in_subdirectory(self):
+        self.assertEqual(normalize_onion_url(f'https://{HOST}/forum/index.htm?page=2'),
+                         f'http://{HOST}/forum/?page=2')
+
+    def test_other_paths_and_ports_are_kept(self):
+        self.assertEqual(normalize_onion_url(f'http://{HOST}:8080/about.html'), f'http://{HOST}:8080/about.html')
+
+    def test_v2_address_is_rejected(self):
+        result = canonicalize_onion_url('http://expyuzz4wqqyqhjn.onion/')
+        self.assertFalse(result.is_valid)
+        self.assertIsNone(result.url)
+        self.assertEqual(result.problem, V2_ADDRESS)
+
+    def test_v3_checksum_mismatch_is_rejected(self):
+        result = canonicalize_onion_url(f'http://{corrupt(HOST, 20)}/')
+        self.assertEqual(result.problem, BAD_CHECKSUM)
+        self.assertIsNone(result.url)
+
+    def test_malformed_and_clearnet_urls_are_rejected(self):
+        self.assertEqual(canonicalize_onion_url(f'http://{HOST[:40]}.onion/').problem, MALFORMED)
+        self.assertEqual(canonicalize_onion_url('ftp://example.com/').problem, MALFORMED)
+        self.assertEqual(canonicalize_onion_url('https://example.com/').problem, NOT_ONION)
+
+    def test_subdomain_uses_service_label(self):
+        self.assertTrue(canonicalize_onion_url(f'http://www.{HOST}/').is_valid)
+
+
+class MergeDuplicateOnionLinksMigrationTests(TransactionTestCase):
+    migrate_from = ('links', '0009_page_fingerprint')
+    migrate_to = ('links', '0010_merge_duplicate_onion_links')
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate([self.migrate_from])
+        self.apps = executor.loader.project_state([self.migrate_from]).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def migrate(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([self.migrate_to])
+        return executor.loader.project_state([self.migrate_to]).apps
+
+    def test_duplicates_are_merged_into_canonical_row(self):
+        OnionLink = self.apps.get_model('links', 'OnionLink')
+        Investigation = self.apps.get_model('links', 'Investigation')
+        now = timezone.now()
+        canonical = OnionLink.objects.create(url=f'http://{HOST}/', status='dead', keywords='market',
+                                             last_checked=now - timedelta(days=1))
+        https = OnionLink.objects.create(url=f'https://{HOST}/index.html', status='alive', status_code=200,
+                                         title='Search', keywords='search, market', last_checked=now)
+        upper = OnionLink.objects.create(url=f'http://{HOST.upper()}:80/', status='dead')
+        other = OnionLink.objects.create(url='http://example.onion/index.php')
+        Investigation.objects.create(onion_link=https, investigated_url=f'https://{HOST}/index.html')
+        Investigation.objects.create(onion_link=canonical, investigated_url=f'http://{HOST}/')
+
+        apps = self.migrate()
+        OnionLink = apps.get_model('links', 'OnionLink')
+        Investigation = apps.get_model('links', 'Investigation')
+
+        self.assertEqual(OnionLink.objects.filter(url__icontains=HOST[:20]).count(), 1)
+        merged = OnionLink.objects.get(id=canonical.id)
+        self.assertEqual(merged.url, f'http://{HOST}/')
+        # The latest check wins, and text fields are filled from the duplicates
+        self.assertEqual(merged.status, 'alive')
+        self.assertEqual(merged.status_code, 200)
+        self.assertEqual(merged.title, 'Search')
+        self.assertEqual(merged.keywords, 'market, search')
+        self.assertFalse(OnionLink.objects.filter(id__in=[https.id, upper.id]).exists())
+        # Investigations move to the kept row and collapse to one per canonical URL
+        self.assertEqual(list(Investigation.objects.values_list('onion_link_id', 'investigated_url')),
+                         [(canonical.id, f'http://{HOST}/')])
+        # Rows without duplicates are only respelled
+        self.assertEqual(OnionLink.objects.get(id=other.id).url, 'http://example.onion/')
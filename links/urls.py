@@ -7,6 +7,7 @@ urlpatterns = [
     path('results/<str:keyword>/', views.search_results, name='search_results'),
     path('results/<str:keyword>/<str:search_id>/', views.search_results_progressive, name='search_results_progressive'),
     path('check-progress/<str:search_id>/', views.check_progress, name='check_progress'),
+    path('search-trace/<str:search_id>/', views.search_trace, name='search_trace'),
     path('sandbox/<int:link_id>/', views.sandbox_proxy, name='sandbox_proxy'),
     path('sandbox/resource/<int:link_id>/<str:encoded_url>/', views.sandbox_resource_proxy, name='sandbox_resource_proxy'),
 
@@ -14,5 +15,14 @@ urlpatterns = [
     path('investigate/<int:link_id>/', views.investigate_link, name='investigate_link'),
     path('investigate-url/', views.investigate_by_url, name='investigate_by_url'),
     path('investigation/<int:investigation_id>/', views.investigation_detail, name='investigation_detail'),
+    path('investigation-job/<int:job_id>/', views.investigation_job, name='investigation_job'),
+    path('investigation-job/<int:job_id>/status/', views.investigation_job_status, name='investigation_job_status'),
     path('investigations/', views.all_investigations, name='all_investigations'),
+
+    # Entity correlation
+    path('entities/', views.entity_lookup, name='entity_lookup'),
+    path('api/entities/', views.entity_lookup_api, name='entity_lookup_api'),
+
+    # Monitoring
+    path('metrics', views.metrics_view, name='metrics'),
 ]
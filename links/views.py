@@ -1,17 +1,31 @@
-from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse, HttpResponse
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
+from django.urls import reverse
+from django.utils import timezone
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.views.decorators.http import require_http_methods
 from django.contrib import messages
-from .models import OnionLink, SearchSource, Investigation
+from django.conf import settings
+from .models import OnionLink, SearchSource, Investigation, Entity, InvestigationJob, SearchTrace
 from .services.link_checker import OnionLinkCheckerService
+from .services.async_client import SyncFallbackRequired, get_async_client
 from .services.scraper import OnionSearchScraper
-from .services.investigator import OnionInvestigator
+from .services.entity_index import find_cooccurrences
+from .services.jobs import submit_investigation, expire_stale_jobs
+from .services.onion_url import canonicalize_onion_url
+from .services.scheduler import record_search_hits
+from .services.shared_state import ResourceCache, SearchProgress
+from .services import metrics
+from .services.metrics import SANDBOX_SECONDS
+from .services.search_trace import SearchTracer, expand as expand_trace
+from .services.profiling import profile_job
+import time
 import uuid
 import re
 from urllib.parse import urljoin, urlparse
 import base64
 import threading
-from django.core.cache import cache
 
 
 def home(request):
@@ -40,19 +54,30 @@ def search_and_check(request):
     if not sources.exists():
         messages.error(request, 'No search sources configured. Please add them via admin panel.')
         return redirect('home')
+    search_id = str(uuid.uuid4())
+    tracer = SearchTracer(search_id, keyword)
     scraper = OnionSearchScraper()
     all_links = []
     for source in sources:
+        started = time.perf_counter()
         try:
             links = scraper.scrape_from_source(source, keyword)
             all_links.extend(links)
+            tracer.source(source.name, started, len(links))
         except Exception as e:
+            tracer.source(source.name, started, 0, str(e))
             messages.warning(request, f'Error scraping {source.name}: {str(e)}')
     if not all_links:
         messages.warning(request, 'No links found for your search')
         return redirect('home')
+    ingest_started = time.perf_counter()
     saved_links = []
+    seen_urls = set()
     for link_data in all_links:
+        # Scrapers return canonical URLs; different sources often list the same site
+        if link_data['url'] in seen_urls:
+            continue
+        seen_urls.add(link_data['url'])
         link, _ = OnionLink.objects.get_or_create(
             url=link_data['url'],
             defaults={
@@ -63,33 +88,44 @@ def search_and_check(request):
             }
         )
         saved_links.append(link)
-    search_id = str(uuid.uuid4())
-    cache.set(f'search_{search_id}_total', len(saved_links), timeout=3600)
-    cache.set(f'search_{search_id}_checked', 0, timeout=3600)
-    cache.set(f'search_{search_id}_alive', [], timeout=3600)
-    cache.set(f'search_{search_id}_complete', False, timeout=3600)
+    record_search_hits(saved_links)
+    tracer.ingest(ingest_started, len(saved_links))
+    tracer.flush()
+    # Shared by all workers: the poll for this search may land on any of them
+    progress = SearchProgress(search_id)
+    progress.start(len(saved_links))
+    profile_checks = hasattr(request, 'profile')
 
     def check_links_async():
         checker = OnionLinkCheckerService(timeout=30)
 
         def progress_callback(result):
-            checked_count = cache.get(f'search_{search_id}_checked', 0) + 1
-            cache.set(f'search_{search_id}_checked', checked_count, timeout=3600)
+            alive_link = None
             if result['status'] == 'alive':
-                alive_links = cache.get(f'search_{search_id}_alive', [])
-                link = OnionLink.objects.get(url=result['url'])
-                alive_links.append({
+                link = OnionLink.objects.select_related('fingerprint').get(url=result['url'])
+                fingerprint = getattr(link, 'fingerprint', None)
+                alive_link = {
                     'id': link.id,
+                    'cluster_id': fingerprint.cluster_id_or_self if fingerprint else link.id,
                     'url': link.url,
                     'title': link.title,
                     'description': link.description,
                     'status_code': link.status_code,
                     'response_time': link.response_time,
                     'last_checked': link.last_checked.isoformat() if link.last_checked else None
-                })
-                cache.set(f'search_{search_id}_alive', alive_links, timeout=3600)
-        checker.check_links_bulk(saved_links, max_workers=20, progress_callback=progress_callback)
-        cache.set(f'search_{search_id}_complete', True, timeout=3600)
+                }
+            progress.record(result['status'], alive_link)
+            tracer.flush()
+        try:
+            with profile_job('search_check', search_id, force=profile_checks):
+                # Every result is probed: near-duplicates include clones and generic offline or
+                # login pages, so a mirror's status is never copied; clusters only group the rows
+                checker.check_links_bulk(saved_links, max_workers=20, progress_callback=progress_callback,
+                                         tracer=tracer,
+                                         deadline=getattr(settings, 'SEARCH_CHECK_DEADLINE', None))
+        finally:
+            progress.finish()
+            tracer.flush(final=True)
 
     thread = threading.Thread(target=check_links_async)
     thread.daemon = True
@@ -112,36 +148,45 @@ def search_results_progressive(request, keyword, search_id):
     context = {
         'keyword': keyword,
         'search_id': search_id,
-        'total': cache.get(f'search_{search_id}_total', 0),
+        'total': SearchProgress(search_id).total(),
     }
     return render(request, 'links/search_results_progressive.html', context)
 
 
 @require_http_methods(["GET"])
-def check_progress(request, search_id):
-    total = cache.get(f'search_{search_id}_total', 0)
-    checked = cache.get(f'search_{search_id}_checked', 0)
-    alive_links = cache.get(f'search_{search_id}_alive', [])
-    complete = cache.get(f'search_{search_id}_complete', False)
+def search_trace(request, search_id):
+    trace = get_object_or_404(SearchTrace, search_id=search_id)
+    return JsonResponse(expand_trace(trace))
+
+
+@require_http_methods(["GET"])
+async def check_progress(request, search_id):
+    progress = await sync_to_async(lambda: SearchProgress(search_id).snapshot(), thread_sensitive=False)()
+    total = progress['total']
+    checked = progress['checked']
+    alive_links = progress['alive']
     return JsonResponse({
         'total': total,
         'checked': checked,
         'alive_count': len(alive_links),
         'alive_links': alive_links,
-        'complete': complete,
+        'complete': progress['complete'],
+        'skipped': progress['skipped'],
         'progress_percent': int((checked / total * 100)) if total > 0 else 0
     })
 
 
 @require_http_methods(["GET"])
-def sandbox_proxy(request, link_id):
-    link = get_object_or_404(OnionLink, id=link_id, status='alive')
-    checker = OnionLinkCheckerService(timeout=60)
-    result = checker.fetch_content(link.url)
+async def sandbox_proxy(request, link_id):
+    link = await aget_object_or_404(OnionLink, id=link_id, status='alive')
+    started = time.perf_counter()
+    result = await get_async_client().fetch_content(link.url, timeout=60)
+    SANDBOX_SECONDS.labels(view='page', outcome='ok' if result['success'] else 'error').observe(time.perf_counter() - started)
     if result['success']:
         html_content = result['content']
         base_url = link.url
-        html_content = rewrite_html_urls(html_content, base_url, link_id)
+        # Regex rewriting of a large page would stall the event loop
+        html_content = await sync_to_async(rewrite_html_urls, thread_sensitive=False)(html_content, base_url, link_id)
         return JsonResponse({
             'success': True,
             'content': html_content,
@@ -186,63 +231,125 @@ def rewrite_html_urls(html, base_url, link_id):
     return html
 
 
+def _resource_content_type(url, content_type):
+    """Servers often label static files text/html; trust the extension instead"""
+    if 'text/html' in content_type:
+        url_lower = url.lower()
+        if url_lower.endswith('.css'):
+            content_type = 'text/css'
+        elif url_lower.endswith('.js'):
+            content_type = 'application/javascript'
+        elif url_lower.endswith(('.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp')):
+            ext = url_lower.split('.')[-1]
+            content_type = f'image/{ext.replace("jpg", "jpeg")}'
+        elif url_lower.endswith('.woff') or url_lower.endswith('.woff2'):
+            content_type = 'font/woff2' if url_lower.endswith('.woff2') else 'font/woff'
+        elif url_lower.endswith('.ttf'):
+            content_type = 'font/ttf'
+    return content_type
+
+
+async def _stream_resource(upstream, started, keep=None, limit=0):
+    """
+    Relay the decoded upstream body chunk by chunk; the connection is closed when the stream ends.
+    ``keep`` is then awaited with the whole body, or None if it failed or grew past ``limit``.
+    """
+    outcome = 'error'
+    body = bytearray() if keep is not None else None
+    try:
+        async for chunk in upstream.aiter_bytes():
+            if body is not None:
+                body += chunk
+                if len(body) > limit:
+                    body = None
+            yield chunk
+        outcome = 'ok'
+    finally:
+        await upstream.aclose()
+        SANDBOX_SECONDS.labels(view='resource', outcome=outcome).observe(time.perf_counter() - started)
+        if keep is not None:
+            await keep(bytes(body) if outcome == 'ok' and body is not None else None)
+
+
 @require_http_methods(["GET"])
-def sandbox_resource_proxy(request, link_id, encoded_url):
+async def sandbox_resource_proxy(request, link_id, encoded_url):
+    # While True, this request holds the single-flight lock and must release it
+    leader = False
+    handed_off = False
     try:
-        _ = get_object_or_404(OnionLink, id=link_id)
+        _ = await aget_object_or_404(OnionLink, id=link_id)
         decoded_url = base64.urlsafe_b64decode(encoded_url.encode()).decode()
-        checker = OnionLinkCheckerService(timeout=30)
-        result = checker.fetch_resource(decoded_url)
-        if result['success']:
-            content_type = result.get('content_type', 'application/octet-stream')
-            if 'text/html' in content_type:
-                url_lower = decoded_url.lower()
-                if url_lower.endswith('.css'):
-                    content_type = 'text/css'
-                elif url_lower.endswith('.js'):
-                    content_type = 'application/javascript'
-                elif url_lower.endswith(('.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp')):
-                    ext = url_lower.split('.')[-1]
-                    content_type = f'image/{ext.replace("jpg", "jpeg")}'
-                elif url_lower.endswith('.woff') or url_lower.endswith('.woff2'):
-                    content_type = 'font/woff2' if url_lower.endswith('.woff2') else 'font/woff'
-                elif url_lower.endswith('.ttf'):
-                    content_type = 'font/ttf'
-            response = HttpResponse(result['content'], content_type=content_type)
+        started = time.perf_counter()
+        # Shared across workers; if another worker is fetching this URL, wait for its copy
+        resources = await sync_to_async(ResourceCache, thread_sensitive=False)()
+        cached, leader = await resources.aget_or_lead(decoded_url)
+        if cached is not None:
+            SANDBOX_SECONDS.labels(view='resource', outcome='ok').observe(time.perf_counter() - started)
+            response = HttpResponse(cached[1], content_type=cached[0])
             response['X-Frame-Options'] = 'SAMEORIGIN'
             response['Cache-Control'] = 'public, max-age=3600'
             return response
+
+        async def keep(content_type, body):
+            nonlocal leader
+            was_leader, leader = leader, False
+            await sync_to_async(resources.finish, thread_sensitive=False)(decoded_url, content_type, body, was_leader)
+
+        try:
+            # Uncompressed, so the body can be relayed as it arrives
+            upstream = await get_async_client().open(decoded_url, accept_encoding='identity')
+        except SyncFallbackRequired:
+            checker = await sync_to_async(OnionLinkCheckerService, thread_sensitive=False)(timeout=30)
+            result = await sync_to_async(checker.fetch_resource, thread_sensitive=False)(decoded_url)
+            upstream = None
+        except Exception as e:
+            result = {'success': False, 'error': str(e) or type(e).__name__}
+            upstream = None
+        if upstream is not None:
+            content_type = _resource_content_type(decoded_url, upstream.headers.get('content-type', 'application/octet-stream'))
+            cacheable = upstream.status_code == 200
+            stream = _stream_resource(
+                upstream, started, keep=lambda body: keep(content_type, body if cacheable else None),
+                limit=resources.max_item_bytes,
+            )
+            if isinstance(request, ASGIRequest):
+                response = StreamingHttpResponse(stream, content_type=content_type, status=upstream.status_code)
+                # The upstream length is of the encoded body when the server compressed anyway
+                encoding = upstream.headers.get('content-encoding', '').lower()
+                if 'content-length' in upstream.headers and encoding in ('', 'identity'):
+                    response['Content-Length'] = upstream.headers['content-length']
+                # The stream releases the lock when it ends
+                handed_off = True
+            else:
+                # Under WSGI this view's event loop ends when it returns, taking the socket with it
+                body = b''.join([chunk async for chunk in stream])
+                response = HttpResponse(body, content_type=content_type, status=upstream.status_code)
+        elif result['success']:
+            SANDBOX_SECONDS.labels(view='resource', outcome='ok').observe(time.perf_counter() - started)
+            content_type = _resource_content_type(decoded_url, result.get('content_type', 'application/octet-stream'))
+            await keep(content_type, result['content'] if result.get('status_code') == 200 else None)
+            response = HttpResponse(result['content'], content_type=content_type, status=result.get('status_code') or 200)
         else:
+            SANDBOX_SECONDS.labels(view='resource', outcome='error').observe(time.perf_counter() - started)
+            await keep('', None)
             return HttpResponse(f"Error loading resource: {result.get('error', 'Unknown error')}", status=404, content_type='text/plain')
+        response['X-Frame-Options'] = 'SAMEORIGIN'
+        response['Cache-Control'] = 'public, max-age=3600'
+        return response
     except Exception as e:
         return HttpResponse(f"Error: {str(e)}", status=500, content_type='text/plain')
+    finally:
+        if leader and not handed_off:
+            # Failed before the fetch finished: don't leave followers waiting out the lock
+            await sync_to_async(resources.finish, thread_sensitive=False)(decoded_url, '', None, True)
 
 
 @require_http_methods(["GET", "POST"])
 def investigate_link(request, link_id):
     link = get_object_or_404(OnionLink, id=link_id)
     if request.method == 'POST':
-        investigator = OnionInvestigator(timeout=60)
-        result = investigator.investigate(link.url)
-        if result['success']:
-            investigation, _ = Investigation.objects.update_or_create(
-                onion_link=link,
-                investigated_url=link.url,
-                defaults={
-                    'emails': result['emails'],
-                    'btc_addresses': result['btc_addresses'],
-                    'monero_addresses': result['monero_addresses'],
-                    'ethereum_addresses': result['ethereum_addresses'],
-                    'external_links': result['external_links'],
-                    'has_server_status': result['has_server_status'],
-                    'server_status_content': result['server_status_content'],
-                }
-            )
-            messages.success(request, f'Investigation complete! Found {investigation.total_findings} items.')
-            return redirect('investigation_detail', investigation_id=investigation.id)
-        else:
-            messages.error(request, f'Investigation failed: {result["error"]}')
-            return redirect('home')
+        job = submit_investigation(link, link.url, profile=hasattr(request, 'profile'))
+        return redirect('investigation_job', job_id=job.id)
     existing_investigation = Investigation.objects.filter(
         onion_link=link,
         investigated_url=link.url
@@ -251,6 +358,27 @@ def investigate_link(request, link_id):
     return render(request, 'links/investigate.html', context)
 
 
+@require_http_methods(["GET"])
+def investigation_job(request, job_id):
+    job = get_object_or_404(InvestigationJob.objects.select_related('onion_link'), id=job_id)
+    context = {'job': job}
+    return render(request, 'links/investigation_job.html', context)
+
+
+@require_http_methods(["GET"])
+def investigation_job_status(request, job_id):
+    expire_stale_jobs()
+    job = get_object_or_404(InvestigationJob, id=job_id)
+    return JsonResponse({
+        'status': job.status,
+        'stage': job.stage,
+        'error': job.error,
+        'investigation_id': job.investigation_id,
+        'redirect_url': reverse('investigation_detail', args=[job.investigation_id]) if job.investigation_id else None,
+        'elapsed': ((job.finished_at or timezone.now()) - (job.started_at or job.created_at)).total_seconds(),
+    })
+
+
 @require_http_methods(["GET"])
 def investigation_detail(request, investigation_id):
     investigation = get_object_or_404(Investigation, id=investigation_id)
@@ -282,8 +410,11 @@ def investigate_by_url(request):
         if '.onion' not in url.lower():
             messages.error(request, 'Please enter a valid .onion URL')
             return redirect('investigate_by_url')
-        if not url.startswith('http://') and not url.startswith('https://'):
-            url = 'http://' + url
+        onion = canonicalize_onion_url(url)
+        if not onion.is_valid:
+            messages.error(request, onion.message)
+            return redirect('investigate_by_url')
+        url = onion.url
         existing_investigation = Investigation.objects.filter(investigated_url=url).first()
         if existing_investigation and request.POST.get('use_existing') != 'no':
             messages.info(request, 'Using existing investigation results')
@@ -292,25 +423,36 @@ def investigate_by_url(request):
             url=url,
             defaults={'title': 'Direct Investigation', 'description': 'Investigated directly via URL'}
         )
-        investigator = OnionInvestigator(timeout=60)
-        result = investigator.investigate(url)
-        if result['success']:
-            investigation, _ = Investigation.objects.update_or_create(
-                investigated_url=url,
-                defaults={
-                    'onion_link': link,
-                    'emails': result['emails'],
-                    'btc_addresses': result['btc_addresses'],
-                    'monero_addresses': result['monero_addresses'],
-                    'ethereum_addresses': result['ethereum_addresses'],
-                    'external_links': result['external_links'],
-                    'has_server_status': result['has_server_status'],
-                    'server_status_content': result['server_status_content'],
-                }
-            )
-            messages.success(request, f'Investigation complete! Found {investigation.total_findings} items.')
-            return redirect('investigation_detail', investigation_id=investigation.id)
-        else:
-            messages.error(request, f'Investigation failed: {result["error"]}')
-            return render(request, 'links/investigate_by_url.html')
+        job = submit_investigation(link, url, profile=hasattr(request, 'profile'))
+        return redirect('investigation_job', job_id=job.id)
     return render(request, 'links/investigate_by_url.html', {})
+
+
+@require_http_methods(["GET"])
+def entity_lookup(request):
+    value = request.GET.get('value', '').strip()
+    entity_type = request.GET.get('type', '').strip() or None
+    results = find_cooccurrences(value, entity_type) if value else []
+    context = {
+        'value': value,
+        'entity_type': entity_type or '',
+        'entity_types': Entity.ENTITY_TYPE_CHOICES,
+        'results': results,
+    }
+    return render(request, 'links/entity_lookup.html', context)
+
+
+@require_http_methods(["GET"])
+def entity_lookup_api(request):
+    value = request.GET.get('value', '').strip()
+    if not value:
+        return JsonResponse({'error': 'value parameter is required'}, status=400)
+    entity_type = request.GET.get('type', '').strip() or None
+    results = find_cooccurrences(value, entity_type)
+    return JsonResponse({'value': value, 'type': entity_type, 'results': results})
+
+
+@require_http_methods(["GET"])
+def metrics_view(request):
+    """Prometheus text exposition of this deployment's metrics (all workers)"""
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')